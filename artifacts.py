@@ -0,0 +1,139 @@
+import hashlib
+import os
+import xmlrpc.client
+import zlib
+
+
+# Size of the chunks artifacts are streamed in, each chunk is compressed on its own
+ARTIFACT_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Fast compression, logs compress well even at the lowest level
+ARTIFACT_COMPRESSION_LEVEL = 1
+
+# Suffix of partially transferred artifacts, transfers resume from them
+PARTIAL_SUFFIX = ".part"
+
+
+def file_sha256(path, size=None):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        remaining = size
+        while remaining is None or remaining > 0:
+            data = f.read(ARTIFACT_CHUNK_SIZE if remaining is None else min(ARTIFACT_CHUNK_SIZE, remaining))
+            if len(data) == 0:
+                break
+            h.update(data)
+            if remaining is not None:
+                remaining -= len(data)
+    return h
+
+
+# Serves the files under a directory over the coordination channel, in compressed chunks
+# NOTE: Sizes and offsets are floats since XML-RPC can't marshal integers above 2^31
+class ArtifactDirectory:
+    def __init__(self, root):
+        self.root = os.path.realpath(root)
+        self.checksums = {}
+
+    # Path under the directory, refusing anything outside of it
+    def resolve(self, name):
+        path = os.path.realpath(os.path.join(self.root, name))
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise ValueError("{} is outside of the artifacts directory".format(name))
+        return path
+
+    def path(self, name):
+        path = self.resolve(name)
+        if not os.path.isfile(path):
+            raise ValueError("No artifact {}".format(name))
+        return path
+
+    # Checksums are cached as long as the file doesn't change
+    def checksum(self, path):
+        st = os.stat(path)
+        key = (path, st.st_size, st.st_mtime_ns)
+        if key not in self.checksums:
+            self.checksums[key] = file_sha256(path).hexdigest()
+        return self.checksums[key]
+
+    # All artifacts under a prefix (e.g. the output directory of one run), as name, size and sha256
+    def list_artifacts(self, prefix=""):
+        artifacts = []
+        top = self.resolve(prefix)
+        if not os.path.isdir(top):
+            return artifacts
+
+        for dirpath, dirnames, filenames in os.walk(top):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                if filename.endswith(PARTIAL_SUFFIX):
+                    continue
+                path = os.path.join(dirpath, filename)
+                artifacts.append({
+                    "name": os.path.relpath(path, self.root),
+                    "size": float(os.path.getsize(path)),
+                    "sha256": self.checksum(path),
+                })
+        return artifacts
+
+    def read_artifact_chunk(self, name, offset, size=ARTIFACT_CHUNK_SIZE):
+        with open(self.path(name), "rb") as f:
+            f.seek(int(offset))
+            data = f.read(min(int(size), ARTIFACT_CHUNK_SIZE))
+        return xmlrpc.client.Binary(zlib.compress(data, ARTIFACT_COMPRESSION_LEVEL))
+
+    def register(self, server):
+        server.register_function(self.list_artifacts, "list_artifacts")
+        server.register_function(self.read_artifact_chunk, "read_artifact_chunk")
+
+
+# Pull one artifact into the destination file, resuming from a partial transfer
+def fetch_artifact(proxy, artifact, dest):
+    size = int(artifact["size"])
+    partial = dest + PARTIAL_SUFFIX
+
+    # Skip artifacts already fetched
+    if os.path.exists(dest) and os.path.getsize(dest) == size and file_sha256(dest).hexdigest() == artifact["sha256"]:
+        return False
+
+    # Resume from the partial file, hashing what was already transferred
+    offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+    if offset > size:
+        offset = 0
+    h = file_sha256(partial, offset) if offset > 0 else hashlib.sha256()
+
+    os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+    with open(partial, "r+b" if offset > 0 else "wb") as f:
+        f.seek(offset)
+        f.truncate()
+        while offset < size:
+            data = zlib.decompress(proxy.read_artifact_chunk(artifact["name"], float(offset), float(ARTIFACT_CHUNK_SIZE)).data)
+            if len(data) == 0:
+                raise RuntimeError("Artifact {} shrank during the transfer".format(artifact["name"]))
+            f.write(data)
+            h.update(data)
+            offset += len(data)
+
+    if h.hexdigest() != artifact["sha256"]:
+        os.remove(partial)
+        raise RuntimeError("Checksum mismatch for artifact {}".format(artifact["name"]))
+    os.replace(partial, dest)
+    return True
+
+
+# Pull all the artifacts under a prefix into the destination directory, retrying corrupted transfers once
+# Returns the number of artifacts transferred and skipped
+def fetch_artifacts(proxy, dest_dir, prefix=""):
+    transferred, skipped = 0, 0
+    for artifact in proxy.list_artifacts(prefix):
+        dest = os.path.join(dest_dir, os.path.relpath(artifact["name"], prefix or "."))
+        try:
+            fetched = fetch_artifact(proxy, artifact, dest)
+        except RuntimeError as e:
+            print("[artifacts] {}, retrying".format(e))
+            fetched = fetch_artifact(proxy, artifact, dest)
+        if fetched:
+            transferred += 1
+        else:
+            skipped += 1
+    return transferred, skipped
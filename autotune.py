@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import tomllib
+from run_scenario import *
+
+
+# Space of NIC configurations, every value as the absolute setup flags it needs (setups are incremental,
+# so a value has to set its dimension fully or it would inherit it from the previous configuration)
+TUNING_SPACE = {
+    "offloads": {
+        "none": ["--no-gro", "--no-gso", "--no-tso"],
+        "tso": ["--no-gro", "--gso", "--tso"],
+        "gro": ["--gro", "--no-gso", "--no-tso"],
+        "tsogro": ["--gro", "--gso", "--tso"],
+    },
+    "lro": {"off": ["--no-lro"], "on": ["--lro"]},
+    "mtu": {"1500": ["--mtu", "1500"], "4096": ["--mtu", "4096"], "9000": ["--mtu", "9000"]},
+    "arfs": {"off": ["--no-arfs"], "on": ["--arfs"]},
+    "rings": {"1024": ["--rx-ring", "1024", "--tx-ring", "1024"], "4096": ["--rx-ring", "4096", "--tx-ring", "4096"], "8192": ["--rx-ring", "8192", "--tx-ring", "8192"]},
+    "coalesce": {"adaptive": ["--adaptive-rx"], "8us": ["--no-adaptive-rx", "--rx-usecs", "8"], "64us": ["--no-adaptive-rx", "--rx-usecs", "64"]},
+    # IRQs one queue per CPU (the default mode), pinned with the flows steered to them, or planned near the NIC
+    "placement": {"default": [], "steer": [], "near": []},
+}
+
+# Dimensions whose changes reset the link, configurations are run grouped by them
+LINK_RESET_DIMENSIONS = ["mtu", "rings", "lro"]
+
+# Seconds at the start of a run left out of the confidence interval (slow start), as in process_throughput_output
+WARMUP_SECONDS = 2
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Find the NIC configuration with the best throughput per core for a flow pattern, by successive halving.")
+
+    # Add arguments
+    parser.add_argument("scenario", type=str, help="Scenario giving the flow pattern (its params, first sweep values) and the base setup (its first rung).")
+    parser.add_argument("--set", type=str, nargs="*", default=[], help="Override parameters of the flow pattern, as key=value (TOML values).")
+    parser.add_argument("--space", choices=list(TUNING_SPACE.keys()), nargs="+", default=list(TUNING_SPACE.keys()), help="Dimensions to tune, the others are left as in the base setup.")
+    parser.add_argument("--configs", type=int, default=32, help="Number of configurations to start with, sampled from the space if it is larger.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the sampling of the configurations.")
+    parser.add_argument("--eta", type=int, default=2, help="Keep 1/eta of the configurations after every round, and run eta times longer.")
+    parser.add_argument("--min-duration", type=int, default=5, help="Duration of the runs of the first round in seconds.")
+    parser.add_argument("--max-duration", type=int, default=40, help="Longest duration of the runs in seconds.")
+    parser.add_argument("--keep", type=int, default=1, help="Stop once this many configurations are left.")
+    parser.add_argument("--topology", type=str, default=TOPOLOGY_FILE, help="File with the default addresses and interfaces of the hosts.")
+    parser.add_argument("--receiver", type=str, default=None, help="Address of the receiver to communicate metadata.")
+    parser.add_argument("--addr", type=str, default=None, help="Address of the receiver interface to run experiments on.")
+    parser.add_argument("--iface", type=str, default=None, help="Interface to run experiments on.")
+    parser.add_argument("--results-dir", type=str, default=os.path.join(DIR, "results"), help="Directory for the logs, raw outputs and results store.")
+    parser.add_argument("--force", action="store_true", help="Re-measure configurations already recorded in the results store.")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the configurations of the first round.")
+    parser.add_argument("--fetch-artifacts", action="store_true", help="Copy the raw outputs of the receiver next to the ones of the sender after every run.")
+    parser.add_argument("--verbose", action="store_true", help="Print extra output.")
+
+    # Parse and verify arguments
+    args = parser.parse_args()
+
+    if args.configs < 1 or args.keep < 1:
+        print("Can't set --configs/--keep < 1.")
+        exit(1)
+
+    if args.eta < 2:
+        print("Can't set --eta < 2.")
+        exit(1)
+
+    # Same bounds as the duration of run_experiment_sender.py
+    if not (5 <= args.min_duration <= args.max_duration <= 60):
+        print("Please provide 5 <= --min-duration <= --max-duration <= 60.")
+        exit(1)
+
+    overrides = {}
+    for item in args.set:
+        if "=" not in item:
+            print("Please provide --set as key=value.")
+            exit(1)
+        key, value = item.split("=", 1)
+        try:
+            overrides[key] = tomllib.loads("v = {}".format(value))["v"]
+        except tomllib.TOMLDecodeError:
+            overrides[key] = value
+    args.set = overrides
+
+    # Fill in the topology defaults
+    topology = load_toml(args.topology) if os.path.exists(args.topology) else {}
+    if args.iface is None:
+        args.iface = topology.get("sender", {}).get("iface")
+    if args.receiver is None:
+        args.receiver = topology.get("receiver", {}).get("public_addr")
+    if args.addr is None:
+        args.addr = topology.get("receiver", {}).get("addr")
+
+    if not args.dry_run and (args.receiver is None or args.addr is None):
+        print("Please provide --receiver and --addr, or set them in {}.".format(args.topology))
+        exit(1)
+
+    # Create the directory for writing results
+    os.makedirs(args.results_dir, exist_ok=True)
+
+    # Return parsed and verified arguments
+    return args
+
+
+# Every valid configuration of the tuned dimensions, as {dimension: value}
+def tuning_configs(space, params):
+    configs = []
+    for values in itertools.product(*[list(TUNING_SPACE[d].keys()) for d in space]):
+        config = dict(zip(space, values))
+        arfs = config.get("arfs", "on" if params.get("arfs") else "off") == "on"
+        # Steering needs long flows without aRFS, see run_experiment_sender.py
+        if config.get("placement") == "steer" and (arfs or params.get("flow_type", "long") != "long"):
+            continue
+        configs.append(config)
+    return configs
+
+
+def config_label(config):
+    return "+".join("{}-{}".format(d, v) for d, v in config.items())
+
+
+# Scenario running the flow pattern under one configuration: a single rung with the base setup and the flags of the configuration
+def config_scenario(scenario, params, config, ifaces):
+    setup = list(scenario["ladder"][0].get("setup", []))
+    for d, v in config.items():
+        setup += TUNING_SPACE[d][v]
+
+    # IRQs in the default mode for the pattern, then moved by the experiment scripts if steered or planned
+    placement = config.get("placement")
+    if placement is not None:
+        setup += ["--config", params.get("config", "single")]
+
+    rung = {"label": config_label(config), "setup": setup, "params": {}}
+    if "arfs" in config:
+        rung["params"]["arfs"] = config["arfs"] == "on"
+    if placement is not None:
+        if placement == "steer":
+            rung["params"]["steer"] = True
+        elif placement == "near":
+            rung["params"].update({"cpus": None, "affinity": None})
+            rung["sender"] = {"place_near": ifaces["sender"]}
+            rung["receiver"] = {"place_near": ifaces["receiver"]}
+
+    return dict(scenario, name="autotune-{}".format(scenario["name"]), params=params, sweep={}, ladder=[rung])
+
+
+# Relative half-width of the 95% confidence interval of the steady state throughput of a run,
+# from the total throughput of its flows every second
+def throughput_confidence(series):
+    totals = [sum(s) for s in zip(*series.values())][WARMUP_SECONDS:-1]
+    if len(totals) < 2:
+        return None
+    mean = sum(totals) / len(totals)
+    if mean <= 0:
+        return None
+    std = math.sqrt(sum((t - mean) ** 2 for t in totals) / (len(totals) - 1))
+    return 1.96 * std / math.sqrt(len(totals)) / mean
+
+
+# Successive halving: every configuration gets a short run, the best 1/eta get eta times longer runs, and so on
+class Tuner:
+    def __init__(self, args, agent, scenario, params, configs, ifaces):
+        self.args = args
+        self.agent = agent
+        self.scenario = scenario
+        self.params = params
+        self.configs = configs
+        self.ifaces = ifaces
+        self.environment = {"sender": host_environment(args.iface), "receiver": agent.environment()}
+        self.nic = tool_nic_config(args.iface)
+        # Results of every configuration, by label: one per round it was run in
+        self.results = {config_label(c): [] for c in configs}
+
+    def measure(self, config, duration):
+        scenario = config_scenario(self.scenario, self.params, config, self.ifaces)
+        rung = scenario["ladder"][0]
+        point = Point(scenario, 0, rung, {}, {"name": "{}s".format(duration), "metrics": ["throughput", "utilisation"], "params": {"duration": duration}})
+
+        print("[autotune] network setup: {}".format(" ".join(rung["setup"])))
+        setup_failed = run_network_setup(self.nic, rung["setup"]) + self.agent.setup_network(rung["setup"])
+
+        # A NIC that rejects a change would be measured with its old setting under the label of the configuration
+        result = {"duration": duration, "run_id": None, "throughput": None, "utilisation": None, "throughput_per_core": None, "confidence": None,
+                  "setup_failed": setup_failed}
+        if setup_failed > 0:
+            print("[autotune] {}: {} NIC changes failed, skipping it".format(config_label(config), setup_failed))
+            self.results[config_label(config)].append(result)
+            return None
+
+        run = measure_point(self.args, self.agent, scenario, point, point_key(scenario, point, self.environment))
+        if run is not None:
+            with ResultsStore(os.path.join(self.args.results_dir, "results.db")) as store:
+                metrics = store.run_metrics(run["run_id"])
+                confidence = throughput_confidence(store.flow_series(run["run_id"], "sender", "throughput"))
+            # Per core on the side doing the work, as in run_experiment_sender.py
+            side = "sender" if self.params.get("config") == "outcast" else "receiver"
+            result.update({"run_id": run["run_id"], "throughput": metrics.get(("sender", "throughput")), "utilisation": metrics.get((side, "utilisation")),
+                           "throughput_per_core": metrics.get(("sender", "throughput_per_core")), "confidence": confidence})
+        self.results[config_label(config)].append(result)
+
+        score = result["throughput_per_core"]
+        print("[autotune] {} ({} s): {}".format(config_label(config), duration, "failed" if score is None else "{:.3f} Gbps per core".format(score)))
+        return score
+
+    def run(self):
+        survivors = list(self.configs)
+        rnd = 0
+        while True:
+            duration = min(self.args.min_duration * self.args.eta ** rnd, self.args.max_duration)
+            print("[autotune] round {}: {} configurations, {} s runs".format(rnd + 1, len(survivors), duration))
+
+            scores = {}
+            for config in sorted(survivors, key=lambda c: [c.get(d, "") for d in LINK_RESET_DIMENSIONS]):
+                scores[config_label(config)] = self.measure(config, duration)
+
+            # The ones left once at most --keep survive are the result, they aren't run again
+            ranked = sorted(survivors, key=lambda c: -1 if scores[config_label(c)] is None else scores[config_label(c)], reverse=True)
+            survivors = [c for c in ranked[:max(self.args.keep, math.ceil(len(ranked) / self.args.eta))] if scores[config_label(c)] is not None]
+            if len(survivors) <= self.args.keep:
+                return
+            rnd += 1
+
+    # Every configuration, the ones that got further first and then by their score in the longest run they got
+    def ranking(self):
+        ranking = []
+        for config in self.configs:
+            results = self.results[config_label(config)]
+            last = results[-1]
+            score = last["throughput_per_core"]
+            ranking.append({
+                "config": config,
+                "label": config_label(config),
+                "rounds": len(results),
+                "duration": last["duration"],
+                "run_id": last["run_id"],
+                "throughput": last["throughput"],
+                "utilisation": last["utilisation"],
+                "throughput_per_core": score,
+                "ci": None if score is None or last["confidence"] is None else score * last["confidence"],
+                "history": [r["throughput_per_core"] for r in results],
+                "setup_failed": last["setup_failed"] > 0,
+            })
+        ranking.sort(key=lambda r: (r["rounds"], -1 if r["throughput_per_core"] is None else r["throughput_per_core"]), reverse=True)
+        return ranking
+
+
+def format_value(value, fmt="{:.3f}"):
+    return "-" if value is None else fmt.format(value)
+
+
+def print_ranking(ranking):
+    print("[autotune] ranked configurations")
+    print("\t".join(["rank", "rounds", "duration (s)", "throughput (Gbps)", "utilisation", "throughput per core (Gbps)", "95% CI", "configuration"]))
+    for i, r in enumerate(ranking):
+        print("\t".join([str(i + 1), str(r["rounds"]), str(r["duration"]), format_value(r["throughput"]), format_value(r["utilisation"]),
+                         format_value(r["throughput_per_core"]), format_value(r["ci"], "±{:.3f}"),
+                         r["label"] + (" (NIC setup failed)" if r["setup_failed"] else "")]))
+
+    # Whether the best configuration is clearly ahead of the runner-up of the same round
+    if len(ranking) > 1 and ranking[1]["rounds"] == ranking[0]["rounds"] and None not in [ranking[0]["ci"], ranking[1]["ci"]]:
+        best, second = ranking[0], ranking[1]
+        overlap = best["throughput_per_core"] - best["ci"] <= second["throughput_per_core"] + second["ci"]
+        print("[autotune] best is {:.1%} ahead of the runner-up, {}".format(
+            best["throughput_per_core"] / second["throughput_per_core"] - 1, "within the noise (the 95% CIs overlap)" if overlap else "the 95% CIs don't overlap"))
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    scenario = load_scenario(args.scenario)
+
+    # Flow pattern: the params of the scenario at the first value of every sweep axis, with the overrides
+    params = dict(scenario.get("params", {}))
+    params.update({k: v[0] for k, v in scenario["sweep"].items()})
+    params.update(args.set)
+
+    configs = tuning_configs(args.space, params)
+    print("[autotune] {}: {} configurations in the space".format(scenario["name"], len(configs)))
+    if len(configs) > args.configs:
+        configs = random.Random(args.seed).sample(configs, args.configs)
+
+    if args.dry_run:
+        for config in configs:
+            setup = config_scenario(scenario, params, config, {"sender": args.iface, "receiver": None})["ladder"][0]["setup"]
+            print("{}\n  setup: {}".format(config_label(config), " ".join(setup)))
+        exit(0)
+
+    raise_open_files(scenario.get("open_files", 0))
+    agent = connect_agent(args.receiver)
+    ifaces = {"sender": args.iface, "receiver": agent.interface()}
+    if "near" in [c.get("placement") for c in configs] and None in ifaces.values():
+        print("Please provide the interface of both sides (--iface and the --iface of the agent) to tune the placement.")
+        exit(1)
+
+    # Restore the original NIC configuration of both sides at the end
+    tuner = Tuner(args, agent, scenario, params, configs, ifaces)
+    try:
+        tuner.run()
+    finally:
+        if tuner.nic is not None:
+            tuner.nic.restore()
+        agent.restore_network()
+
+    ranking = tuner.ranking()
+    print_ranking(ranking)
+
+    out_file = os.path.join(args.results_dir, "autotune_{}.json".format(scenario["name"]))
+    with open(out_file, "w") as f:
+        json.dump({"scenario": scenario["name"], "params": params, "space": args.space, "ranking": ranking}, f, indent=2)
+    print("[autotune] wrote {}".format(out_file))
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from constants import *
+from parallel_parse import *
+from process_output import *
+
+
+# Size of the synthetic outputs at --scale 1
+NUM_CPUS = 24
+NUM_FLOWS = NUM_CPUS * NUM_CPUS
+DURATION = 60
+NUM_PERF_SYMBOLS = 5000
+NUM_LATENCY_SAMPLES = 10 ** 7
+SKB_HIST_REPORTS_PER_SEC = 100
+
+
+# Generators of realistic raw outputs, seeded so every commit parses the same input
+def iperf_output(rng, duration):
+    lines = [
+        "Connecting to host 10.0.0.2, port 30000\n",
+        "[  5] local 10.0.0.1 port 41234 connected to 10.0.0.2 port 30000\n",
+        "[ ID] Interval           Transfer     Bitrate         Retr  Cwnd\n",
+    ]
+    total = 0.
+    for t in range(duration):
+        rate = rng.uniform(5, 40)
+        total += rate
+        lines.append("[  5] {:6.2f}-{:<6.2f} sec  {:.2f} GBytes  {:.2f} Gbits/sec    {}   {:.2f} MBytes\n".format(
+            t, t + 1, rate / 8, rate, rng.randint(0, 5), rng.uniform(0.5, 3)))
+    rate = total / duration
+    lines += [
+        "- - - - - - - - - - - - - - - - - - - - - - - - -\n",
+        "[ ID] Interval           Transfer     Bitrate         Retr\n",
+        "[  5]   0.00-{:.2f}  sec  {:.1f} GBytes  {:.2f} Gbits/sec    0             sender\n".format(duration, rate * duration / 8, rate),
+        "[  5]   0.00-{:.2f}  sec  {:.1f} GBytes  {:.2f} Gbits/sec                  receiver\n".format(duration + 0.04, rate * duration / 8, rate),
+        "\n",
+        "iperf Done.\n",
+    ]
+    return lines
+
+
+def sar_output(rng, num_cpus, duration):
+    lines = ["Linux 6.1.0 (host) \t01/01/2024 \t_x86_64_\t({} CPU)\n".format(num_cpus), "\n"]
+    for t in range(duration):
+        stamp = "12:{:02d}:{:02d} AM".format(t // 60, t % 60)
+        lines.append("{}     CPU     %user     %nice   %system   %iowait    %steal     %idle\n".format(stamp))
+        for cpu in range(num_cpus):
+            idle = rng.uniform(0, 100)
+            lines.append("{}     {:3d}     {:5.2f}      0.00     {:5.2f}      0.00      0.00     {:5.2f}\n".format(stamp, cpu, (100 - idle) / 3, (100 - idle) * 2 / 3, idle))
+        lines.append("\n")
+    lines.append("Average:        CPU     %user     %nice   %system   %iowait    %steal     %idle\n")
+    return lines
+
+
+def perf_report_output(rng, num_symbols):
+    symbols = list(load_symbol_map().keys())
+    lines = [
+        "# Samples: 1M of event 'cycles'\n",
+        "#\n",
+        "# Overhead  Command  Shared Object      Symbol\n",
+        "# ........  .......  .................  ......\n",
+        "#\n",
+    ]
+
+    # perf report sorts by overhead, the parser stops after 95%
+    weights = sorted([rng.paretovariate(1) for _ in range(num_symbols)], reverse=True)
+    total = sum(weights)
+    for i, w in enumerate(weights):
+        symbol = rng.choice(symbols) if rng.random() < 0.8 else "unknown_func_{}".format(i)
+        lines.append("    {:6.2f}%  iperf3   [kernel.kallsyms]  [k] {}\n".format(w / total * 100, symbol))
+    return lines
+
+
+def write_latency_dmesg(rng, path, num_samples):
+    with open(path, "w") as f:
+        batch = []
+        for i in range(num_samples):
+            batch.append("[{:12.6f}] tcp: [data-copy-latency] latency={}\n".format(i * 1e-6, int(rng.lognormvariate(8, 1))))
+            if len(batch) == 100000:
+                f.writelines(batch)
+                batch = []
+        f.writelines(batch)
+
+
+def write_skb_sizes_dmesg(rng, path, num_cpus, duration):
+    with open(path, "w") as f:
+        f.write("[    0.000000] [skb-sizes] layout={} width={} buckets={}\n".format(SKB_HIST_LAYOUT, SKB_HIST_BUCKET_WIDTH, SKB_HIST_NUM_BUCKETS))
+        for i in range(duration * SKB_HIST_REPORTS_PER_SEC):
+            t = i / SKB_HIST_REPORTS_PER_SEC
+            for cpu in range(num_cpus):
+                counts = " ".join(str(rng.randint(0, 1000)) for _ in range(SKB_HIST_NUM_BUCKETS))
+                f.write("[{:12.6f}] [skb-sizes] cpu={} {}\n".format(t, cpu, counts))
+
+
+def count_lines(path):
+    with open(path, "rb") as f:
+        return sum(1 for _ in f)
+
+
+# Benchmarks: name -> function building the input, returns (number of lines, function running the parser)
+def bench_throughput(rng, scale, tmp_dir):
+    outputs = [iperf_output(rng, DURATION) for _ in range(max(1, int(NUM_FLOWS * scale)))]
+    return sum(len(o) for o in outputs), lambda: sum(process_throughput_output(o) for o in outputs)
+
+
+def bench_throughput_series(rng, scale, tmp_dir):
+    outputs = [iperf_output(rng, DURATION) for _ in range(max(1, int(NUM_FLOWS * scale)))]
+    return sum(len(o) for o in outputs), lambda: [process_throughput_series(o) for o in outputs]
+
+
+def bench_util(rng, scale, tmp_dir):
+    lines = sar_output(rng, NUM_CPUS, max(1, int(DURATION * 10 * scale)))
+    return len(lines), lambda: process_util_output(lines)
+
+
+def bench_util_breakdown(rng, scale, tmp_dir):
+    lines = perf_report_output(rng, max(1, int(NUM_PERF_SYMBOLS * scale)))
+    return len(lines), lambda: process_util_breakdown_output(lines)
+
+
+def latency_dmesg(rng, scale, tmp_dir):
+    path = os.path.join(tmp_dir, "latency_dmesg.log")
+    if not os.path.exists(path):
+        write_latency_dmesg(rng, path, max(1, int(NUM_LATENCY_SAMPLES * scale)))
+    return path
+
+
+def skb_sizes_dmesg(rng, scale, tmp_dir):
+    path = os.path.join(tmp_dir, "skb-hist_dmesg.log")
+    if not os.path.exists(path):
+        write_skb_sizes_dmesg(rng, path, NUM_CPUS, max(1, int(DURATION * scale)))
+    return path
+
+
+def parse_file(parse, path, *args):
+    with open(path) as f:
+        return parse(f, *args)
+
+
+def bench_latency(rng, scale, tmp_dir):
+    path = latency_dmesg(rng, scale, tmp_dir)
+    return count_lines(path), lambda: parse_file(process_latency_output, path)
+
+
+def bench_latency_parallel(rng, scale, tmp_dir):
+    path = latency_dmesg(rng, scale, tmp_dir)
+    return count_lines(path), lambda: parallel_latency_histogram(path)
+
+
+def bench_skb_sizes(rng, scale, tmp_dir):
+    path = skb_sizes_dmesg(rng, scale, tmp_dir)
+    return count_lines(path), lambda: parse_file(process_skb_sizes_histogram, path, skb_sizes_histogram(interval=1))
+
+
+def bench_skb_sizes_parallel(rng, scale, tmp_dir):
+    path = skb_sizes_dmesg(rng, scale, tmp_dir)
+    return count_lines(path), lambda: parallel_skb_sizes_histogram(path, skb_sizes_histogram(interval=1))
+
+
+BENCHMARKS = {
+    "throughput": bench_throughput,
+    "throughput-series": bench_throughput_series,
+    "util": bench_util,
+    "util-breakdown": bench_util_breakdown,
+    "latency": bench_latency,
+    "latency-parallel": bench_latency_parallel,
+    "skb-sizes": bench_skb_sizes,
+    "skb-sizes-parallel": bench_skb_sizes_parallel,
+}
+
+
+# Best time over the repetitions, and peak memory of the parser in a separate traced run
+# NOTE: Peak memory only covers this process, not the workers of the parallel parsers
+def run_benchmark(run, num_lines, repeat):
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    best = min(times)
+    return {
+        "lines": num_lines,
+        "seconds": best,
+        "lines_per_sec": num_lines / best if best > 0 else None,
+        "peak_memory_bytes": peak,
+    }
+
+
+def git_commit():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.split(os.path.realpath(__file__))[0], stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+        dirty = subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"], cwd=os.path.split(os.path.realpath(__file__))[0], stderr=subprocess.DEVNULL, universal_newlines=True).strip() != ""
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the output parsers on synthetic outputs.")
+
+    # Add arguments
+    parser.add_argument("benchmarks", nargs="*", default=list(BENCHMARKS.keys()), help="Benchmarks to run (default: all of {}).".format(", ".join(BENCHMARKS.keys())))
+    parser.add_argument("--scale", type=float, default=1, help="Scale of the synthetic outputs (1 = 24 CPUs, 576 flows, 10^7 latency samples).")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed repetitions of each benchmark.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic outputs.")
+    parser.add_argument("--output", type=str, default=None, help="Write the results as JSON to the file.")
+    parser.add_argument("--compare", type=str, default=None, help="Compare with the JSON results of an earlier run.")
+
+    # Parse and verify arguments
+    args = parser.parse_args()
+
+    for name in args.benchmarks:
+        if name not in BENCHMARKS:
+            print("Unknown benchmark {}, choose from {}.".format(name, ", ".join(BENCHMARKS.keys())))
+            exit(1)
+
+    if args.scale <= 0 or args.repeat < 1:
+        print("Can't set --scale <= 0 or --repeat < 1.")
+        exit(1)
+
+    # Return parsed and verified arguments
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "host": platform.node(),
+        "cpus": len(os.sched_getaffinity(0)),
+        "scale": args.scale,
+        "seed": args.seed,
+        "benchmarks": {},
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in args.benchmarks:
+            num_lines, run = BENCHMARKS[name](random.Random(args.seed), args.scale, tmp_dir)
+            results["benchmarks"][name] = run_benchmark(run, num_lines, args.repeat)
+            r = results["benchmarks"][name]
+            print("[{}] {} lines\t{:.3f} s\t{:.0f} lines/s\t{:.1f} MB peak".format(name, r["lines"], r["seconds"], r["lines_per_sec"] or 0, r["peak_memory_bytes"] / 2 ** 20))
+
+    # Compare with an earlier run, only meaningful at the same scale and seed
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if (baseline["scale"], baseline["seed"]) != (args.scale, args.seed):
+            print("[compare] baseline was run with --scale {} --seed {}".format(baseline["scale"], baseline["seed"]))
+        print("[compare] {} -> {}".format(baseline["commit"], results["commit"]))
+        print("\t".join(["benchmark", "lines/s (before)", "lines/s (after)", "speedup", "peak memory ratio"]))
+        for name, r in results["benchmarks"].items():
+            old = baseline["benchmarks"].get(name)
+            if old is None or not old["lines_per_sec"] or not r["lines_per_sec"]:
+                continue
+            print("{}\t{:.0f}\t{:.0f}\t{:.2f}x\t{:.2f}".format(name, old["lines_per_sec"], r["lines_per_sec"], r["lines_per_sec"] / old["lines_per_sec"],
+                                                               r["peak_memory_bytes"] / max(1, old["peak_memory_bytes"])))
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
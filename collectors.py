@@ -0,0 +1,66 @@
+from netem import *
+
+
+# Measurement taken around every experiment of a run: started before the flows of a phase and stopped
+# after them. What stop returns is kept per phase and sent over XML-RPC, so it only has string keys
+class Collector:
+    name = None
+
+    def start(self, phase):
+        pass
+
+    def stop(self, phase):
+        return None
+
+    # Metrics of the run from the values of its phases, {name: value}
+    def metrics(self, phases):
+        return {}
+
+
+# Loss recovery counters of the host over each phase
+# NOTE: XML-RPC only allows ints up to 2^31, which the segment counters pass in long runs, they go as floats
+class TcpCounters(Collector):
+    name = "tcp_counters"
+
+    def __init__(self):
+        self.before = None
+
+    def start(self, phase):
+        self.before = read_tcp_counters()
+
+    def stop(self, phase):
+        return {name: float(delta) for name, delta in tcp_counters_delta(self.before, read_tcp_counters()).items()}
+
+    # Counters summed over the experiments
+    def metrics(self, phases):
+        return {name: sum(c.get(counter, 0) for c in phases.values()) for counter, name in TCP_METRICS.items()}
+
+
+# Collectors of a run, the TCP counters first, then any given by the caller
+class CollectorSet:
+    def __init__(self, collectors=None):
+        self.collectors = [TcpCounters()] + list(collectors or [])
+        names = [c.name for c in self.collectors]
+        if None in names or len(set(names)) != len(names):
+            raise ValueError("Every collector needs a name of its own (got {})".format(", ".join(map(str, names))))
+        self.values = {name: {} for name in names}
+
+    def start(self, phase):
+        for c in self.collectors:
+            c.start(phase)
+
+    # Stopped in reverse order, so the first ones measure the least of the others
+    def stop(self, phase):
+        for c in reversed(self.collectors):
+            value = c.stop(phase)
+            if value is not None:
+                self.values[c.name][phase] = value
+
+    def results(self):
+        return {name: dict(phases) for name, phases in self.values.items()}
+
+    def metrics(self):
+        metrics = {}
+        for c in self.collectors:
+            metrics.update(c.metrics(self.values[c.name]))
+        return metrics
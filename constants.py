@@ -10,6 +10,12 @@ DDIO_REG = 0xc8b
 # Port for running the coordination service
 COMM_PORT = 50000
 
+# Port for the scenario agent on the receiver
+AGENT_PORT = 50001
+
+# Port for the binary control protocol (synchronisation and clock offset estimation)
+CONTROL_PORT = 50002
+
 # Base port of using iperf and netperf
 BASE_PORT = 30000
 ADDITIONAL_BASE_PORT = 40000
@@ -24,6 +30,12 @@ CPUS = list(range(MAX_CPUS))
 MAX_CONNECTIONS = MAX_CPUS
 MAX_RPCS = 24
 
+# Default layout of the skb sizes histogram reported by the kernel
+# The layout is either "linear" or "log2", with the width of the (first) bucket in KB
+SKB_HIST_LAYOUT = "linear"
+SKB_HIST_BUCKET_WIDTH = 5
+SKB_HIST_NUM_BUCKETS = 13
+
 # Path to executables of profiling tools
 PERF_PATH = "/usr/bin/perf"
 FLAME_PATH = "/opt/FlameGraph"
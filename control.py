@@ -0,0 +1,210 @@
+import json
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+
+# Frame header: message type and payload length
+FRAME_HEADER = struct.Struct("!BI")
+
+# Message types
+MSG_PING = 1
+MSG_PONG = 2
+MSG_CALL = 3
+MSG_REPLY = 4
+MSG_ERROR = 5
+
+# Payloads of the clock exchange: sequence number and timestamps (s)
+PING_PAYLOAD = struct.Struct("!Id")
+PONG_PAYLOAD = struct.Struct("!Iddd")
+
+# Calls and replies start with the call ID, followed by JSON
+CALL_ID = struct.Struct("!I")
+
+# Number of ping exchanges in every clock synchronisation
+CLOCK_SYNC_SAMPLES = 16
+
+
+def send_frame(sock, typ, payload):
+    sock.sendall(FRAME_HEADER.pack(typ, len(payload)) + payload)
+
+
+def recv_exact(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if len(chunk) == 0:
+            raise ConnectionError("Control connection closed")
+        data += chunk
+    return bytes(data)
+
+
+def recv_frame(sock):
+    typ, length = FRAME_HEADER.unpack(recv_exact(sock, FRAME_HEADER.size))
+    return typ, recv_exact(sock, length)
+
+
+# Serves registered functions over persistent connections, answering pings with its clock
+class ControlServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, addr):
+        super().__init__(addr, ControlHandler)
+        self.functions = {}
+
+    def register_function(self, fn, name=None):
+        self.functions[name or fn.__name__] = fn
+
+
+class ControlHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        sock = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        while True:
+            try:
+                typ, payload = recv_frame(sock)
+            except ConnectionError:
+                return
+            received = time.time()
+
+            if typ == MSG_PING:
+                seq, t0 = PING_PAYLOAD.unpack(payload)
+                send_frame(sock, MSG_PONG, PONG_PAYLOAD.pack(seq, t0, received, time.time()))
+            elif typ == MSG_CALL:
+                call_id, = CALL_ID.unpack_from(payload)
+                name, args = json.loads(payload[CALL_ID.size:])
+                try:
+                    result = json.dumps(self.server.functions[name](*args))
+                    send_frame(sock, MSG_REPLY, CALL_ID.pack(call_id) + result.encode())
+                except Exception as e:
+                    send_frame(sock, MSG_ERROR, CALL_ID.pack(call_id) + "{}: {}".format(type(e).__name__, e).encode())
+            else:
+                return
+
+
+# Estimate of the offset of a remote clock (remote - local) and its drift, from NTP-style exchanges
+class ClockEstimate:
+    def __init__(self):
+        self.samples = []
+
+    # One exchange: local send t0, remote receive t1, remote send t2, local receive t3
+    def add_exchange(self, t0, t1, t2, t3):
+        offset = ((t1 - t0) + (t2 - t3)) / 2
+        delay = (t3 - t0) - (t2 - t1)
+        self.samples.append(((t0 + t3) / 2, offset, delay))
+
+    # Keep the exchanges with the lowest delay, their offset is the most accurate
+    def best_samples(self):
+        if len(self.samples) == 0:
+            return []
+        min_delay = min(s[2] for s in self.samples)
+        return [s for s in self.samples if s[2] <= 2 * min_delay + 1e-4]
+
+    # Fit offset = offset at ref + drift * (t - ref) over the best exchanges
+    def fit(self):
+        samples = self.best_samples()
+        if len(samples) == 0:
+            return None
+
+        ref = samples[0][0]
+        xs = [s[0] - ref for s in samples]
+        ys = [s[1] for s in samples]
+        mean_x = sum(xs) / len(xs)
+        mean_y = sum(ys) / len(ys)
+        var_x = sum((x - mean_x) ** 2 for x in xs)
+
+        # Drift is only meaningful when the exchanges span some time
+        drift = 0. if max(xs) - min(xs) < 1 else sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x
+        return {
+            "ref": ref,
+            "offset": mean_y - drift * mean_x,
+            "drift": drift,
+            "delay": min(s[2] for s in samples),
+            "samples": len(self.samples),
+        }
+
+    def offset_at(self, t):
+        return fit_offset(self.fit(), t)
+
+    # Convert a timestamp of the remote clock to the local one
+    def to_local(self, remote_t):
+        return remote_to_local(self.fit(), remote_t)
+
+
+# Offset of the remote clock at a local time, from a fit of ClockEstimate (None: unknown, taken as 0)
+def fit_offset(fit, t):
+    return 0. if fit is None else fit["offset"] + fit["drift"] * (t - fit["ref"])
+
+
+# Convert a timestamp of the remote clock to the local one, the remote side can do it too once it has the fit
+def remote_to_local(fit, remote_t):
+    return remote_t - fit_offset(fit, remote_t - fit_offset(fit, remote_t))
+
+
+# Fit of the clock of the sender against itself, the common timebase of the samples of both sides
+LOCAL_CLOCK = {"ref": 0., "offset": 0., "drift": 0., "delay": 0., "samples": 0}
+
+
+# Client of the control server, calls look like XML-RPC calls: client.mark_sender_ready()
+class ControlClient:
+    def __init__(self, host, port):
+        self.addr = (host, port)
+        self.sock = None
+        self.next_id = 0
+        self.clock = ClockEstimate()
+
+    # Wait till the server is up
+    def connect(self, retry_interval=1):
+        while True:
+            try:
+                self.sock = socket.create_connection(self.addr)
+                break
+            except ConnectionRefusedError:
+                time.sleep(retry_interval)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return self
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def call(self, name, *args):
+        self.next_id += 1
+        send_frame(self.sock, MSG_CALL, CALL_ID.pack(self.next_id) + json.dumps([name, list(args)]).encode())
+        typ, payload = recv_frame(self.sock)
+        call_id, = CALL_ID.unpack_from(payload)
+        if call_id != self.next_id:
+            raise RuntimeError("Got the reply of call {} while waiting for {}".format(call_id, self.next_id))
+        if typ == MSG_ERROR:
+            raise RuntimeError("{} failed on the control server: {}".format(name, payload[CALL_ID.size:].decode()))
+        return json.loads(payload[CALL_ID.size:])
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return lambda *args: self.call(name, *args)
+
+    # Run a burst of ping exchanges, improving the clock estimate
+    def sync_clock(self, samples=CLOCK_SYNC_SAMPLES):
+        for seq in range(samples):
+            send_frame(self.sock, MSG_PING, PING_PAYLOAD.pack(seq, time.time()))
+            typ, payload = recv_frame(self.sock)
+            t3 = time.time()
+            if typ != MSG_PONG:
+                raise RuntimeError("Expected a pong, got message type {}".format(typ))
+            _, t0, t1, t2 = PONG_PAYLOAD.unpack(payload)
+            self.clock.add_exchange(t0, t1, t2, t3)
+        return self.clock.fit()
+
+
+def start_control_server(port, functions):
+    server = ControlServer(("0.0.0.0", port))
+    for fn in functions:
+        server.register_function(fn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, thread
@@ -0,0 +1,199 @@
+import collections
+import curses
+import re
+import sys
+import threading
+import time
+import xmlrpc.client
+
+
+# Seconds between refreshes of the dashboard
+DASHBOARD_INTERVAL = 1
+
+# Lines of the output kept for the log pane
+DASHBOARD_LOG_LINES = 200
+
+# Phase of the run, taken from the output of the tool
+PHASE_PATTERN = re.compile(r"^\[([a-z -]+)\] (starting|finished) experiment")
+
+# Utilisation thresholds (%) of the heatmap colours
+HEATMAP_LEVELS = [30, 70]
+
+
+# Stand-in for stdout while the dashboard owns the terminal, the output is shown in the log pane
+class CapturedOutput:
+    def __init__(self):
+        self.lines = collections.deque(maxlen=DASHBOARD_LOG_LINES)
+        self.all_lines = []
+        self.partial = ""
+        self.phase = None
+        self.lock = threading.Lock()
+
+    def write(self, text):
+        with self.lock:
+            self.partial += text
+            *lines, self.partial = self.partial.split("\n")
+            for line in lines:
+                self.lines.append(line)
+                self.all_lines.append(line)
+                match = PHASE_PATTERN.match(line)
+                if match is not None:
+                    self.phase = match.group(1) if match.group(2) == "starting" else None
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def tail(self, n):
+        with self.lock:
+            return list(self.lines)[-n:]
+
+
+# Live view of a run in the terminal: throughput of every flow, a heatmap of the CPUs and receiver counters
+# The sender metrics come from its telemetry sampler, the receiver ones are pulled over the coordination channel
+class Dashboard:
+    def __init__(self, telemetry, receiver_addr, port):
+        self.telemetry = telemetry
+        self.receiver_addr = receiver_addr
+        self.port = port
+        self.receiver_sample = None
+        self.output = CapturedOutput()
+        self.stdout = None
+        self.stopped = threading.Event()
+        self.thread = None
+        self.error = None
+        self.start_time = time.time()
+
+    def start(self):
+        self.stdout = sys.stdout
+        sys.stdout = self.output
+        try:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+        except BaseException:
+            sys.stdout = self.stdout
+            self.stdout = None
+            raise
+        return self
+
+    # curses.wrapper restores the terminal when the loop fails, the failure is reported once the output is replayed
+    def run(self):
+        try:
+            curses.wrapper(self.loop)
+        except Exception as e:
+            self.error = e
+
+    # Give the terminal back and replay the output of the run, safe to call more than once (e.g. when the run fails)
+    def stop(self):
+        if self.stdout is None:
+            return
+        try:
+            self.stopped.set()
+            self.thread.join(2 * DASHBOARD_INTERVAL)
+        finally:
+            sys.stdout = self.stdout
+            self.stdout = None
+            if not curses.isendwin():
+                try:
+                    curses.endwin()
+                except curses.error:
+                    pass
+        if self.output.partial:
+            self.output.all_lines.append(self.output.partial)
+        for line in self.output.all_lines:
+            print(line)
+        if self.error is not None:
+            print("[dashboard] stopped early: {}".format(self.error))
+
+    def poll_receiver(self, proxy):
+        try:
+            self.receiver_sample = proxy.get_telemetry()
+        except (OSError, xmlrpc.client.Error):
+            self.receiver_sample = None
+
+    def loop(self, screen):
+        curses.curs_set(0)
+        curses.use_default_colors()
+        curses.init_pair(1, curses.COLOR_BLACK, curses.COLOR_GREEN)
+        curses.init_pair(2, curses.COLOR_BLACK, curses.COLOR_YELLOW)
+        curses.init_pair(3, curses.COLOR_BLACK, curses.COLOR_RED)
+        screen.nodelay(True)
+
+        # A proxy of its own, the main thread uses the other one
+        proxy = xmlrpc.client.ServerProxy("http://{}:{}".format(self.receiver_addr, self.port), allow_none=True)
+        while not self.stopped.is_set():
+            self.poll_receiver(proxy)
+            screen.erase()
+            try:
+                self.draw(screen)
+            except curses.error:
+                # The terminal is too small for everything, draw what fits
+                pass
+            screen.refresh()
+            self.stopped.wait(DASHBOARD_INTERVAL)
+
+    def heatmap_attr(self, util):
+        if util < HEATMAP_LEVELS[0]:
+            return curses.color_pair(1)
+        if util < HEATMAP_LEVELS[1]:
+            return curses.color_pair(2)
+        return curses.color_pair(3)
+
+    def draw_heatmap(self, screen, y, label, cpu_util, width):
+        screen.addstr(y, 0, "{:<10}".format(label))
+        x = 10
+        for cpu, util in sorted(cpu_util.items(), key=lambda c: int(c[0])):
+            cell = "{:>3}:{:3.0f}% ".format(cpu, util)
+            if x + len(cell) >= width:
+                y += 1
+                x = 10
+            screen.addstr(y, x, cell, self.heatmap_attr(util))
+            x += len(cell)
+        return y + 1
+
+    def draw(self, screen):
+        height, width = screen.getmaxyx()
+        sender = self.telemetry.latest()
+        receiver = self.receiver_sample
+
+        # Header
+        elapsed = int(time.time() - self.start_time)
+        screen.addstr(0, 0, "zc_bench  phase: {:<16} elapsed: {:02d}:{:02d}".format(self.output.phase or "-", elapsed // 60, elapsed % 60), curses.A_BOLD)
+        screen.addstr(1, 0, "throughput (Gbps)  sender: {:8.3f}   receiver: {}".format(
+            0 if sender is None else sender["throughput"], "-" if receiver is None else "{:8.3f}".format(receiver["throughput"])))
+
+        # Per-CPU utilisation across cpus + affinity on both sides
+        y = 3
+        if sender is not None:
+            y = self.draw_heatmap(screen, y, "sender", sender["cpu_util"], width)
+        if receiver is not None:
+            y = self.draw_heatmap(screen, y, "receiver", {int(k): v for k, v in receiver["cpu_util"].items()}, width)
+
+        # Receiver counters
+        if receiver is not None:
+            net_rx = sum(receiver["softirqs"].get("NET_RX", {}).values())
+            rx_bytes = receiver["nic"].get("rx_bytes")
+            rx_dropped = receiver["nic"].get("rx_dropped")
+            screen.addstr(y + 1, 0, "receiver  NET_RX softirqs/s: {:10.0f}   NIC rx: {}   drops/s: {}".format(
+                net_rx, "-" if rx_bytes is None else "{:.3f} Gbps".format(rx_bytes * 8 / 1e9), "-" if rx_dropped is None else "{:.0f}".format(rx_dropped)))
+            y += 2
+
+        # Per-flow throughput, as many flows as fit
+        log_lines = 6
+        y += 1
+        screen.addstr(y, 0, "{:>8}  {:>12}  {:>12}".format("port", "sender Gbps", "receiver Gbps"), curses.A_UNDERLINE)
+        y += 1
+        sender_flows = {} if sender is None else {int(k): v for k, v in sender["flows"].items()}
+        receiver_flows = {} if receiver is None else {int(k): v for k, v in receiver["flows"].items()}
+        ports = sorted(set(sender_flows) | set(receiver_flows))
+        rows = max(0, height - y - log_lines - 1)
+        for port in ports[:rows]:
+            screen.addstr(y, 0, "{:>8}  {:>12}  {:>12}".format(
+                port, "{:.3f}".format(sender_flows[port]) if port in sender_flows else "-", "{:.3f}".format(receiver_flows[port]) if port in receiver_flows else "-"))
+            y += 1
+        if len(ports) > rows:
+            screen.addstr(y, 0, "... {} more flows".format(len(ports) - rows))
+
+        # Latest output of the tool
+        for i, line in enumerate(self.output.tail(log_lines - 1)):
+            screen.addstr(height - log_lines + i, 0, line[:width - 1])
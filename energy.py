@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+import argparse
+import glob
+import os
+import threading
+import time
+from topology import read_value
+
+
+# Seconds between readings of the energy counters, well below the time they take to wrap around
+ENERGY_INTERVAL = 1
+
+# RAPL domains measured: the packages and their DRAM, the core/uncore domains are part of the package
+RAPL_DOMAINS = ["package", "dram"]
+
+
+# Energy counters of the RAPL domains under root (intel-rapl:<package>[:<subdomain>]), keyed by
+# their name (package-0, package-0/dram), with the path of the domain and the range they wrap around at
+# The intel-rapl-mmio zones duplicate the package ones and are left out
+def rapl_domains(root="/"):
+    names, zones = {}, {}
+    for zone in sorted(glob.glob(os.path.join(root, "sys", "class", "powercap", "intel-rapl:*"))):
+        name = read_value(os.path.join(zone, "name"))
+        max_range = read_value(os.path.join(zone, "max_energy_range_uj"))
+        if name is None:
+            continue
+        names[os.path.basename(zone)] = name
+        if max_range is not None and read_value(os.path.join(zone, "energy_uj")) is not None:
+            zones[os.path.basename(zone)] = (name, zone, int(max_range))
+
+    domains = {}
+    for zone_id, (name, zone, max_range) in zones.items():
+        if not any(name.startswith(d) for d in RAPL_DOMAINS):
+            continue
+        # Subdomains are named after their package, intel-rapl:0:0 is in intel-rapl:0, even if the package can't be read
+        parent = ":".join(zone_id.split(":")[:2])
+        if parent != zone_id:
+            if parent not in names:
+                continue
+            name = "{}/{}".format(names[parent], name)
+        domains[name] = {"path": os.path.join(zone, "energy_uj"), "max_range": max_range}
+    return domains
+
+
+def read_energy(domains):
+    energy = {}
+    for name, domain in domains.items():
+        value = read_value(domain["path"])
+        if value is not None:
+            energy[name] = int(value)
+    return energy
+
+
+# Energy used between two readings of a counter (uJ), the counter wraps around at max_range
+def energy_delta(before, after, max_range):
+    delta = after - before
+    return delta + max_range if delta < 0 else delta
+
+
+# Watts per Gbps and joules per GB transferred at a power and a throughput
+def energy_efficiency(power, throughput):
+    if throughput <= 0:
+        return {"watts_per_gbps": None, "joules_per_gb": None}
+    return {"watts_per_gbps": power / throughput, "joules_per_gb": power * 8 / throughput}
+
+
+# Energy used by the RAPL domains of the host over a run, sampled often enough to catch every wraparound
+class EnergyMeter:
+    def __init__(self, root="/", interval=ENERGY_INTERVAL, pin_cpus=None):
+        self.domains = rapl_domains(root)
+        self.interval = interval
+        self.pin_cpus = pin_cpus
+        self.energy = {name: 0 for name in self.domains}
+        self.last = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.started = None
+        self.elapsed = 0.
+
+    # Add the energy used since the last reading
+    def sample(self):
+        with self.lock:
+            current = read_energy(self.domains)
+            for name, value in current.items():
+                if name in self.last:
+                    self.energy[name] += energy_delta(self.last[name], value, self.domains[name]["max_range"])
+            self.last.update(current)
+
+    def run(self):
+        if self.pin_cpus is not None:
+            os.sched_setaffinity(0, self.pin_cpus)
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self.energy = {name: 0 for name in self.domains}
+        self.last = read_energy(self.domains)
+        self.started = time.time()
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.sample()
+        self.elapsed = time.time() - self.started
+        return self.result()
+
+    # Energy of every domain (J), and the average power of all of them (W)
+    def result(self):
+        joules = {name: uj / 1e6 for name, uj in self.energy.items()}
+        return {"domains": joules, "elapsed": self.elapsed, "power": 0. if self.elapsed == 0 else sum(joules.values()) / self.elapsed}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure the power of the RAPL domains of this host.")
+
+    # Add arguments
+    parser.add_argument("--root", type=str, default="/", help="Read a copy of sysfs under this directory instead.")
+    parser.add_argument("--duration", type=float, default=5, help="Seconds to measure for.")
+    parser.add_argument("--interval", type=float, default=ENERGY_INTERVAL, help="Seconds between readings of the counters.")
+
+    # Parse and verify arguments
+    args = parser.parse_args()
+
+    if args.duration <= 0 or args.interval <= 0:
+        print("Can't set --duration/--interval <= 0.")
+        exit(1)
+
+    # Return parsed and verified arguments
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    meter = EnergyMeter(args.root, args.interval)
+    if len(meter.domains) == 0:
+        print("[energy] no RAPL domains under {}".format(os.path.join(args.root, "sys", "class", "powercap")))
+        exit(1)
+
+    meter.start()
+    time.sleep(args.duration)
+    result = meter.stop()
+    for name, joules in sorted(result["domains"].items()):
+        print("[energy] {}: {:.3f} J, {:.3f} W".format(name, joules, joules / result["elapsed"]))
+    print("[energy] total: {:.3f} W".format(result["power"]))
@@ -0,0 +1,168 @@
+import contextlib
+import importlib
+import io
+import json
+import os
+from scenario import *
+
+
+# Directory of the tool
+DIR = os.path.split(os.path.realpath(__file__))[0]
+
+
+# Specification of a run: parameters of both sides as in a scenario (the options of the tools, with _ for -),
+# parameters of only one side, the metrics to measure and the network setup of both hosts
+class Experiment:
+    def __init__(self, metrics=None, params=None, sender=None, receiver=None, setup=None, experiment="experiment", label="default", name=None):
+        self.experiment = experiment
+        self.label = label
+        self.name = name if name is not None else "{}_{}".format(experiment, label)
+        self.metrics = ["throughput", "utilisation"] if metrics is None else list(metrics)
+        self.setup = [] if setup is None else list(setup)
+        self.params = merge_params(params or {})
+        self.side_params = {"sender": merge_params(self.params, sender or {}), "receiver": merge_params(self.params, receiver or {})}
+
+        for m in self.metrics:
+            if m not in METRICS:
+                raise ValueError("Unknown metric {} (metrics: {})".format(m, ", ".join(METRICS)))
+
+    # Experiment of a point of a scenario
+    @staticmethod
+    def from_point(point):
+        experiment = Experiment(point.metrics, point.params, setup=point.setup, experiment=point.scenario, label=point.label, name=point.name())
+        experiment.side_params = {side: dict(params) for side, params in point.side_params.items()}
+        return experiment
+
+    def argv(self, side):
+        return side_argv(side, self.side_params[side], self.metrics)
+
+
+# Parse the command line of a side with its own parser, raises ValueError with what it printed if it is rejected
+def parse_side_args(module, argv):
+    out = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(out):
+            return module.parse_args(argv)
+    except SystemExit:
+        raise ValueError(out.getvalue().strip())
+
+
+# Everything measured in a run: metrics by (side, name), throughput series of every flow by (side, phase) then flow,
+# breakdowns by (side, kind), and the manifest with the configuration of both sides
+class Result:
+    def __init__(self, run_id, manifest, metrics, flow_series, breakdowns):
+        self.run_id = run_id
+        self.manifest = manifest
+        self.metrics = metrics
+        self.flow_series = flow_series
+        self.breakdowns = breakdowns
+
+    def metric(self, name, side="sender", default=None):
+        return self.metrics.get((side, name), default)
+
+    def throughput(self):
+        return self.metric("throughput")
+
+    @staticmethod
+    def from_record(record, run_id=None):
+        flow_series = {}
+        for side, phase, flow, second, t, stamp in record.flow_series:
+            flow_series.setdefault((side, phase), {}).setdefault(flow, []).append(t)
+        breakdowns = {}
+        for side, kind, category, value in record.breakdowns:
+            breakdowns.setdefault((side, kind), {})[category] = value
+        return Result(run_id, record.manifest, {(side, name): value for side, name, value in record.metrics}, flow_series, breakdowns)
+
+    # Result of a run recorded in a results store, the flow series are those of the metrics of the run
+    @staticmethod
+    def from_store(store, run_id):
+        runs = store.runs(run_id=run_id)
+        if len(runs) == 0:
+            raise KeyError("No run {} in {}".format(run_id, store.path))
+        manifest = json.loads(runs[0]["manifest"])
+
+        flow_series, breakdowns = {}, {}
+        for side in ["sender", "receiver"]:
+            for phase in [m for m in METRICS if manifest.get(m.replace("-", "_"))]:
+                series = store.flow_series(run_id, side, phase)
+                if len(series) > 0:
+                    flow_series[(side, phase)] = series
+            for kind in ["util", "cache"]:
+                breakdown = store.breakdown(run_id, kind, side)
+                if len(breakdown) > 0:
+                    breakdowns[(side, kind)] = breakdown
+        return Result(run_id, manifest, store.run_metrics(run_id), flow_series, breakdowns)
+
+
+# Runs experiments from Python: the receiver is started by the agent on the other host (run_scenario.py --agent),
+# the sender runs in this process with the given collectors, and the run is appended to the results store
+# The tools are only imported when the first experiment runs
+class Runner:
+    def __init__(self, receiver, addr, iface=None, results_dir=None, collectors=None, open_files=0, verbose=False):
+        self.receiver = receiver
+        self.addr = addr
+        self.iface = iface
+        self.results_dir = os.path.join(DIR, "results") if results_dir is None else results_dir
+        self.store = os.path.join(self.results_dir, "results.db")
+        self.collectors = [] if collectors is None else list(collectors)
+        self.open_files = open_files
+        self.verbose = verbose
+        self.agent = None
+
+    def connect(self):
+        if self.agent is None:
+            self.agent = importlib.import_module("run_scenario").connect_agent(self.receiver)
+        return self.agent
+
+    def sender_argv(self, experiment):
+        argv = ["--receiver", self.receiver, "--addr", self.addr] + experiment.argv("sender")
+        argv += ["--store", self.store, "--experiment", experiment.experiment, "--label", experiment.label, "--output", os.path.join(self.results_dir, experiment.name)]
+        if self.iface is not None:
+            argv += ["--iface", self.iface]
+        if self.verbose:
+            argv.append("--verbose")
+        return argv
+
+    # Run an experiment, extra collectors are measured around every phase of the sender on top of the ones of the runner
+    def run(self, experiment, collectors=None):
+        os.makedirs(self.results_dir, exist_ok=True)
+        sender = importlib.import_module("run_experiment_sender")
+        run_scenario = importlib.import_module("run_scenario")
+        argv = self.sender_argv(experiment)
+        parse_side_args(sender, argv)
+
+        # Configure both NICs for the experiment, and restore them after it
+        agent = self.connect()
+        nic = None if len(experiment.setup) == 0 else run_scenario.tool_nic_config(self.iface)
+        try:
+            if len(experiment.setup) > 0:
+                print("[experiment] network setup: {}".format(" ".join(experiment.setup)))
+                setup_failed = run_scenario.run_network_setup(nic, experiment.setup) + agent.setup_network(experiment.setup)
+                if setup_failed > 0:
+                    raise RuntimeError("{} failed ({} NIC changes failed)".format(experiment.name, setup_failed))
+
+            # Start the receiver first, the sender waits till it is up
+            # Whatever happens to the sender, the receiver is waited for (and stopped if the sender failed), so the agent can start the next one
+            run_scenario.raise_open_files(self.open_files)
+            agent.start_receiver(experiment.argv("receiver"), experiment.name, self.open_files)
+            error = None
+            try:
+                record, run_id = sender.main(argv, self.collectors + list(collectors or []))
+                sender_exit = 0
+            except SystemExit as e:
+                record, run_id = None, None
+                sender_exit = 1 if e.code is None else e.code
+            except BaseException as e:
+                record, run_id, sender_exit, error = None, None, 1, e
+            receiver_exit = agent.wait_receiver() if sender_exit == 0 else agent.stop_receiver()
+            if error is not None:
+                raise error
+        finally:
+            if nic is not None:
+                nic.restore()
+            if len(experiment.setup) > 0:
+                agent.restore_network()
+
+        if sender_exit != 0 or receiver_exit != 0:
+            raise RuntimeError("{} failed (sender exit {}, receiver exit {})".format(experiment.name, sender_exit, receiver_exit))
+        return Result.from_record(record, run_id)
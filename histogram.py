@@ -0,0 +1,306 @@
+import abc
+import math
+
+
+# Base class for histograms with a fixed bucket layout
+# Subclasses map values to bucket indices and back, everything else is shared
+class Histogram(abc.ABC):
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.
+        self.min = None
+        self.max = None
+
+    @abc.abstractmethod
+    def bucket_index(self, value):
+        pass
+
+    @abc.abstractmethod
+    def bucket_range(self, idx):
+        pass
+
+    def compatible(self, other):
+        return type(self) == type(other)
+
+    # Add count samples of the given value
+    def record(self, value, count=1):
+        if value < 0:
+            raise ValueError("Can't record negative value {}".format(value))
+        if count <= 0:
+            return
+
+        idx = self.bucket_index(value)
+        self.buckets[idx] = self.buckets.get(idx, 0) + count
+        self.count += count
+        self.total += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    # Add the samples of another histogram (e.g. from another CPU, host or trial)
+    def merge(self, other):
+        if not self.compatible(other):
+            raise ValueError("Can't merge histograms with different bucket layouts")
+
+        for idx, c in other.buckets.items():
+            self.buckets[idx] = self.buckets.get(idx, 0) + c
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def mean(self):
+        return 0 if self.count == 0 else self.total / self.count
+
+    # Value at the given percentile (0-100), reported as the middle of its bucket
+    def percentile(self, q):
+        if self.count == 0:
+            return 0
+        if not (0 <= q <= 100):
+            raise ValueError("Can't compute percentile outside of [0, 100]")
+
+        rank = max(1, math.ceil(q / 100 * self.count))
+        seen = 0
+        for idx in sorted(self.buckets):
+            seen += self.buckets[idx]
+            if seen >= rank:
+                lo, hi = self.bucket_range(idx)
+                return min(max((lo + hi) / 2, self.min), self.max)
+        return self.max
+
+    def percentiles(self, qs):
+        return {q: self.percentile(q) for q in qs}
+
+    # Counts of all buckets in order, as (low, high, count)
+    def items(self):
+        return [self.bucket_range(idx) + (self.buckets[idx],) for idx in sorted(self.buckets)]
+
+    # Serialise to plain types to be sent over XML-RPC or written to disk
+    # NOTE: Counts are floats since XML-RPC can't marshal integers above 2^31, and an empty histogram has a min/max
+    # of 0 since it can't marshal None without allow_none
+    def to_dict(self):
+        return {
+            "buckets": [[idx, float(c)] for idx, c in sorted(self.buckets.items())],
+            "count": float(self.count),
+            "total": float(self.total),
+            "min": 0. if self.min is None else self.min,
+            "max": 0. if self.max is None else self.max,
+        }
+
+    def load_dict(self, d):
+        self.buckets = {int(idx): int(c) for idx, c in d["buckets"]}
+        self.count = int(d["count"])
+        self.total = d["total"]
+        self.min = None if self.count == 0 else d["min"]
+        self.max = None if self.count == 0 else d["max"]
+        return self
+
+
+# HDR-style histogram with logarithmic buckets split into linear sub-buckets
+# Values below 2^bits are exact, larger values have a relative error of at most 2^(1 - bits)
+class LogHistogram(Histogram):
+    def __init__(self, bits=8):
+        super().__init__()
+        if not (1 <= bits <= 16):
+            raise ValueError("Can't set bits outside of [1, 16].")
+        self.bits = bits
+
+    def compatible(self, other):
+        return super().compatible(other) and self.bits == other.bits
+
+    # New empty histogram with the same layout
+    def empty(self):
+        return LogHistogram(self.bits)
+
+    def bucket_index(self, value):
+        value = int(value)
+        if value < (1 << self.bits):
+            return value
+
+        shift = value.bit_length() - self.bits
+        half = 1 << (self.bits - 1)
+        return (1 << self.bits) + (shift - 1) * half + (value >> shift) - half
+
+    def bucket_range(self, idx):
+        if idx < (1 << self.bits):
+            return idx, idx
+
+        half = 1 << (self.bits - 1)
+        shift, sub = divmod(idx - (1 << self.bits), half)
+        shift += 1
+        sub += half
+        return sub << shift, ((sub + 1) << shift) - 1
+
+    def to_dict(self):
+        d = super().to_dict()
+        d["type"] = "log"
+        d["bits"] = self.bits
+        return d
+
+
+# Histogram with a fixed number of buckets, the last one is open-ended
+# Subclasses define the bucket boundaries in terms of width
+class BucketHistogram(Histogram):
+    layout = None
+
+    def __init__(self, width, num_buckets):
+        super().__init__()
+        if width <= 0 or num_buckets <= 0:
+            raise ValueError("Can't create a histogram with width {} and {} buckets".format(width, num_buckets))
+        self.width = width
+        self.num_buckets = num_buckets
+
+    def compatible(self, other):
+        return super().compatible(other) and (self.width, self.num_buckets) == (other.width, other.num_buckets)
+
+    # New empty histogram with the same layout
+    def empty(self):
+        return type(self)(self.width, self.num_buckets)
+
+    # Add pre-aggregated counts, one per bucket (e.g. as reported by the kernel)
+    # The samples of a bucket are taken to be in its middle, so the mean isn't biased towards the low bounds
+    def record_counts(self, counts):
+        if len(counts) > self.num_buckets:
+            raise ValueError("Got {} bucket counts for a histogram with {} buckets".format(len(counts), self.num_buckets))
+
+        for idx, c in enumerate(counts):
+            if c > 0:
+                lo, hi = self.bucket_range(idx)
+                self.record((lo + hi) / 2, c)
+
+    # Fraction of samples in each bucket
+    def fractions(self):
+        if self.count == 0:
+            return [0 for _ in range(self.num_buckets)]
+        return [self.buckets.get(idx, 0) / self.count for idx in range(self.num_buckets)]
+
+    def labels(self):
+        return ["{:g}-{:g}".format(*self.bucket_range(idx)) for idx in range(self.num_buckets)]
+
+    def to_dict(self):
+        d = super().to_dict()
+        d["type"] = self.layout
+        d["width"] = self.width
+        d["num_buckets"] = self.num_buckets
+        return d
+
+
+# Buckets of equal width: [0, w), [w, 2w), ...
+class LinearHistogram(BucketHistogram):
+    layout = "linear"
+
+    def bucket_index(self, value):
+        return min(int(value // self.width), self.num_buckets - 1)
+
+    def bucket_range(self, idx):
+        return idx * self.width, (idx + 1) * self.width
+
+
+# Buckets doubling in width: [0, w), [w, 2w), [2w, 4w), ...
+class Log2Histogram(BucketHistogram):
+    layout = "log2"
+
+    def bucket_index(self, value):
+        return min(int(value // self.width).bit_length(), self.num_buckets - 1)
+
+    def bucket_range(self, idx):
+        if idx == 0:
+            return 0, self.width
+        return self.width * 2 ** (idx - 1), self.width * 2 ** idx
+
+
+# Layouts of fixed bucket histograms
+BUCKET_LAYOUTS = {
+    "linear": LinearHistogram,
+    "log2": Log2Histogram,
+}
+
+
+def make_bucket_histogram(layout, width, num_buckets):
+    if layout not in BUCKET_LAYOUTS:
+        raise ValueError("Unknown histogram layout {}".format(layout))
+    return BUCKET_LAYOUTS[layout](width, num_buckets)
+
+
+# A histogram for the whole run, along with one per CPU and one per time interval
+# All of them share the bucket layout of the given histogram
+class HistogramGroup:
+    def __init__(self, hist, interval=None):
+        self.total = hist
+        self.interval = interval
+        self.per_cpu = {}
+        self.per_interval = {}
+        self.start = None
+
+    # Add pre-aggregated bucket counts reported by a CPU at a time (s)
+    def record_counts(self, counts, cpu=None, timestamp=None):
+        self.total.record_counts(counts)
+
+        if cpu is not None:
+            if cpu not in self.per_cpu:
+                self.per_cpu[cpu] = self.total.empty()
+            self.per_cpu[cpu].record_counts(counts)
+
+        if timestamp is not None and self.interval is not None:
+            if self.start is None:
+                self.start = timestamp
+            idx = int((timestamp - self.start) // self.interval)
+            if idx not in self.per_interval:
+                self.per_interval[idx] = self.total.empty()
+            self.per_interval[idx].record_counts(counts)
+
+    # Add the histograms of another run (e.g. another trial), intervals are aligned by their start
+    def merge(self, other):
+        if self.interval != other.interval:
+            raise ValueError("Can't merge histogram groups with different intervals")
+
+        self.total.merge(other.total)
+        for key, hist in other.per_cpu.items():
+            self.per_cpu.setdefault(key, self.total.empty()).merge(hist)
+        for key, hist in other.per_interval.items():
+            self.per_interval.setdefault(key, self.total.empty()).merge(hist)
+        return self
+
+    # Histograms of each interval in order, as (start offset in s, histogram)
+    def intervals(self):
+        return [(idx * self.interval, self.per_interval[idx]) for idx in sorted(self.per_interval)]
+
+    # NOTE: XML-RPC only allows string keys, so the maps are stored as lists of pairs
+    def to_dict(self):
+        return {
+            "total": self.total.to_dict(),
+            "interval": self.interval,
+            "per_cpu": [[cpu, hist.to_dict()] for cpu, hist in sorted(self.per_cpu.items())],
+            "per_interval": [[idx, hist.to_dict()] for idx, hist in sorted(self.per_interval.items())],
+        }
+
+
+def histogram_group_from_dict(d):
+    group = HistogramGroup(histogram_from_dict(d["total"]), d["interval"])
+    group.per_cpu = {int(cpu): histogram_from_dict(h) for cpu, h in d["per_cpu"]}
+    group.per_interval = {int(idx): histogram_from_dict(h) for idx, h in d["per_interval"]}
+    return group
+
+
+# Recreate a histogram from the output of to_dict()
+def histogram_from_dict(d):
+    if d["type"] == "log":
+        hist = LogHistogram(d["bits"])
+    elif d["type"] in BUCKET_LAYOUTS:
+        hist = make_bucket_histogram(d["type"], d["width"], d["num_buckets"])
+    else:
+        raise ValueError("Unknown histogram type {}".format(d["type"]))
+    return hist.load_dict(d)
+
+
+# Merge any number of compatible histograms into a new one
+def merge_histograms(hists):
+    merged = None
+    for hist in hists:
+        if merged is None:
+            merged = histogram_from_dict(hist.to_dict())
+        else:
+            merged.merge(hist)
+    return merged
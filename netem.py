@@ -0,0 +1,106 @@
+import subprocess
+
+
+# Intermediate device the ingress traffic is redirected to, netem only shapes egress
+IFB_DEVICE = "ifb-zcb"
+
+# Loss recovery counters, from /proc/net/snmp (Tcp) and /proc/net/netstat (TcpExt)
+TCP_COUNTERS = {
+    "Tcp": ["InSegs", "OutSegs", "RetransSegs", "InErrs"],
+    "TcpExt": ["TCPLostRetransmit", "TCPFastRetrans", "TCPSlowStartRetrans", "TCPTimeouts", "TCPLossProbes", "TCPSackRecovery",
+               "TCPSACKReorder", "TCPSackShifted", "TCPSackMerged", "TCPDSACKRecv", "TCPDSACKOldSent", "TCPOFOQueue", "TCPRcvQDrop"],
+}
+
+# Counters recorded as metrics of a run, summed over its experiments
+TCP_METRICS = {"RetransSegs": "retransmits", "TCPSackRecovery": "sack_recoveries", "TCPTimeouts": "rto_timeouts", "TCPOFOQueue": "ofo_queued"}
+
+
+def tc(*argv, check=True):
+    p = subprocess.run(["tc"] + list(argv), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
+    if check and p.returncode != 0:
+        raise RuntimeError("tc {} failed: {}".format(" ".join(argv), p.stdout.strip()))
+
+
+def ip_link(*argv, check=True):
+    p = subprocess.run(["ip", "link"] + list(argv), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
+    if check and p.returncode != 0:
+        raise RuntimeError("ip link {} failed: {}".format(" ".join(argv), p.stdout.strip()))
+
+
+# Options of the netem qdisc: loss as an inverse rate (as --packet-drop), delay and jitter in ms,
+# reordering in % (reordered packets skip the delay, so it needs one)
+def netem_options(packet_drop=0, delay=0, jitter=0, reorder=0):
+    options = []
+    if delay > 0:
+        options += ["delay", "{}ms".format(delay)] + (["{}ms".format(jitter)] if jitter > 0 else [])
+    if packet_drop > 0:
+        options += ["loss", "{}%".format(100 / packet_drop)]
+    if reorder > 0:
+        options += ["reorder", "{}%".format(reorder)]
+    return options
+
+
+# Loss, delay and reordering injection with netem on an interface, either on what it receives
+# (redirected through an ifb device) or on what it sends
+class Netem:
+    def __init__(self, iface, ingress=True):
+        self.iface = iface
+        self.ingress = ingress
+        self.applied = False
+
+    def apply(self, packet_drop=0, delay=0, jitter=0, reorder=0):
+        options = netem_options(packet_drop, delay, jitter, reorder)
+        if len(options) == 0:
+            return False
+        self.clear()
+
+        dev = self.iface
+        self.applied = True
+        try:
+            if self.ingress:
+                dev = IFB_DEVICE
+                try:
+                    subprocess.call(["modprobe", "ifb", "numifbs=0"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                except OSError:
+                    # No modprobe, ifb may be built in
+                    pass
+                ip_link("add", IFB_DEVICE, "type", "ifb")
+                ip_link("set", IFB_DEVICE, "up")
+                tc("qdisc", "add", "dev", self.iface, "handle", "ffff:", "ingress")
+                # Match everything with u32, matchall isn't built into every kernel
+                tc("filter", "add", "dev", self.iface, "parent", "ffff:", "protocol", "all", "u32", "match", "u32", "0", "0",
+                   "action", "mirred", "egress", "redirect", "dev", IFB_DEVICE)
+            tc("qdisc", "replace", "dev", dev, "root", "netem", *options)
+        except RuntimeError:
+            # Don't leave a half set up redirect behind
+            self.clear()
+            raise
+        print("[netem] {} {}: {}".format(self.iface, "ingress" if self.ingress else "egress", " ".join(options)))
+        return True
+
+    def clear(self):
+        if self.ingress:
+            tc("qdisc", "del", "dev", self.iface, "ingress", check=False)
+            ip_link("del", IFB_DEVICE, check=False)
+        elif self.applied:
+            tc("qdisc", "del", "dev", self.iface, "root", check=False)
+        self.applied = False
+
+
+def read_tcp_counters():
+    counters = {}
+    for path in ["/proc/net/snmp", "/proc/net/netstat"]:
+        with open(path) as f:
+            lines = f.readlines()
+        # Lines come in pairs: names, then values
+        for names, values in zip(lines[::2], lines[1::2]):
+            names, values = names.split(), values.split()
+            group = names[0].rstrip(":")
+            for name, value in zip(names[1:], values[1:]):
+                if name in TCP_COUNTERS.get(group, []):
+                    counters[name] = int(value)
+    return counters
+
+
+def tcp_counters_delta(before, after):
+    return {name: after[name] - before[name] for name in after if name in before}
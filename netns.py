@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import subprocess
+import sys
+
+
+# Directory of this project
+DIR = os.path.split(os.path.realpath(__file__))[0]
+
+# Namespaces of both sides, joined by a veth pair
+NETNS = {"sender": "zcb-sender", "receiver": "zcb-receiver"}
+VETH = {"sender": "zcb-s", "receiver": "zcb-r"}
+ADDRS = {"sender": "10.200.0.1", "receiver": "10.200.0.2"}
+PREFIX_LEN = 24
+
+# Burst and queueing latency of the token bucket emulating the link rate
+SHAPING_BURST = "1mb"
+SHAPING_LATENCY = "10ms"
+
+
+def run(*argv, netns=None, check=True):
+    prefix = [] if netns is None else ["ip", "netns", "exec", netns]
+    p = subprocess.run(prefix + list(argv), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
+    if check and p.returncode != 0:
+        raise RuntimeError("{} failed: {}".format(" ".join(prefix + list(argv)), p.stdout.strip()))
+    return p.stdout
+
+
+# Two network namespaces joined by a veth pair (with one or more queues), on one machine
+# The sender and the receiver run in them unchanged, the coordination channels go over the veth pair as well
+class NetnsLoopback:
+    def __init__(self, queues=1, rate=None):
+        self.queues = queues
+        self.rate = rate
+
+    def create(self):
+        self.destroy()
+        for ns in NETNS.values():
+            run("ip", "netns", "add", ns)
+            run("ip", "link", "set", "lo", "up", netns=ns)
+
+        queue_opts = ["numtxqueues", str(self.queues), "numrxqueues", str(self.queues)]
+        run("ip", "link", "add", VETH["sender"], *queue_opts, "type", "veth", "peer", "name", VETH["receiver"], *queue_opts)
+        for side in ["sender", "receiver"]:
+            run("ip", "link", "set", VETH[side], "netns", NETNS[side])
+            run("ip", "addr", "add", "{}/{}".format(ADDRS[side], PREFIX_LEN), "dev", VETH[side], netns=NETNS[side])
+            run("ip", "link", "set", VETH[side], "up", netns=NETNS[side])
+            if self.rate is not None:
+                self.shape(side)
+        print("[netns] {} ({}) <-> {} ({}), {} queues, rate {}".format(
+            NETNS["sender"], ADDRS["sender"], NETNS["receiver"], ADDRS["receiver"], self.queues, self.rate or "unlimited"))
+
+    # Emulate the link rate with a token bucket on the egress of each side
+    def shape(self, side):
+        run("tc", "qdisc", "replace", "dev", VETH[side], "root", "tbf", "rate", self.rate, "burst", SHAPING_BURST, "latency", SHAPING_LATENCY, netns=NETNS[side])
+
+    # Deleting the namespaces deletes the veth pair too
+    def destroy(self):
+        for ns in NETNS.values():
+            run("ip", "netns", "del", ns, check=False)
+
+    # Command line running argv in the namespace of a side
+    def exec_argv(self, side, argv):
+        return ["ip", "netns", "exec", NETNS[side]] + list(argv)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run a scenario on one machine, the sender and the receiver in network namespaces joined by a veth pair.")
+
+    # Add arguments
+    parser.add_argument("scenario", nargs="?", type=str, help="Name or path of the scenario file.")
+    parser.add_argument("--queues", type=int, default=1, help="Number of TX/RX queues of the veth pair.")
+    parser.add_argument("--rate", type=str, default=None, help="Emulated link rate in tc units (e.g. 10gbit).")
+    parser.add_argument("--results-dir", type=str, default=os.path.join(DIR, "results", "netns"), help="Directory for the logs, raw outputs and results store.")
+    parser.add_argument("--setup-only", action="store_true", help="Only create the namespaces, e.g. to run the experiment scripts by hand.")
+    parser.add_argument("--teardown", action="store_true", help="Only delete the namespaces.")
+    parser.add_argument("scenario_args", nargs=argparse.REMAINDER, help="Extra arguments of run_scenario.py (after --).")
+
+    # Parse and verify arguments
+    args = parser.parse_args()
+
+    if args.scenario is None and not (args.setup_only or args.teardown):
+        print("Please provide a scenario unless running with --setup-only/--teardown.")
+        exit(1)
+
+    if args.queues < 1:
+        print("Can't set --queues < 1.")
+        exit(1)
+
+    if os.geteuid() != 0:
+        print("Network namespaces need root.")
+        exit(1)
+
+    if args.scenario_args[:1] == ["--"]:
+        args.scenario_args = args.scenario_args[1:]
+
+    # Return parsed and verified arguments
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    backend = NetnsLoopback(args.queues, args.rate)
+
+    if args.teardown:
+        backend.destroy()
+        exit(0)
+
+    backend.create()
+    if args.setup_only:
+        exit(0)
+
+    # The agent serves the receiver side, the scenario drives it from the sender side
+    # Both run on this host, so the agent gets a directory of its own, or the outputs of both sides would overwrite each other
+    agent_dir = os.path.join(args.results_dir, "receiver")
+    os.makedirs(agent_dir, exist_ok=True)
+    agent = subprocess.Popen(backend.exec_argv("receiver", [os.path.join(DIR, "run_scenario.py"), "--agent", "--iface", VETH["receiver"],
+                                                             "--results-dir", agent_dir]), stdin=subprocess.DEVNULL)
+    try:
+        code = subprocess.call(backend.exec_argv("sender", [os.path.join(DIR, "run_scenario.py"), args.scenario, "--receiver", ADDRS["receiver"],
+                                                            "--addr", ADDRS["receiver"], "--iface", VETH["sender"], "--results-dir", args.results_dir] + args.scenario_args))
+    finally:
+        agent.terminate()
+        agent.wait()
+        backend.destroy()
+    sys.exit(code)
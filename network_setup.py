@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+from nic_config import *
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Configure the NIC and the network stack for an experiment, changing only what differs.", parents=[setup_parser()])
+
+    # Add arguments
+    parser.add_argument("iface", type=str, help="Interface to configure.")
+    parser.add_argument("--sender", dest="role", action="store_const", const="sender", default=None, help="Configure the sender.")
+    parser.add_argument("--receiver", dest="role", action="store_const", const="receiver", help="Configure the receiver.")
+    parser.add_argument("--snapshot", type=str, default=None, help="File keeping the original configuration till --restore (default: {}).".format(SNAPSHOT_FILE.format("<iface>")))
+    parser.add_argument("--restore", action="store_true", help="Restore the configuration from before the first change.")
+    parser.add_argument("--show", action="store_true", help="Print the current configuration.")
+
+    # Parse and verify arguments
+    args = parser.parse_args()
+    if args.snapshot is None:
+        args.snapshot = SNAPSHOT_FILE.format(args.iface)
+
+    # Return parsed and verified arguments
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    nic = NicConfig(args.iface, args.snapshot)
+
+    if args.show:
+        print(json.dumps(nic.state(), indent=2, sort_keys=True))
+        exit(0)
+
+    failed = nic.restore() if args.restore else nic.configure(desired_state(args, nic.state()))
+    exit(1 if len(failed) > 0 else 0)
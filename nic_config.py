@@ -0,0 +1,338 @@
+import argparse
+import glob
+import json
+import os
+import re
+import subprocess
+from steering import *
+
+
+# Offloads managed by the tool, by their ethtool -K name and their ethtool -k name
+MANAGED_FEATURES = {
+    "lro": "large-receive-offload",
+    "gso": "generic-segmentation-offload",
+    "gro": "generic-receive-offload",
+    "tso": "tcp-segmentation-offload",
+    "ntuple": "ntuple-filters",
+}
+
+# Interrupt coalescing settings managed by the tool, by their ethtool -C name
+MANAGED_COALESCE = ["adaptive-rx", "rx-usecs", "tx-usecs"]
+
+# Socket buffer and flow steering sysctls managed by the tool
+MANAGED_SYSCTLS = ["net.core.rmem_max", "net.core.wmem_max", "net.ipv4.tcp_rmem", "net.ipv4.tcp_wmem", "net.core.rps_sock_flow_entries"]
+
+# Socket buffer sizes of --sock-size, large enough for the windows of the tcp-buffer scenario
+SOCK_SIZE_SYSCTLS = {
+    "net.core.rmem_max": "268435456",
+    "net.core.wmem_max": "268435456",
+    "net.ipv4.tcp_rmem": "4096 131072 268435456",
+    "net.ipv4.tcp_wmem": "4096 16384 268435456",
+}
+
+# Size of the global flow table of aRFS, split evenly across the RX queues
+ARFS_FLOW_ENTRIES = 32768
+
+# Default snapshot of the original state, kept till it is restored
+SNAPSHOT_FILE = "/tmp/zc_bench_nic_{}.json"
+
+RSS_TABLE_PATTERN = re.compile(r"^\s*\d+:((\s+\d+)+)\s*$")
+
+
+def run_command(argv):
+    try:
+        p = subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
+    except OSError as e:
+        return 1, str(e)
+    return p.returncode, p.stdout
+
+
+def read_file(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def sysctl_path(name):
+    return os.path.join("/proc/sys", *name.split("."))
+
+
+def read_features(iface):
+    code, out = run_command(["ethtool", "-k", iface])
+    if code != 0:
+        return {}
+    values = {}
+    for line in out.splitlines():
+        comps = line.strip().split(":")
+        if len(comps) == 2 and comps[0] in MANAGED_FEATURES.values():
+            values[comps[0]] = comps[1].split()[0] == "on"
+    return {short: values[name] for short, name in MANAGED_FEATURES.items() if name in values}
+
+
+# Current ring sizes (the second section of ethtool -g)
+def read_rings(iface):
+    code, out = run_command(["ethtool", "-g", iface])
+    if code != 0 or "Current hardware settings:" not in out:
+        return {}
+    rings = {}
+    for line in out.split("Current hardware settings:")[1].splitlines():
+        comps = line.split(":")
+        if len(comps) == 2 and comps[0].strip() in ["RX", "TX"] and comps[1].strip().isdigit():
+            rings[comps[0].strip().lower()] = int(comps[1])
+    return rings
+
+
+# Interrupt coalescing (ethtool -c), the adaptive modes as booleans
+def read_coalesce(iface):
+    code, out = run_command(["ethtool", "-c", iface])
+    if code != 0:
+        return {}
+    coalesce = {}
+    for line in out.splitlines():
+        if line.startswith("Adaptive RX:"):
+            if line.split()[2] in ["on", "off"]:
+                coalesce["adaptive-rx"] = line.split()[2] == "on"
+            continue
+        comps = line.split(":")
+        if len(comps) == 2 and comps[0].strip() in MANAGED_COALESCE and comps[1].strip().isdigit():
+            coalesce[comps[0].strip()] = int(comps[1])
+    return coalesce
+
+
+# RSS indirection table, the RX queue of every entry
+def read_rss(iface):
+    code, out = run_command(["ethtool", "-x", iface])
+    if code != 0:
+        return []
+    table = []
+    for line in out.splitlines():
+        match = RSS_TABLE_PATTERN.match(line)
+        if match is not None:
+            table += [int(q) for q in match.group(1).split()]
+    return table
+
+
+def read_rps_flow_cnt(iface):
+    counts = {}
+    for path in sorted(glob.glob("/sys/class/net/{}/queues/rx-*/rps_flow_cnt".format(iface))):
+        value = read_file(path)
+        if value is not None:
+            counts[path.split("/")[-2]] = int(value)
+    return counts
+
+
+# State of everything the tool configures on the NIC and in the network stack
+def read_nic_state(iface):
+    mtu = read_file("/sys/class/net/{}/mtu".format(iface))
+    queues, _ = Topology().nic_irqs(iface)
+    return {
+        "mtu": None if mtu is None else int(mtu),
+        "features": read_features(iface),
+        "rings": read_rings(iface),
+        "coalesce": read_coalesce(iface),
+        "rss": read_rss(iface),
+        "sysctls": {name: " ".join(value.split()) for name, value in ((n, read_file(sysctl_path(n))) for n in MANAGED_SYSCTLS) if value is not None},
+        "rps_flow_cnt": read_rps_flow_cnt(iface),
+        "queue_irqs": {str(q): irq for q, irq in sorted(queues.items())},
+        "irq_affinity": {str(irq): ",".join(map(str, parse_cpu_list(cpus))) for irq, cpus in ((irq, read_irq_affinity(irq)) for irq in sorted(queues.values())) if cpus is not None},
+    }
+
+
+# Options of the NIC setup of a rung, as in the setup lists of the scenarios
+def setup_parser():
+    parser = argparse.ArgumentParser(description="Configure the NIC and the network stack for an experiment.", add_help=False)
+    for short, name in MANAGED_FEATURES.items():
+        if short == "ntuple":
+            continue
+        parser.add_argument("--" + short, dest=short, action="store_true", default=None, help="Enable {}.".format(name))
+        parser.add_argument("--no-" + short, dest=short, action="store_false", help="Disable {}.".format(name))
+    parser.add_argument("--arfs", dest="arfs", action="store_true", default=None, help="Enable aRFS (ntuple filters and the RPS flow tables).")
+    parser.add_argument("--no-arfs", dest="arfs", action="store_false", help="Disable aRFS.")
+    parser.add_argument("--mtu", type=int, default=None, help="MTU of the interface.")
+    parser.add_argument("--rx-ring", type=int, default=None, help="Size of the RX rings.")
+    parser.add_argument("--tx-ring", type=int, default=None, help="Size of the TX rings.")
+    parser.add_argument("--adaptive-rx", dest="adaptive_rx", action="store_true", default=None, help="Enable adaptive RX interrupt coalescing.")
+    parser.add_argument("--no-adaptive-rx", dest="adaptive_rx", action="store_false", help="Disable adaptive RX interrupt coalescing.")
+    parser.add_argument("--rx-usecs", type=int, default=None, help="RX interrupt coalescing delay (us).")
+    parser.add_argument("--tx-usecs", type=int, default=None, help="TX interrupt coalescing delay (us).")
+    parser.add_argument("--rss-equal", type=int, default=None, help="Spread the RSS indirection table equally over the first N queues.")
+    parser.add_argument("--sock-size", action="store_true", help="Raise the socket buffer limits.")
+    parser.add_argument("--config", choices=["one-to-one", "incast", "outcast", "all-to-all", "single"], default=None, help="Configuration the IRQs are placed for.")
+    parser.add_argument("--flow-type", choices=["long", "short", "mixed"], default=None, help="Type of flow the IRQs are placed for.")
+    parser.add_argument("--affinity", type=int, nargs="*", default=None, help="CPUs to process the IRQs on.")
+    return parser
+
+
+# Desired state of a setup, only the parts it sets
+def desired_state(setup, current):
+    desired = {"features": {}, "rings": {}, "coalesce": {}, "sysctls": {}}
+    for short in MANAGED_FEATURES:
+        if short != "ntuple" and getattr(setup, short) is not None:
+            desired["features"][short] = getattr(setup, short)
+
+    if setup.arfs is not None:
+        desired["features"]["ntuple"] = setup.arfs
+        desired["sysctls"]["net.core.rps_sock_flow_entries"] = str(ARFS_FLOW_ENTRIES if setup.arfs else 0)
+        queues = current["rps_flow_cnt"]
+        desired["rps_flow_cnt"] = {q: ARFS_FLOW_ENTRIES // len(queues) if setup.arfs else 0 for q in queues}
+
+    if setup.mtu is not None:
+        desired["mtu"] = setup.mtu
+    if setup.rx_ring is not None:
+        desired["rings"]["rx"] = setup.rx_ring
+    if setup.tx_ring is not None:
+        desired["rings"]["tx"] = setup.tx_ring
+    if setup.adaptive_rx is not None:
+        desired["coalesce"]["adaptive-rx"] = setup.adaptive_rx
+    if setup.rx_usecs is not None:
+        desired["coalesce"]["rx-usecs"] = setup.rx_usecs
+    if setup.tx_usecs is not None:
+        desired["coalesce"]["tx-usecs"] = setup.tx_usecs
+    if setup.rss_equal is not None and len(current["rss"]) > 0:
+        desired["rss"] = [i % setup.rss_equal for i in range(len(current["rss"]))]
+    if setup.sock_size:
+        desired["sysctls"].update(SOCK_SIZE_SYSCTLS)
+
+    # IRQs of the queues all on --affinity, or one queue per CPU (the default mode) for a --config/--flow-type
+    queues = {int(q): irq for q, irq in current["queue_irqs"].items()}
+    if setup.affinity is not None and len(setup.affinity) > 0:
+        desired["irq_affinity"] = queue_irq_affinity(queues, setup.affinity)
+    elif setup.config is not None or setup.flow_type is not None:
+        desired["irq_affinity"] = queue_irq_affinity(queues)
+    return desired
+
+
+# Changes needed to get from the current state to the desired one, as (key, name, old, new)
+# Parts of the desired state the NIC doesn't report (e.g. a fixed offload) are skipped
+def diff_state(current, desired):
+    changes = []
+    if desired.get("mtu") is not None and current["mtu"] is not None and desired["mtu"] != current["mtu"]:
+        changes.append(("mtu", None, current["mtu"], desired["mtu"]))
+    for key in ["features", "rings", "coalesce", "sysctls", "rps_flow_cnt", "irq_affinity"]:
+        for name, value in sorted(desired.get(key, {}).items()):
+            if name in current.get(key, {}) and current[key][name] != value:
+                changes.append((key, name, current[key][name], value))
+    if len(desired.get("rss", [])) > 0 and desired["rss"] != current["rss"]:
+        changes.append(("rss", None, current["rss"], desired["rss"]))
+    return changes
+
+
+def format_change(change):
+    key, name, old, new = change
+    if key == "rss":
+        return "rss: {} queues -> {} queues".format(len(set(old)), len(set(new)))
+    return "{}{}: {} -> {}".format(key, "" if name is None else " " + name, old, new)
+
+
+# Apply the changes, one command per kind of change so the link is reset at most once for each
+# Returns the changes that failed
+def apply_changes(iface, changes):
+    failed = []
+
+    def run(argv, group):
+        code, out = run_command(argv)
+        if code != 0:
+            print("[network] {} failed: {}".format(" ".join(argv), out.strip()))
+            failed.extend(group)
+
+    for key, flag in [("features", "-K"), ("rings", "-G"), ("coalesce", "-C")]:
+        group = [c for c in changes if c[0] == key]
+        if len(group) > 0:
+            argv = ["ethtool", flag, iface] + [v for c in group for v in [c[1], ("on" if c[3] else "off") if isinstance(c[3], bool) else str(c[3])]]
+            run(argv, group)
+
+    for change in changes:
+        key, name, old, new = change
+        if key == "mtu":
+            run(["ip", "link", "set", "dev", iface, "mtu", str(new)], [change])
+        elif key == "rss":
+            # Tables restored from a snapshot aren't necessarily equal, set them weight by weight
+            num_queues = max(new) + 1
+            if new == [i % num_queues for i in range(len(new))]:
+                run(["ethtool", "-X", iface, "equal", str(num_queues)], [change])
+            else:
+                run(["ethtool", "-X", iface, "weight"] + [str(new.count(q)) for q in range(num_queues)], [change])
+        elif key in ["sysctls", "rps_flow_cnt", "irq_affinity"]:
+            if key == "sysctls":
+                path = sysctl_path(name)
+            elif key == "rps_flow_cnt":
+                path = "/sys/class/net/{}/queues/{}/rps_flow_cnt".format(iface, name)
+            else:
+                path = irq_affinity_path(name)
+            try:
+                with open(path, "w") as f:
+                    f.write(str(new))
+            except OSError as e:
+                print("[network] writing {} failed: {}".format(path, e))
+                failed.append(change)
+    return failed
+
+
+# Configures the NIC towards a desired state, changing only what differs,
+# and keeps a snapshot of the original state to restore at the end
+class NicConfig:
+    def __init__(self, iface, snapshot_file=None):
+        self.iface = iface
+        self.snapshot_file = snapshot_file
+        self.original = None
+        if snapshot_file is not None and os.path.exists(snapshot_file):
+            with open(snapshot_file) as f:
+                self.original = json.load(f)
+
+    def state(self):
+        return read_nic_state(self.iface)
+
+    # Remember the state before the first change, across invocations if there is a snapshot file
+    def snapshot(self, current):
+        if self.original is not None:
+            return
+        self.original = current
+        if self.snapshot_file is not None:
+            with open(self.snapshot_file, "w") as f:
+                json.dump(current, f)
+
+    def configure(self, desired):
+        current = self.state()
+        changes = diff_state(current, desired)
+        if len(changes) == 0:
+            print("[network] {}: nothing to change".format(self.iface))
+            return []
+
+        self.snapshot(current)
+        for change in changes:
+            print("[network] {}: {}".format(self.iface, format_change(change)))
+        return apply_changes(self.iface, changes)
+
+    # Apply the setup flags of a rung, returns the changes that failed
+    def apply(self, flags):
+        setup = setup_parser().parse_args(flags)
+        return self.configure(desired_state(setup, self.state()))
+
+    # Restore the state a killed run left in the snapshot file, before anything else changes it
+    def recover(self):
+        if self.original is None:
+            return []
+        print("[network] {}: left changed by a run that didn't exit cleanly".format(self.iface))
+        return self.restore()
+
+    def restore(self):
+        if self.original is None:
+            return []
+        print("[network] {}: restoring the original configuration".format(self.iface))
+        failed = self.configure(self.original)
+        self.original = None
+        if self.snapshot_file is not None and os.path.exists(self.snapshot_file):
+            os.remove(self.snapshot_file)
+        return failed
+
+
+# NIC configuration of the tools (scenarios, autotune, the agent), the original state is kept in the default snapshot
+# file, so that if the tool is killed the next one (or network_setup.py --restore) restores it
+def tool_nic_config(iface):
+    if iface is None:
+        return None
+    nic = NicConfig(iface, SNAPSHOT_FILE.format(iface))
+    nic.recover()
+    return nic
@@ -0,0 +1,117 @@
+import glob
+import os
+import re
+from topology import *
+
+
+# Allocation counters of every node (/sys/devices/system/node/node*/numastat), in pages
+NODE_STATS = ["numa_hit", "numa_miss", "numa_foreign", "interleave_hit", "local_node", "other_node"]
+
+# Pages of a mapping on each node, and their size, in /proc/<pid>/numa_maps
+NUMA_MAPS_NODE_PATTERN = re.compile(r"\bN(\d+)=(\d+)")
+NUMA_MAPS_PAGE_SIZE_PATTERN = re.compile(r"\bkernelpagesize_kB=(\d+)")
+
+
+# CPU and memory binding of the flow processes: taskset on the CPU as before, or numactl with the memory
+# bound to a node, the one of the CPU (local), another one (remote) or a given one
+class NumaBinding:
+    def __init__(self, membind=None, topology=None):
+        self.membind = membind
+        self.topology = Topology() if topology is None else topology
+
+    def cpu_node(self, cpu):
+        return self.topology.cpus[cpu]["node"] if cpu in self.topology.cpus else 0
+
+    def mem_node(self, cpu):
+        if self.membind is None:
+            return None
+        if self.membind == "local":
+            return self.cpu_node(cpu)
+        if self.membind == "remote":
+            return [n for n in sorted(self.topology.nodes) if n != self.cpu_node(cpu)][0]
+        return int(self.membind)
+
+    def argv(self, cpu):
+        node = self.mem_node(cpu)
+        if node is None:
+            return ["taskset", "-c", str(cpu)]
+        return ["numactl", "--physcpubind", str(cpu), "--membind", str(node)]
+
+
+# Check a --membind value against the machine, returns an error message or None
+def check_membind(membind, topology):
+    if membind is None or membind == "local":
+        return None
+    if membind == "remote":
+        return None if len(topology.nodes) > 1 else "Can't use --membind remote with a single NUMA node"
+    if not membind.isdigit() or int(membind) not in topology.nodes:
+        return "Can't set --membind to anything but local, remote or one of the nodes {}".format(",".join(map(str, sorted(topology.nodes))))
+    return None
+
+
+def read_node_numastat(root="/"):
+    stats = {}
+    for path in glob.glob(os.path.join(root, "sys", "devices", "system", "node", "node[0-9]*", "numastat")):
+        node = int(os.path.basename(os.path.dirname(path))[4:])
+        stats[node] = {}
+        with open(path) as f:
+            for line in f:
+                comps = line.split()
+                if len(comps) == 2 and comps[0] in NODE_STATS:
+                    stats[node][comps[0]] = int(comps[1])
+    return stats
+
+
+def numastat_delta(before, after):
+    return {node: {name: after[node][name] - before[node].get(name, 0) for name in after[node]} for node in after if node in before}
+
+
+# Fraction (%) of the pages allocated over a phase that came from a node other than the one of the allocating CPU
+def remote_alloc_fraction(delta):
+    local = sum(stats.get("local_node", 0) for stats in delta.values())
+    other = sum(stats.get("other_node", 0) for stats in delta.values())
+    return 0. if local + other == 0 else other * 100 / (local + other)
+
+
+# Resident memory of a process on each node, in bytes, None if it is gone
+def read_numa_maps(pid):
+    memory = {}
+    try:
+        with open("/proc/{}/numa_maps".format(pid)) as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+    for line in lines:
+        match = NUMA_MAPS_PAGE_SIZE_PATTERN.search(line)
+        page_size = 4096 if match is None else int(match.group(1)) * 1024
+        for node, pages in NUMA_MAPS_NODE_PATTERN.findall(line):
+            memory[int(node)] = memory.get(int(node), 0) + int(pages) * page_size
+    return memory
+
+
+# CPU a process is bound to, the first of its allowed CPUs
+def process_cpu(pid):
+    try:
+        with open("/proc/{}/status".format(pid)) as f:
+            for line in f:
+                if line.startswith("Cpus_allowed_list:"):
+                    return parse_cpu_list(line.split(":")[1])[0]
+    except OSError:
+        pass
+    return None
+
+
+# Memory of the flow processes by node, and the fraction (%) of it off the node of their CPU
+def flow_memory(procs, binding):
+    per_node, remote, total = {}, 0, 0
+    for p in procs:
+        memory = read_numa_maps(p.pid)
+        cpu = process_cpu(p.pid)
+        if memory is None or cpu is None:
+            continue
+        for node, size in memory.items():
+            per_node[node] = per_node.get(node, 0) + size
+            total += size
+            if node != binding.cpu_node(cpu):
+                remote += size
+    return per_node, 0. if total == 0 else remote * 100 / total
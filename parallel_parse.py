@@ -0,0 +1,145 @@
+import concurrent.futures
+import itertools
+import mmap
+import os
+from process_output import *
+
+
+# Files smaller than this are parsed in a single chunk, without a process pool
+MIN_CHUNK_SIZE = 64 * 1024 * 1024
+
+
+# Split a file into byte ranges of whole lines
+def file_chunks(path, num_chunks, min_chunk_size=MIN_CHUNK_SIZE):
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+
+    num_chunks = max(1, min(num_chunks, size // min_chunk_size))
+    bounds = [0]
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for i in range(1, num_chunks):
+            # Move the boundary past the end of the line it falls in
+            end = mm.find(b"\n", max(bounds[-1], size * i // num_chunks))
+            if end == -1:
+                break
+            bounds.append(end + 1)
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+
+# Lines of a chunk of a memory-mapped file
+def chunk_lines(path, start, end):
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        mm.seek(start)
+        while mm.tell() < end:
+            yield mm.readline().decode(errors="replace")
+
+
+# Lines of a file containing the marker, in order, without reading the lines in between
+def marker_lines(path, marker):
+    if os.path.getsize(path) == 0:
+        return
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        idx = mm.find(marker.encode())
+        while idx != -1:
+            start = mm.rfind(b"\n", 0, idx) + 1
+            end = mm.find(b"\n", idx)
+            end = len(mm) if end == -1 else end + 1
+            yield mm[start:end].decode(errors="replace")
+            idx = mm.find(marker.encode(), end)
+
+
+def init_worker(cpus, priority):
+    os.sched_setaffinity(0, cpus)
+    try:
+        os.setpriority(os.PRIO_PROCESS, 0, priority)
+    except PermissionError:
+        # Raising the priority back needs privileges
+        pass
+
+
+# Parse the chunks of a file in a process pool, and reduce the partial aggregates in order
+# Workers come from a fork server rather than being forked from the caller, which is a threaded process
+# (XML-RPC server, post-processing pool) that can't be forked safely
+# They are pinned to the CPUs of the calling thread unless told otherwise, and run at its priority, as the fork server
+# may have been started from elsewhere
+def parse_chunks(path, parse, reduce, initial, args=(), workers=None, cpus=None):
+    cpus = cpus or os.sched_getaffinity(0)
+    workers = workers or len(cpus)
+    chunks = file_chunks(path, workers)
+    if len(chunks) == 0:
+        return initial
+    if len(chunks) == 1:
+        return reduce(initial, parse(path, *chunks[0], *args))
+
+    # Imported here, so that importing the tools doesn't load multiprocessing
+    import multiprocessing
+    context = multiprocessing.get_context("forkserver")
+    with concurrent.futures.ProcessPoolExecutor(min(workers, len(chunks)), mp_context=context, initializer=init_worker,
+                                                initargs=(cpus, os.getpriority(os.PRIO_PROCESS, 0))) as pool:
+        jobs = [pool.submit(parse, path, start, end, *args) for start, end in chunks]
+        result = initial
+        for job in jobs:
+            result = reduce(result, job.result())
+    return result
+
+
+# Partial aggregates of each parser over a chunk, these run in the workers
+def latency_chunk(path, start, end):
+    return process_latency_histogram(chunk_lines(path, start, end))
+
+
+def skb_sizes_chunk(path, start, end, group):
+    return process_skb_sizes_histogram(chunk_lines(path, start, end), group)
+
+
+def breakdown_chunk(path, start, end):
+    return list(perf_report_entries(chunk_lines(path, start, end)))
+
+
+def merge_into(merged, other):
+    return other if merged is None else merged.merge(other)
+
+
+# Chunks without any counts keep the declared layout, which the kernel may have overridden
+# Chunks after a change of the layout during the run are left out, as when parsing in one go
+def merge_groups(merged, other):
+    if merged is None or merged.total.count == 0:
+        return other
+    if other.total.count == 0:
+        return merged
+    if not merged.total.compatible(other.total):
+        print("[skb hist] kernel changed the histogram layout during the run, ignoring the counts after the change")
+        return merged
+    return merged.merge(other)
+
+
+def parallel_latency_histogram(path, workers=None, cpus=None):
+    hist = parse_chunks(path, latency_chunk, merge_into, None, workers=workers, cpus=cpus)
+    return LogHistogram() if hist is None else hist
+
+
+def parallel_skb_sizes_histogram(path, group=None, workers=None, cpus=None):
+    if group is None:
+        group = skb_sizes_histogram()
+
+    # Every chunk needs the layout announced by the kernel (before any counts) and the start of the intervals
+    for line in marker_lines(path, "[skb-sizes]"):
+        if SKB_SIZES_LAYOUT_PATTERN.match(line) is not None:
+            group = process_skb_sizes_histogram([line], group)
+            continue
+        match = SKB_SIZES_PATTERN.match(line)
+        if match is not None and match.group(1) is not None:
+            group.start = float(match.group(1))
+        break
+
+    empty = HistogramGroup(group.total.empty(), group.interval)
+    empty.start = group.start
+    return parse_chunks(path, skb_sizes_chunk, merge_groups, None, args=(empty,), workers=workers, cpus=cpus) or group
+
+
+def parallel_util_breakdown_output(path, workers=None, cpus=None):
+    entries = parse_chunks(path, breakdown_chunk, lambda entries, chunk: entries + [chunk], [], workers=workers, cpus=cpus)
+    return breakdown_from_entries(itertools.chain.from_iterable(entries))
@@ -0,0 +1,174 @@
+import concurrent.futures
+import os
+import shutil
+import subprocess
+from constants import *
+from parallel_parse import *
+from process_output import *
+
+
+# Number of background workers post-processing the raw outputs
+POSTPROCESS_WORKERS = 2
+
+# Niceness of the workers, and of the perf and parser processes they start
+POSTPROCESS_NICE = 10
+
+
+# CPUs not used by the experiment, post-processing runs there so it doesn't disturb the next experiment
+def housekeeping_cpus(experiment_cpus):
+    online = os.sched_getaffinity(0)
+    cpus = online - set(experiment_cpus)
+    return cpus if len(cpus) > 0 else online
+
+
+# Lower the priority of the calling worker thread, processes it starts inherit it
+def nice_worker():
+    os.nice(POSTPROCESS_NICE)
+
+
+# Background pool post-processing the raw outputs of experiments while the next ones run
+# Every job is pinned to the CPUs left by the experiments it was submitted next to, jobs are named,
+# and their results collected at the end of the run (or as they finish)
+class PostProcessor:
+    def __init__(self, experiment_cpus, workers=POSTPROCESS_WORKERS, defer=False):
+        self.cpus = housekeeping_cpus(experiment_cpus)
+        self.pool = concurrent.futures.ThreadPoolExecutor(workers, thread_name_prefix="postprocess", initializer=nice_worker)
+        self.jobs = {}
+
+        # Jobs left to the caller of the run
+        self.defer = defer
+        self.deferred = []
+
+    # Keep the jobs submitted from now on away from the CPUs of the experiments that run next to them
+    def avoid(self, experiment_cpus):
+        self.cpus = housekeeping_cpus(experiment_cpus)
+
+    def run(self, cpus, fn, *args):
+        os.sched_setaffinity(0, cpus)
+        return fn(*args)
+
+    def submit(self, name, fn, *args):
+        if name in self.jobs:
+            raise ValueError("Post-processing job {} submitted twice".format(name))
+        self.jobs[name] = self.pool.submit(self.run, self.cpus, fn, *args)
+        return self.jobs[name]
+
+    # Run a job of POSTPROCESS_JOBS in the background, or leave it to the caller of the run
+    def submit_job(self, spec):
+        if self.defer:
+            self.deferred.append(spec)
+        else:
+            self.submit(spec["name"], run_job, spec)
+
+    # Wait for all the jobs, returns them as [name, result, error] like collect
+    # A failed job only loses its own results, it is reported and the run goes on
+    def results(self):
+        finished = self.collect(wait=True)
+        for name, result, error in finished:
+            if error is not None:
+                print("[postprocess] {} failed: {}".format(name, error))
+        return finished
+
+    # Finished jobs (all of them if waiting), forgotten once returned as [name, result, error]
+    def collect(self, wait=False):
+        if wait:
+            concurrent.futures.wait(list(self.jobs.values()))
+        finished = []
+        for name, job in list(self.jobs.items()):
+            if not job.done():
+                continue
+            del self.jobs[name]
+            try:
+                finished.append([name, job.result(), None])
+            except Exception as e:
+                finished.append([name, None, "{}: {}".format(type(e).__name__, e)])
+        return finished
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+
+
+def run_perf_report(perf_data_file):
+    args = ["bash", "-c", "{} report --stdio --stdio-color never --percent-limit 0.01 -i {} | cat".format(PERF_PATH, perf_data_file)]
+    return subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
+
+
+# The folded stacks are kept next to the data, so flamegraphs of different runs can be made at the same time
+def run_flamegraph(perf_data_file, output_svg_file):
+    folded_file = os.path.join(os.path.dirname(perf_data_file), "out.perf-folded")
+    os.system("{} script -i {} | {}/stackcollapse-perf.pl > {}".format(PERF_PATH, perf_data_file, FLAME_PATH, folded_file))
+    os.system("{}/flamegraph.pl {} > {}".format(FLAME_PATH, folded_file, output_svg_file))
+
+
+# Jobs are described by specs holding only strings, numbers and lists, so that a run can hand them over XML-RPC
+# to the caller (run_scenario and the agent), which processes them while the next run goes on:
+#   breakdown: perf report of "data" (a directory removed afterwards) written to "log" if given
+#   flame:     flamegraph of "data" written to "svg"
+#   latency:   data copy latencies in the kernel logs dumped to "path", removed afterwards if "temporary"
+#   skb hist:  skb sizes in the kernel logs dumped to "path", in a histogram of the given "layout", "width", "buckets" and "interval"
+# Results only have string keys and fit in XML-RPC
+
+# Run perf report on the recorded data into the log file (or next to the data), compute the breakdown from it
+# in parallel chunks, then remove the directory of the data
+def breakdown_job(spec):
+    report_file = spec["log"] if spec["log"] is not None else os.path.join(spec["data"], "perf_report.log")
+    perf = run_perf_report(os.path.join(spec["data"], "perf.data"))
+    with open(report_file, "w") as f:
+        for line in perf.stdout:
+            f.write(line)
+    perf.wait()
+
+    total_contrib, unaccounted_contrib, contributions, not_found = parallel_util_breakdown_output(report_file)
+    shutil.rmtree(spec["data"], ignore_errors=True)
+    return {"total": total_contrib, "unaccounted": unaccounted_contrib, "contributions": contributions, "not_found": sorted(not_found)}
+
+
+def flame_job(spec):
+    if spec["svg"] is not None:
+        run_flamegraph(os.path.join(spec["data"], "perf.data"), spec["svg"])
+    shutil.rmtree(spec["data"], ignore_errors=True)
+    return {}
+
+
+# Parse kernel logs dumped to a file in parallel chunks, removing the file if it was only temporary
+# Chunks are parsed by processes pinned to the CPUs of the worker
+def parse_dmesg_file(parse, path, temporary, *args):
+    result = parse(path, *args)
+    if temporary:
+        os.remove(path)
+    return result
+
+
+def latency_job(spec):
+    hist = parse_dmesg_file(parallel_latency_histogram, spec["path"], spec["temporary"])
+    return {"avg_latency": hist.mean() / 1000, "tail_latency": hist.percentile(99) / 1000, "hist": hist.to_dict()}
+
+
+def skb_hist_job(spec):
+    group = skb_sizes_histogram(spec["layout"], spec["width"], spec["buckets"], spec["interval"])
+    group = parse_dmesg_file(parallel_skb_sizes_histogram, spec["path"], spec["temporary"], group)
+    return {"fractions": group.total.fractions(), "hist": group.to_dict()}
+
+
+POSTPROCESS_JOBS = {
+    "breakdown": breakdown_job,
+    "flame": flame_job,
+    "latency": latency_job,
+    "skb hist": skb_hist_job,
+}
+
+
+def run_job(spec):
+    return POSTPROCESS_JOBS[spec["kind"]](spec)
+
+
+# Add the result of a job to the record of the run it was measured in
+def record_job(record, side, spec, result):
+    if spec["kind"] == "breakdown":
+        record.add_breakdown(side, spec["breakdown"], result["contributions"])
+    elif spec["kind"] == "latency":
+        record.add_metric(side, "avg_latency", result["avg_latency"])
+        record.add_metric(side, "tail_latency", result["tail_latency"])
+        record.add_histogram(side, "latency", result["hist"])
+    elif spec["kind"] == "skb hist":
+        record.add_histogram(side, "skb_sizes", result["hist"])
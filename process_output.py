@@ -1,5 +1,7 @@
 import os
 import re
+from constants import *
+from histogram import *
 
 
 # Path to the symbols map file
@@ -31,6 +33,26 @@ def process_throughput_output(lines):
     return 0 if num_samples == 0 else throughput / num_samples
 
 
+# Pattern of a per-interval iperf report line
+IPERF_INTERVAL_PATTERN = re.compile(r"^\[\s*\d+\]\s+([\d.]+)-([\d.]+)\s+sec\s+[\d.]+ \w?Bytes\s+([\d.]+) (\w?)bits/sec(.*)$")
+
+# Scale of the iperf bitrate units to Gbps
+IPERF_UNITS = {"G": 1, "M": 1e-3, "K": 1e-6, "": 1e-9}
+
+
+def process_throughput_series(lines):
+    series = []
+
+    # Get the throughput of every interval, skipping the summary lines
+    for line in lines:
+        match = IPERF_INTERVAL_PATTERN.match(line)
+        if match is None or "sender" in match.group(5) or "receiver" in match.group(5):
+            continue
+        series.append(float(match.group(3)) * IPERF_UNITS[match.group(4)])
+
+    return series
+
+
 def process_util_output(lines):
     cpu_util = {}
     num_samples = {}
@@ -69,48 +91,67 @@ def process_cache_miss_output(lines):
     return cache_miss
 
 
-def process_util_breakdown_output(lines):
-    contributions = {}
-    not_found = set()
+# Fraction (%) of the loads served by a remote NUMA node, from the perf stat counts of node-loads and node-load-misses
+# None if the CPU doesn't count them
+def process_node_loads_output(lines):
+    counts = {}
+    for line in lines:
+        elements = line.split()
+        if len(elements) >= 2 and elements[1] in ["node-loads", "node-load-misses"] and elements[0].replace(",", "").isdigit():
+            counts[elements[1]] = int(elements[0].replace(",", ""))
+
+    if counts.get("node-loads", 0) == 0 or "node-load-misses" not in counts:
+        return None
+    return counts["node-load-misses"] * 100 / counts["node-loads"]
+
+
+def load_symbol_map():
     symbol_map = {}
-    total_contrib = 0.
-    unaccounted_contrib = 0.
-    func_map = {}
 
     # Read the symbols map file
     with open(SYMBOL_MAP_FILE, "r") as f:
         for line in f.readlines():
             comps = line.split()
             if len(comps) == 2:
-                symbol, typ = line.split()
+                symbol, typ = comps
                 symbol_map[symbol] = typ
 
-                if symbol not in func_map:
-                    func_map[symbol] = 0.
+    return symbol_map
 
-                if typ not in contributions:
-                    contributions[typ] = 0.
 
-    # Process the perf output to calculate breakdown
+# Kernel functions and their contribution (%) in the perf report output, in order
+def perf_report_entries(lines):
     for line in lines:
-        if total_contrib < 95:
-            comps = line.split()
-            if len(comps) == 5 and comps[3] == "[k]":
-                func = comps[4].split(".")[0]
-                contrib = float(comps[0][:-1])
-                total_contrib += contrib
-                if func in symbol_map:
-                    typ = symbol_map[func]
-                    contributions[typ] += contrib
-
-                    func_map[func] += contrib
-                else:
-                    if contrib > 0.01:
-                        not_found.add(func)
-                    unaccounted_contrib += contrib
-        else:
+        comps = line.split()
+        if len(comps) == 5 and comps[3] == "[k]":
+            yield comps[4].split(".")[0], float(comps[0][:-1])
+
+
+# Breakdown of the contributions by the type of the functions, up to the first 95%
+def breakdown_from_entries(entries):
+    symbol_map = load_symbol_map()
+    contributions = {typ: 0. for typ in symbol_map.values()}
+    func_map = {symbol: 0. for symbol in symbol_map}
+    not_found = set()
+    total_contrib = 0.
+    unaccounted_contrib = 0.
+
+    # Process the perf output to calculate breakdown
+    for func, contrib in entries:
+        if total_contrib >= 95:
             break
 
+        total_contrib += contrib
+        if func in symbol_map:
+            typ = symbol_map[func]
+            contributions[typ] += contrib
+
+            func_map[func] += contrib
+        else:
+            if contrib > 0.01:
+                not_found.add(func)
+            unaccounted_contrib += contrib
+
     for func in func_map:
         if symbol_map[func] == "mm":
             print(symbol_map[func]+" "+func+": "+str(func_map[func]))
@@ -118,40 +159,128 @@ def process_util_breakdown_output(lines):
     return total_contrib, unaccounted_contrib, contributions, not_found
 
 
-def process_latency_output(lines):
-    samples = []
+def process_util_breakdown_output(lines):
+    return breakdown_from_entries(perf_report_entries(lines))
+
+
+# Pattern of the per-packet data copy latency reported in dmesg
+LATENCY_PATTERN = re.compile(r"^.*\[data-copy-latency\] latency=(\d+)\s*$")
+
+# Pattern of the skb sizes histogram reported in dmesg, with optional timestamp and CPU
+SKB_SIZES_PATTERN = re.compile(r"^(?:\[\s*(\d+\.\d+)\] )?.*\[skb-sizes\] (?:cpu=(\d+) )?(.*)$")
 
-    # Try to parse the latecy from dmesg output
+# Pattern of the layout of the skb sizes histogram announced by the kernel
+SKB_SIZES_LAYOUT_PATTERN = re.compile(r"^.*\[skb-sizes\] layout=(\w+) width=(\d+) buckets=(\d+)\s*$")
+
+# Rows of the netperf request/response time histogram, and the unit of each column (us)
+NETPERF_HIST_UNITS = {
+    "UNIT_USEC": 1,
+    "TEN_USEC": 10,
+    "HUNDRED_USEC": 100,
+    "UNIT_MSEC": 1000,
+    "TEN_MSEC": 10000,
+    "HUNDRED_MSEC": 100000,
+    "UNIT_SEC": 1000000,
+    "TEN_SEC": 10000000,
+}
+
+
+def process_latency_histogram(lines, hist=None):
+    if hist is None:
+        hist = LogHistogram()
+
+    # Try to parse the latency (ns) from dmesg output
     for line in lines:
-        try:
-            samples.append(
-                int(re.match(r"^.*\[data-copy-latency\] latency=(.*)$", line).group(1)))
-        except:
-            pass
-
-    # Sort and get average and tail
-    samples.sort()
-    num_samples = len(samples)
-    avg_latency = (sum(samples) / num_samples) / 1000
-    tail_latency = samples[max(
-        num_samples - 1, round(0.99 * num_samples + 0.5))] / 1000
+        if "[data-copy-latency]" not in line:
+            continue
+        match = LATENCY_PATTERN.match(line)
+        if match is not None:
+            hist.record(int(match.group(1)))
+
+    return hist
+
+
+def process_latency_output(lines):
+    hist = process_latency_histogram(lines)
+
+    # Get average and tail (us)
+    avg_latency = hist.mean() / 1000
+    tail_latency = hist.percentile(99) / 1000
 
     return avg_latency, tail_latency
 
 
-def process_skb_sizes_output(lines):
-    skb_sizes = [0 for _ in range(13)]
+def process_rpc_latency_output(lines, hist=None):
+    if hist is None:
+        hist = LogHistogram()
+
+    # Parse the request/response time histogram printed by netperf -v 2 (us)
+    for line in lines:
+        comps = line.split(":")
+        unit = NETPERF_HIST_UNITS.get(comps[0].strip())
+        if unit is None:
+            continue
+        for idx, c in enumerate(comps[1:]):
+            c = c.strip()
+            if c.isdigit() and int(c) > 0:
+                hist.record(idx * unit, int(c))
+
+    return hist
+
+
+def skb_sizes_histogram(layout=SKB_HIST_LAYOUT, width=SKB_HIST_BUCKET_WIDTH, num_buckets=SKB_HIST_NUM_BUCKETS, interval=None):
+    return HistogramGroup(make_bucket_histogram(layout, width, num_buckets), interval)
+
+
+# Empty group with another layout, keeping the start of the intervals (set when parsing in chunks)
+def with_histogram(group, hist):
+    new_group = HistogramGroup(hist, group.interval)
+    new_group.start = group.start
+    return new_group
+
+
+def process_skb_sizes_histogram(lines, group=None):
+    if group is None:
+        group = skb_sizes_histogram()
 
     # Try to parse the histogram from dmesg output
     for line in lines:
-        counts = re.match(r"^.*\[skb-sizes\] (.*)$", line)
-        if counts is not None:
-            for idx, c in enumerate(counts.group(1).split()):
-                skb_sizes[idx] += int(c)
-    total = sum(skb_sizes)
+        if "[skb-sizes]" not in line:
+            continue
+
+        # The kernel may announce its layout, which takes precedence over the declared one
+        layout = SKB_SIZES_LAYOUT_PATTERN.match(line)
+        if layout is not None:
+            hist = make_bucket_histogram(layout.group(1), int(layout.group(2)), int(layout.group(3)))
+            if not hist.compatible(group.total):
+                if group.total.count > 0:
+                    print("[skb hist] kernel changed the histogram layout during the run, ignoring the counts after the change")
+                    return group
+                group = with_histogram(group, hist)
+            continue
+
+        match = SKB_SIZES_PATTERN.match(line)
+        if match is None:
+            continue
+        timestamp, cpu, counts = match.groups()
+        counts = [int(c) for c in counts.split()]
+
+        # Otherwise grow the declared layout if the kernel reports more buckets
+        if len(counts) > group.total.num_buckets:
+            if group.total.count > 0:
+                print("[skb hist] kernel changed the number of buckets during the run, ignoring the counts after the change")
+                return group
+            print("[skb hist] kernel reports {} buckets, expected {}".format(len(counts), group.total.num_buckets))
+            hist = make_bucket_histogram(group.total.layout, group.total.width, len(counts))
+            group = with_histogram(group, hist)
+
+        group.record_counts(counts,
+                            cpu=None if cpu is None else int(cpu),
+                            timestamp=None if timestamp is None else float(timestamp))
+
+    return group
+
 
+def process_skb_sizes_output(lines):
     # Get the fraction of packets
-    if total == 0:
-        return skb_sizes
-    else:
-        return [s / total for s in skb_sizes]
+    return process_skb_sizes_histogram(lines).total.fractions()
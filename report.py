@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import html
+import io
+import itertools
+import json
+import sys
+from histogram import *
+from results_store import *
+
+
+# Optimisation ladders used by the experiments
+ALL_CONFIGS = ["no-opts", "tsogro", "jumbo", "tsogro+jumbo", "tsogro+arfs", "jumbo+arfs", "all-opts"]
+LADDER = ["no-opts", "tsogro", "tsogro+jumbo", "all-opts"]
+
+
+# Declarative definitions of the report tables of each experiment
+#   rows: list of (heading, field of the run, values), one row per combination of values
+#   columns: ("metric", side, name, heading), ("breakdown", side, kind) or ("histogram", side, name)
+# Fields are columns of the runs table or dotted paths into the run manifest
+def throughput_per_core_table(configs, axis=None, title=None):
+    rows = [("config", "label", configs)]
+    if axis is not None:
+        rows.append(axis)
+    return {
+        "title": "throughput per core with {}different optimisations".format("" if title is None else title + " and "),
+        "rows": rows,
+        "columns": [("metric", "sender", "throughput_per_core", "throughput per core (Gbps)")],
+    }
+
+
+def breakdown_table(side, rows, title, filters=None):
+    return {
+        "title": "{} CPU utilisation breakdown with {}".format(side, title),
+        "rows": rows,
+        "filters": filters or {},
+        "columns": [("breakdown", side, "util")],
+    }
+
+
+# Experiments varying some parameter under the optimisation ladder
+def ladder_report(axis, title):
+    return [
+        throughput_per_core_table(LADDER, axis, title),
+        breakdown_table("receiver", [axis], "{} and all optimisations enabled".format(title), {"label": "all-opts"}),
+    ]
+
+
+def single_flow_report():
+    return [
+        throughput_per_core_table(ALL_CONFIGS),
+        {
+            "title": "throughput and CPU utilisation with different optimisations",
+            "rows": [("config", "label", LADDER)],
+            "columns": [
+                ("metric", "sender", "throughput", "throughput (Gbps)"),
+                ("metric", "sender", "utilisation", "sender utilisation (%)"),
+                ("metric", "receiver", "utilisation", "receiver utilisation (%)"),
+            ],
+        },
+        breakdown_table("sender", [("config", "label", LADDER)], "different optimisations"),
+        breakdown_table("receiver", [("config", "label", LADDER)], "different optimisations"),
+    ]
+
+
+TCP_BUFFER_SIZES = ("tcp buffer (KB)", "window", [100, 200, 400, 800, 1600, 3200, 6400, 12800])
+
+REPORTS = {
+    "single-flow": single_flow_report(),
+    "single-flow-no-ddio": single_flow_report(),
+    "one-to-one": ladder_report(("n", "num_connections", [8, 16, 24]), "varying number of flows"),
+    "outcast": ladder_report(("n", "num_connections", [2, 4, 8]), "varying number of flows"),
+    "incast": ladder_report(("n", "num_connections", [8, 16, 24]), "varying number of flows") + [
+        {
+            "title": "cache miss rate with varying number of flows and all optimisations enabled",
+            "rows": [("n", "num_connections", [8, 16, 24])],
+            "filters": {"label": "all-opts"},
+            "columns": [
+                ("metric", "receiver", "cache_miss", "receiver cache miss (%)"),
+                ("metric", "sender", "throughput_per_core", "throughput per core (Gbps)"),
+            ],
+        },
+    ],
+    "all-to-all": ladder_report(("n", "num_connections", [8, 16, 24]), "varying number of flows") + [
+        {
+            "title": "skb size histogram with varying number of flows and all optimisations enabled",
+            "rows": [("n", "num_connections", [8, 16, 24])],
+            "filters": {"label": "all-opts"},
+            "columns": [("histogram", "receiver", "skb_sizes")],
+        },
+    ],
+    "mixed": ladder_report(("n", "num_rpcs", [1, 4, 16]), "varying number of flows"),
+    "packet-loss": ladder_report(("inv. loss rate", "receiver.packet_drop", [10000, 1000, 100]), "varying loss rate"),
+    "short-incast": ladder_report(("rpc size (bytes)", "rpc_size", [4000, 16000, 32000, 64000]), "varying RPC size"),
+    "numa": [
+        {
+            "title": "throughput per core and receiver cache miss for long and short flows on local and remote NUMA and all optimisations",
+            "rows": [("flow", "flow_type", ["long", "short"]), ("NUMA", "label", ["local", "remote", "remote-mem"])],
+            "columns": [
+                ("metric", "receiver", "cache_miss", "receiver cache miss (%)"),
+                ("metric", "sender", "throughput_per_core", "throughput per core (Gbps)"),
+            ],
+        },
+        {
+            "title": "receiver NUMA locality for long and short flows on local and remote NUMA and all optimisations",
+            "rows": [("flow", "flow_type", ["long", "short"]), ("NUMA", "label", ["local", "remote", "remote-mem"])],
+            "columns": [
+                ("metric", "receiver", "remote_access", "remote accesses (%)"),
+                ("metric", "receiver", "remote_alloc", "remote allocations (%)"),
+                ("metric", "receiver", "remote_memory", "remote flow memory (%)"),
+                ("metric", "sender", "throughput", "throughput (Gbps)"),
+            ],
+        },
+    ],
+    "tcp-buffer": [
+        {
+            "title": "throughput per core and receiver cache miss for varying TCP buffer size and all optimisations",
+            "rows": [TCP_BUFFER_SIZES],
+            "columns": [
+                ("metric", "receiver", "cache_miss", "receiver cache miss (%)"),
+                ("metric", "sender", "throughput_per_core", "throughput per core (Gbps)"),
+            ],
+        },
+        {
+            "title": "average and tail data copy latency for varying TCP buffer size and all optimisations",
+            "rows": [TCP_BUFFER_SIZES],
+            "columns": [
+                ("metric", "receiver", "avg_latency", "avg. data copy latency (us)"),
+                ("metric", "receiver", "tail_latency", "tail data copy latency (us)"),
+            ],
+        },
+    ],
+}
+
+
+# Value of a field of a run: a column of the runs table or a dotted path into its manifest
+def run_field(run, field):
+    if "." not in field and field in run:
+        return run[field]
+
+    value = json.loads(run["manifest"])
+    for key in field.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+# Latest run of the experiment matching all the given fields
+def find_run(runs, fields):
+    for run in reversed(runs):
+        if all(run_field(run, f) == v for f, v in fields.items()):
+            return run
+    return None
+
+
+# Evaluate a table definition against the store, returns (title, header, rows, number of row axes)
+def build_table(store, experiment, table):
+    runs = store.runs(experiment=experiment)
+    filters = table.get("filters", {})
+    axes = table["rows"]
+
+    # Find the run of every row
+    row_runs = []
+    for values in itertools.product(*[a[2] for a in axes]):
+        fields = dict(filters)
+        fields.update({a[1]: v for a, v in zip(axes, values)})
+        row_runs.append((list(values), find_run(runs, fields)))
+
+    # Expand the columns
+    header = [a[0] for a in axes]
+    getters = []
+    for column in table["columns"]:
+        if column[0] == "metric":
+            _, side, name, heading = column
+            header.append(heading)
+            getters.append(lambda run, side=side, name=name: store.run_metrics(run["run_id"]).get((side, name)))
+        elif column[0] == "breakdown":
+            _, side, kind = column
+            keys = set()
+            for _, run in row_runs:
+                if run is not None:
+                    keys |= store.breakdown(run["run_id"], kind, side).keys()
+            for key in sorted(keys):
+                header.append(key)
+                getters.append(lambda run, side=side, kind=kind, key=key: store.breakdown(run["run_id"], kind, side).get(key))
+        elif column[0] == "histogram":
+            _, side, name = column
+            hists = [store.histogram(run["run_id"], name, side) for _, run in row_runs if run is not None]
+            hists = [histogram_group_from_dict(h).total for h in hists if h is not None]
+            if len(hists) == 0:
+                continue
+            for idx, label in enumerate(hists[0].labels()):
+                header.append(label)
+                getters.append(lambda run, side=side, name=name, idx=idx: row_histogram_fraction(store, run, name, side, idx))
+        else:
+            raise ValueError("Unknown column type {}".format(column[0]))
+
+    rows = []
+    for values, run in row_runs:
+        rows.append(values + [None if run is None else g(run) for g in getters])
+
+    return table["title"], header, rows, len(axes)
+
+
+def row_histogram_fraction(store, run, name, side, idx):
+    d = store.histogram(run["run_id"], name, side)
+    if d is None:
+        return None
+    fractions = histogram_group_from_dict(d).total.fractions()
+    return fractions[idx] if idx < len(fractions) else None
+
+
+def format_value(value):
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return "{:.3f}".format(value)
+    return str(value)
+
+
+# Render tables as aligned text, similar to column -t
+def render_text(experiment, tables, out):
+    out.write("*** {} summary ***\n".format(experiment))
+    for i, (title, header, rows, num_axes) in enumerate(tables):
+        if i > 0:
+            out.write("\n")
+        out.write("****** {} ******\n".format(title))
+        cells = [header] + [[format_value(v) for v in row] for row in rows]
+        widths = [max(len(r[c]) for r in cells) for c in range(len(header))]
+        for r in cells:
+            out.write("  ".join(c.ljust(w) for c, w in zip(r, widths)).rstrip() + "\n")
+
+
+def render_csv(experiment, tables, out):
+    writer = csv.writer(out)
+    for title, header, rows, num_axes in tables:
+        writer.writerow(["experiment", "table"] + header)
+        for row in rows:
+            writer.writerow([experiment, title] + ["" if v is None else v for v in row])
+
+
+# Horizontal bar chart of one column of a table
+def render_svg_bars(labels, values, heading):
+    bar, gap, label_width, chart_width = 18, 6, 160, 320
+    height = len(labels) * (bar + gap) + 30
+    peak = max([v for v in values if v is not None] + [0])
+    svg = ['<svg xmlns="http://www.w3.org/2000/svg" width="{}" height="{}" font-family="sans-serif" font-size="12">'.format(label_width + chart_width + 60, height)]
+    svg.append('<text x="0" y="14" font-weight="bold">{}</text>'.format(html.escape(heading)))
+    for i, (label, value) in enumerate(zip(labels, values)):
+        y = 24 + i * (bar + gap)
+        width = 0 if value is None or peak == 0 else value / peak * chart_width
+        svg.append('<text x="0" y="{}">{}</text>'.format(y + bar - 5, html.escape(label)))
+        svg.append('<rect x="{}" y="{}" width="{:.1f}" height="{}" fill="#4c72b0"/>'.format(label_width, y, width, bar))
+        svg.append('<text x="{:.1f}" y="{}">{}</text>'.format(label_width + width + 4, y + bar - 5, format_value(value)))
+    svg.append("</svg>")
+    return "\n".join(svg)
+
+
+def render_html(experiment, tables, out):
+    out.write("<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{0} summary</title></head><body>\n<h1>{0} summary</h1>\n".format(html.escape(experiment)))
+    for title, header, rows, num_axes in tables:
+        out.write("<h2>{}</h2>\n<table border=\"1\" cellspacing=\"0\" cellpadding=\"4\">\n".format(html.escape(title)))
+        out.write("<tr>{}</tr>\n".format("".join("<th>{}</th>".format(html.escape(h)) for h in header)))
+        for row in rows:
+            out.write("<tr>{}</tr>\n".format("".join("<td>{}</td>".format(html.escape(format_value(v))) for v in row)))
+        out.write("</table>\n")
+
+        # Chart every column against the row labels
+        labels = [" ".join(str(v) for v in row[:num_axes]) for row in rows]
+        for c in range(num_axes, len(header)):
+            out.write(render_svg_bars(labels, [row[c] for row in rows], header[c]) + "\n")
+    out.write("</body></html>\n")
+
+
+RENDERERS = {
+    "text": render_text,
+    "csv": render_csv,
+    "html": render_html,
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Render the summary tables of an experiment from the results store.")
+
+    # Add arguments
+    parser.add_argument("experiment", choices=sorted(REPORTS.keys()), help="Experiment to summarise.")
+    parser.add_argument("--store", required=True, type=str, help="Path to the results store.")
+    parser.add_argument("--format", choices=sorted(RENDERERS.keys()), default="text", help="Output format.")
+    parser.add_argument("--output", type=str, default=None, help="Write the report to this file instead of stdout.")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    with ResultsStore(args.store) as store:
+        tables = [build_table(store, args.experiment, t) for t in REPORTS[args.experiment]]
+
+    out = io.StringIO()
+    RENDERERS[args.format](args.experiment, tables, out)
+    if args.output is None:
+        sys.stdout.write(out.getvalue())
+    else:
+        with open(args.output, "w") as f:
+            f.write(out.getvalue())
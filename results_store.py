@@ -0,0 +1,276 @@
+import json
+import os
+import platform
+import socket
+import time
+
+
+# Version of the schema below, bump when changing it and add a migration
+SCHEMA_VERSION = 4
+
+# Tables are append-only and in long format, so new metrics don't change the schema
+# Times are in the clock of the sender, the common timebase of both sides (see the clock in the manifest)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created REAL NOT NULL,
+    experiment TEXT,
+    label TEXT,
+    host TEXT,
+    kernel TEXT,
+    config TEXT,
+    flow_type TEXT,
+    num_connections INTEGER,
+    num_rpcs INTEGER,
+    rpc_size INTEGER,
+    window INTEGER,
+    arfs INTEGER,
+    cpus TEXT,
+    affinity TEXT,
+    duration INTEGER,
+    output TEXT,
+    manifest TEXT,
+    point_key TEXT
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    side TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value REAL
+);
+CREATE TABLE IF NOT EXISTS flow_series (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    side TEXT NOT NULL,
+    phase TEXT NOT NULL,
+    flow INTEGER NOT NULL,
+    second INTEGER NOT NULL,
+    throughput REAL,
+    time REAL
+);
+CREATE TABLE IF NOT EXISTS cpu_samples (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    side TEXT NOT NULL,
+    phase TEXT NOT NULL,
+    cpu INTEGER NOT NULL,
+    utilisation REAL,
+    start REAL,
+    end REAL
+);
+CREATE TABLE IF NOT EXISTS breakdowns (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    side TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    category TEXT NOT NULL,
+    value REAL
+);
+CREATE TABLE IF NOT EXISTS histograms (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    side TEXT NOT NULL,
+    name TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS soak_windows (
+    soak_id TEXT NOT NULL,
+    window INTEGER NOT NULL,
+    start REAL,
+    end REAL,
+    throughput REAL,
+    min_throughput REAL,
+    utilisation REAL,
+    flow_histogram TEXT,
+    time REAL
+);
+"""
+
+# Statements upgrading a store to each schema version
+MIGRATIONS = {
+    2: ["ALTER TABLE runs ADD COLUMN point_key TEXT"],
+    # soak_windows is created by the schema itself
+    3: [],
+    4: ["ALTER TABLE flow_series ADD COLUMN time REAL",
+        "ALTER TABLE cpu_samples ADD COLUMN start REAL",
+        "ALTER TABLE cpu_samples ADD COLUMN end REAL",
+        "ALTER TABLE soak_windows ADD COLUMN time REAL"],
+}
+
+# Indexes are created after the migrations, as they may use new columns
+INDEXES = """
+CREATE INDEX IF NOT EXISTS runs_experiment ON runs(experiment, label);
+CREATE INDEX IF NOT EXISTS runs_point_key ON runs(point_key);
+CREATE INDEX IF NOT EXISTS metrics_name ON metrics(name, side, run_id);
+CREATE INDEX IF NOT EXISTS flow_series_run ON flow_series(run_id);
+CREATE INDEX IF NOT EXISTS cpu_samples_run ON cpu_samples(run_id);
+CREATE INDEX IF NOT EXISTS breakdowns_run ON breakdowns(kind, side, run_id);
+CREATE INDEX IF NOT EXISTS histograms_run ON histograms(name, run_id);
+CREATE INDEX IF NOT EXISTS soak_windows_id ON soak_windows(soak_id, window);
+"""
+
+# Columns of the runs table taken directly from the manifest
+RUN_COLUMNS = ["experiment", "label", "config", "flow_type", "num_connections", "num_rpcs", "rpc_size", "window", "arfs", "duration", "output", "point_key"]
+
+
+# Everything measured in a single run of the tool, written to the store at the end
+class RunRecord:
+    def __init__(self, manifest):
+        self.manifest = dict(manifest)
+        self.manifest.setdefault("created", time.time())
+        self.manifest.setdefault("host", socket.gethostname())
+        self.manifest.setdefault("kernel", platform.release())
+        self.metrics = []
+        self.flow_series = []
+        self.cpu_samples = []
+        self.breakdowns = []
+        self.histograms = []
+
+    def add_metric(self, side, name, value):
+        self.metrics.append((side, name, value))
+
+    # Per-second throughput of a flow, stamped from its start if known
+    def add_flow_series(self, side, phase, flow, series, start=None):
+        self.flow_series += [(side, phase, flow, second, t, None if start is None else start + second) for second, t in enumerate(series)]
+
+    # Utilisation of every CPU averaged over a window [start, end], if known
+    def add_cpu_samples(self, side, phase, cpu_util, window=None):
+        start, end = (None, None) if window is None else window
+        self.cpu_samples += [(side, phase, int(cpu), util, start, end) for cpu, util in sorted(cpu_util.items())]
+
+    def add_breakdown(self, side, kind, contributions):
+        self.breakdowns += [(side, kind, category, value) for category, value in sorted(contributions.items())]
+
+    def add_histogram(self, side, name, hist_dict):
+        self.histograms.append((side, name, hist_dict))
+
+
+# Build the manifest of a run from the parsed arguments of the tool
+def manifest_from_args(args, **extra):
+    manifest = {k: v for k, v in vars(args).items()}
+    manifest.update(extra)
+    return manifest
+
+
+class ResultsStore:
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+
+        # Imported here, so that the tools only load sqlite when they use a store
+        import sqlite3
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+
+        # Refuse to write into a store with a newer schema, and upgrade older ones
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+        if row is None:
+            self.db.execute("INSERT INTO meta VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),))
+            self.db.commit()
+        elif int(row["value"]) > SCHEMA_VERSION:
+            raise RuntimeError("Results store {} has schema version {}, this tool supports up to {}".format(path, row["value"], SCHEMA_VERSION))
+        else:
+            with self.db:
+                for version in range(int(row["value"]) + 1, SCHEMA_VERSION + 1):
+                    for statement in MIGRATIONS.get(version, []):
+                        self.db.execute(statement)
+                self.db.execute("UPDATE meta SET value = ? WHERE key = 'schema_version'", (str(SCHEMA_VERSION),))
+        self.db.executescript(INDEXES)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Append a run and everything measured in it, returns the ID of the run
+    def append(self, record):
+        m = record.manifest
+        with self.db:
+            cur = self.db.execute(
+                "INSERT INTO runs (created, host, kernel, cpus, affinity, manifest, {}) VALUES (?, ?, ?, ?, ?, ?, {})".format(
+                    ", ".join(RUN_COLUMNS), ", ".join("?" for _ in RUN_COLUMNS)),
+                [m["created"], m["host"], m["kernel"], json.dumps(m.get("cpus")), json.dumps(m.get("affinity")),
+                 json.dumps(m, default=str)] + [m.get(c) for c in RUN_COLUMNS])
+            run_id = cur.lastrowid
+            self.insert_measurements(run_id, record)
+        return run_id
+
+    # Add what was measured after a run was appended (e.g. its deferred post-processing) to it, the manifest is kept
+    def attach(self, run_id, record):
+        with self.db:
+            if self.db.execute("SELECT 1 FROM runs WHERE run_id = ?", (run_id,)).fetchone() is None:
+                raise KeyError("No run {} in {}".format(run_id, self.path))
+            self.insert_measurements(run_id, record)
+
+    def insert_measurements(self, run_id, record):
+        self.db.executemany("INSERT INTO metrics VALUES (?, ?, ?, ?)", [(run_id,) + r for r in record.metrics])
+        self.db.executemany("INSERT INTO flow_series VALUES (?, ?, ?, ?, ?, ?, ?)", [(run_id,) + r for r in record.flow_series])
+        self.db.executemany("INSERT INTO cpu_samples VALUES (?, ?, ?, ?, ?, ?, ?)", [(run_id,) + r for r in record.cpu_samples])
+        self.db.executemany("INSERT INTO breakdowns VALUES (?, ?, ?, ?, ?)", [(run_id,) + r for r in record.breakdowns])
+        self.db.executemany("INSERT INTO histograms VALUES (?, ?, ?, ?)",
+                            [(run_id, side, name, json.dumps(d)) for side, name, d in record.histograms])
+
+    # Checkpoint of the windows of a soak run, written while the run goes on
+    # The record of the run is appended at the end and refers to them by soak_id in its manifest
+    def append_soak_windows(self, soak_id, rows):
+        with self.db:
+            self.db.executemany("INSERT INTO soak_windows VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                [(soak_id, idx, start, end, t, min_t, util, json.dumps(hist), stamp) for idx, start, end, t, min_t, util, hist, stamp in rows])
+
+    def soak_windows(self, soak_id):
+        rows = self.db.execute("SELECT * FROM soak_windows WHERE soak_id = ? ORDER BY window", (soak_id,))
+        return [dict(r, flow_histogram=json.loads(r["flow_histogram"])) for r in rows]
+
+    # Select runs matching the given manifest columns, e.g. runs(experiment="incast", label="all-opts")
+    def runs(self, **filters):
+        query, params = "SELECT * FROM runs", []
+        if filters:
+            query += " WHERE " + " AND ".join("{} = ?".format(k) for k in filters)
+            params = list(filters.values())
+        return [dict(r) for r in self.db.execute(query + " ORDER BY run_id", params)]
+
+    # Latest run recorded for an experiment point, if any
+    def completed(self, point_key):
+        row = self.db.execute("SELECT * FROM runs WHERE point_key = ? ORDER BY run_id DESC LIMIT 1", (point_key,)).fetchone()
+        return None if row is None else dict(row)
+
+    # Value of a metric for each matching run, joined with the run columns
+    def metric(self, name, side, **filters):
+        query = "SELECT runs.*, metrics.value FROM runs JOIN metrics USING (run_id) WHERE metrics.name = ? AND metrics.side = ?"
+        params = [name, side]
+        for k, v in filters.items():
+            query += " AND runs.{} = ?".format(k)
+            params.append(v)
+        return [dict(r) for r in self.db.execute(query + " ORDER BY run_id", params)]
+
+    # All metrics of a run, keyed by (side, name)
+    def run_metrics(self, run_id):
+        rows = self.db.execute("SELECT side, name, value FROM metrics WHERE run_id = ?", (run_id,))
+        return {(r["side"], r["name"]): r["value"] for r in rows}
+
+    def breakdown(self, run_id, kind, side):
+        rows = self.db.execute("SELECT category, value FROM breakdowns WHERE run_id = ? AND kind = ? AND side = ?", (run_id, kind, side))
+        return {r["category"]: r["value"] for r in rows}
+
+    def histogram(self, run_id, name, side):
+        row = self.db.execute("SELECT data FROM histograms WHERE run_id = ? AND name = ? AND side = ?", (run_id, name, side)).fetchone()
+        return None if row is None else json.loads(row["data"])
+
+    def flow_series(self, run_id, side, phase):
+        rows = self.db.execute("SELECT flow, second, throughput FROM flow_series WHERE run_id = ? AND side = ? AND phase = ? ORDER BY flow, second",
+                               (run_id, side, phase))
+        series = {}
+        for r in rows:
+            series.setdefault(r["flow"], []).append(r["throughput"])
+        return series
+
+    def cpu_samples(self, run_id, side, phase):
+        rows = self.db.execute("SELECT cpu, utilisation FROM cpu_samples WHERE run_id = ? AND side = ? AND phase = ?", (run_id, side, phase))
+        return {r["cpu"]: r["utilisation"] for r in rows}
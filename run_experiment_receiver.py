@@ -1,16 +1,31 @@
 #!/usr/bin/env python3
 
 import argparse
+import contextlib
 import os
 import shlex
+import shutil
+import json
 import signal
 import subprocess as _sp
 import tempfile
 import threading
 import time
-import xmlrpc.server
+from artifacts import *
+from collectors import *
 from constants import *
+from control import *
+from energy import *
+from netem import *
+from numa import *
+from nic_config import read_nic_state
+from postprocess import *
 from process_output import *
+from soak import *
+from steering import *
+from supervisor import *
+from telemetry import *
+from topology import *
 
 
 # For debugging
@@ -30,7 +45,11 @@ class subprocess:
         return _sp.Popen(*args, **kwargs)
 
 
-def parse_args():
+# Children of the experiments, signalled by process group instead of by name
+supervisor = Supervisor("receiver", subprocess.Popen)
+
+
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(description="Run TCP measurement experiments on the receiver.")
 
     # Add arguments
@@ -38,23 +57,42 @@ def parse_args():
     parser.add_argument("--config", choices=["one-to-one", "incast", "outcast", "all-to-all", "single"], default="single", help="Configuration to run the experiment with.")
     parser.add_argument("--cpus", type=int, nargs="*", help="Which CPUs to use for experiment.")
     parser.add_argument("--affinity", type=int, nargs="*", help="Which CPUs are being used for IRQ processing.")
+    parser.add_argument("--iface", type=str, default=None, help="Interface the experiments run on, its configuration is recorded with the results.")
+    parser.add_argument("--steer", action="store_true", help="Pin the RX queue IRQs to --affinity and steer every flow to its queue with ntuple rules (needs --iface).")
+    parser.add_argument("--place-near", type=str, default=None, help="Plan --cpus and --affinity from the CPU/NUMA topology, close to this interface.")
+    parser.add_argument("--membind", type=str, default=None, help="Bind the memory of the flow processes to the node of their CPU (local), another node (remote) or a given node.")
     parser.add_argument("--num-connections", type=int, default=1, help="Number of connections.")
     parser.add_argument("--arfs", action="store_true", default=False, help="This experiment is run with aRFS.")
     parser.add_argument("--window", type=int, default=None, help="Specify the TCP window size (KB).")
-    parser.add_argument("--packet-drop", type=int, default=0, help="Inverse packet drop rate.")
+    parser.add_argument("--packet-drop", type=int, default=0, help="Inverse packet drop rate, injected with netem on --iface.")
+    parser.add_argument("--netem-delay", type=float, default=0, help="Delay added with netem to the packets received on --iface (ms).")
+    parser.add_argument("--netem-jitter", type=float, default=0, help="Jitter of the netem delay (ms).")
+    parser.add_argument("--netem-reorder", type=float, default=0, help="Percentage of the packets reordered by netem (needs --netem-delay).")
     parser.add_argument("--output", type=str, default=None, help="Write raw output to the directory.")
     parser.add_argument("--throughput", action="store_true", help="Measure throughput.")
     parser.add_argument("--utilisation", action="store_true", help="Measure CPU utilisation.")
+    parser.add_argument("--energy", action="store_true", help="Measure the energy used by the RAPL domains during --throughput.")
     parser.add_argument("--cache-miss", action="store_true", help="Measure LLC miss rate.")
+    parser.add_argument("--numa", action="store_true", help="Measure the NUMA locality of the memory accesses, allocations and flow buffers.")
     parser.add_argument("--util-breakdown", action="store_true", help="Calculate CPU utilisation breakdown.")
     parser.add_argument("--cache-breakdown", action="store_true", help="Calculate CPU utilisation breakdown.")
     parser.add_argument("--flame", action="store_true", help="Create a flamegraph from the experiment.")
     parser.add_argument("--latency", action="store_true", help="Calculate the average data copy latency for each packet.")
     parser.add_argument("--skb-hist", action="store_true", help="Record the skb sizes histogram.")
+    parser.add_argument("--skb-hist-layout", choices=["linear", "log2"], default=SKB_HIST_LAYOUT, help="Bucket layout of the skb sizes histogram.")
+    parser.add_argument("--skb-hist-width", type=int, default=SKB_HIST_BUCKET_WIDTH, help="Width of the (first) skb sizes bucket (KB).")
+    parser.add_argument("--skb-hist-buckets", type=int, default=SKB_HIST_NUM_BUCKETS, help="Number of skb sizes buckets.")
+    parser.add_argument("--skb-hist-interval", type=float, default=1, help="Time resolution of the skb sizes histogram in seconds.")
+    parser.add_argument("--soak", action="store_true", help="Serve the flows of a long-running soak run, reporting rolling windows.")
+    parser.add_argument("--soak-window", type=int, default=60, help="Length of the rolling windows of --soak in seconds.")
+    parser.add_argument("--telemetry-port", type=int, default=None, help="Serve live metrics over HTTP on this port (/metrics and /stream).")
+    parser.add_argument("--telemetry-iface", type=str, default=None, help="Interface whose NIC counters are included in the live metrics.")
+    parser.add_argument("--telemetry-cpus", type=int, nargs="*", default=None, help="CPUs to collect the live metrics on (default: the CPUs not used by the experiment).")
+    parser.add_argument("--defer-postprocess", action="store_true", help="Keep the raw data of the post-processed experiments and return their jobs with the results, for the caller to process while the next run goes on.")
     parser.add_argument("--verbose", action="store_true", help="Print extra output.")
 
     # Parse and verify arguments
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # Report errors
     if args.config == "single" and args.num_connections != 1:
@@ -77,6 +115,64 @@ def parse_args():
         print("Please provide --output if using --flame.")
         exit(1)
 
+    if args.energy and not args.throughput:
+        print("Please measure --throughput with --energy.")
+        exit(1)
+
+    if args.skb_hist_width <= 0 or args.skb_hist_buckets <= 0 or args.skb_hist_interval <= 0:
+        print("Can't set --skb-hist-width/--skb-hist-buckets/--skb-hist-interval <= 0.")
+        exit(1)
+
+    if args.soak and args.flow_type != "long":
+        print("Can't use --soak with --flow-type short/mixed.")
+        exit(1)
+
+    if args.soak_window <= 0:
+        print("Can't set --soak-window <= 0.")
+        exit(1)
+
+    if args.packet_drop < 0 or args.netem_delay < 0 or args.netem_jitter < 0 or not (0 <= args.netem_reorder <= 100):
+        print("Can't set --packet-drop/--netem-delay/--netem-jitter < 0 or --netem-reorder outside of [0, 100].")
+        exit(1)
+
+    if (args.packet_drop > 0 or args.netem_delay > 0 or args.netem_reorder > 0) and args.iface is None:
+        print("Please provide --iface if using --packet-drop/--netem-delay/--netem-reorder.")
+        exit(1)
+
+    if args.netem_reorder > 0 and args.netem_delay == 0:
+        print("Can't set --netem-reorder without --netem-delay.")
+        exit(1)
+
+    if args.steer and (args.iface is None or args.arfs or args.flow_type != "long"):
+        print("Can't use --steer without --iface, with --arfs or with --flow-type short/mixed.")
+        exit(1)
+
+    # CPUs of the host, the placement is planned and checked against them
+    topology = Topology()
+
+    if args.membind is not None:
+        error = check_membind(args.membind, topology)
+        if error is not None:
+            print("{}.".format(error))
+            exit(1)
+        if shutil.which("numactl") is None:
+            print("Please install numactl to use --membind.")
+            exit(1)
+
+    # Plan the placement from the topology: NUMA-local to the NIC, without sharing physical cores
+    if args.place_near is not None:
+        if args.cpus is not None or args.affinity is not None:
+            print("Can't set --cpus/--affinity with --place-near.")
+            exit(1)
+
+        try:
+            plan = plan_placement(topology, "receiver", args.config, args.num_connections, args.place_near, args.arfs)
+        except ValueError as e:
+            print("{}.".format(e))
+            exit(1)
+        args.cpus = plan["cpus"]
+        args.affinity = None if args.arfs else plan["affinity"]
+
     # Set CPUs to be used
     if args.cpus is not None:
         if args.config in ["single", "incast"] and len(args.cpus) != 1:
@@ -87,8 +183,8 @@ def parse_args():
             print("Please provide as many --cpus as --num-connections for --config outcast/one-to-one/all-to-all.")
             exit(1)
 
-        if not all(map(lambda c: 0 <= c < MAX_CPUS, args.cpus)):
-            print("Can't set --cpus outside of [0, {}].".format(MAX_CPUS))
+        if not all(c in topology.cpus for c in args.cpus):
+            print("Can't set --cpus outside of the online CPUs ({}).".format(format_cpu_list(topology.online_cpus())))
             exit(1)
     else:
         if args.config in ["incast", "single"]:
@@ -102,8 +198,8 @@ def parse_args():
 
     # Set IRQ processing CPUs
     if args.affinity is not None:
-        if not all(map(lambda c: 0 <= c < MAX_CPUS, args.affinity)):
-            print("Can't set --affinity outside of [0, {}].".format(MAX_CPUS))
+        if not all(c in topology.cpus for c in args.affinity):
+            print("Can't set --affinity outside of the online CPUs ({}).".format(format_cpu_list(topology.online_cpus())))
             exit(1)
     elif not args.arfs:
         if args.config in ["incast", "single"]:
@@ -111,7 +207,7 @@ def parse_args():
         elif args.config in ["outcast", "one-to-one"]:
             args.affinity = [cpu + 1 for cpu in args.cpus]
         elif args.config == "all-to-all":
-            args.affinity = list(range(MAX_CPUS))
+            args.affinity = topology.online_cpus()
     else:
         args.affinity = []
 
@@ -123,12 +219,6 @@ def parse_args():
     return args
 
 
-# Need to synchronize with the sender before starting experiment
-server = xmlrpc.server.SimpleXMLRPCServer(("0.0.0.0", COMM_PORT), logRequests=False)
-server.register_introspection_functions()
-server_thread = threading.Thread(target=server.serve_forever, daemon=True)
-
-
 # Event objects to synchronize sender and receiver
 __sender_ready = threading.Event()
 __receiver_ready = threading.Event()
@@ -139,6 +229,14 @@ __sender_done = threading.Event()
 __results = {}
 
 
+# Live metrics of the receiver, if enabled or requested by the sender
+telemetry = None
+__telemetry_lock = threading.Lock()
+
+# Fit of the receiver clock against the sender, sent by the sender when synchronising over the control protocol
+clock = None
+
+
 # Functions to query/set synchronization events
 def mark_sender_ready():
     __sender_ready.set()
@@ -177,105 +275,141 @@ def get_results():
     return __results
 
 
-# Register functions
-server.register_function(mark_sender_ready)
-server.register_function(is_receiver_ready)
-server.register_function(mark_sender_done)
-server.register_function(get_results)
+# The live metrics are stamped in the clock of the sender from then on
+def set_clock(fit):
+    global clock
+    clock = fit
+    with __telemetry_lock:
+        if telemetry is not None:
+            telemetry.clock = fit
+    return True
 
 
-# Convenience functions
-def clear_processes():
-    os.system("pkill iperf")
-    os.system("pkill netserver")
-    os.system("pkill netperf")
-    os.system("pkill perf")
-    os.system("pkill sar")
+# Latest live metrics, sampling starts on the first call (e.g. from the dashboard of the sender)
+# NOTE: XML-RPC only allows string keys, JSON converts them
+def get_telemetry():
+    global telemetry
+    with __telemetry_lock:
+        if telemetry is None:
+            telemetry = Telemetry("receiver", args.cpus + args.affinity, args.telemetry_iface, None, None, housekeeping_cpus(args.cpus + args.affinity))
+            telemetry.clock = clock
+            telemetry.start()
+    sample = telemetry.latest()
+    return None if sample is None else json.loads(json.dumps(sample))
+
+
+# Need to synchronize with the sender before starting experiment
+# The server is created by main, so importing the module binds no port (nor loads the server modules)
+# Calls are served concurrently, so live queries aren't held up by a blocking synchronisation call
+def start_server(port):
+    import socketserver
+    import xmlrpc.server
+
+    class ThreadedXMLRPCServer(socketserver.ThreadingMixIn, xmlrpc.server.SimpleXMLRPCServer):
+        daemon_threads = True
+
+    server = ThreadedXMLRPCServer(("0.0.0.0", port), logRequests=False, allow_none=True)
+    server.register_introspection_functions()
+    for function in [mark_sender_ready, is_receiver_ready, mark_sender_done, get_results, get_telemetry]:
+        server.register_function(function)
+    return server, threading.Thread(target=server.serve_forever, daemon=True)
 
 
-def run_iperf(cpu, port, window):
+# Close a server once its thread is done serving, freeing its port for the next run
+def stop_server(server, thread):
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+# Convenience functions
+def run_iperf(cpu, port, window, binding):
     if window is None:
-        args = ["taskset", "-c", str(cpu), "iperf3", "-i", "1", "-s", "-p", str(port)]
+        args = binding.argv(cpu) + ["iperf3", "-i", "1", "-s", "-p", str(port)]
     else:
-        args = ["taskset", "-c", str(cpu), "iperf3", "-s", "-i", "1", "-p", str(port), "-w", str(window / 2) + "K"]
+        args = binding.argv(cpu) + ["iperf3", "-s", "-i", "1", "-p", str(port), "-w", str(window / 2) + "K"]
 
-    return subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
+    return supervisor.launch(args, "flow", None, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
 
 
-def run_netperf(cpu, port):
-    args = ["taskset", "-c", str(cpu), "netserver", "-p", str(port), "-D", "f"]
+def run_netperf(cpu, port, binding):
+    args = binding.argv(cpu) + ["netserver", "-p", str(port), "-D", "f"]
 
-    return subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
+    return supervisor.launch(args, "flow", None, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
 
 
 # We run one iperf server process per flow, and one netserver process per CPU
-def run_flows(flow_type, config, num_connections, cpus, window):
+def run_flows(flow_type, config, num_connections, cpus, window, binding):
     procs = []
     if flow_type == "mixed":
-        procs.append(run_iperf(cpus[0], BASE_PORT, window))
-        procs.append(run_netperf(cpus[0], ADDITIONAL_BASE_PORT))
+        procs.append(run_iperf(cpus[0], BASE_PORT, window, binding))
+        procs.append(run_netperf(cpus[0], ADDITIONAL_BASE_PORT, binding))
     elif flow_type == "long":
         if config == "single":
-            procs.append(run_iperf(cpus[0], BASE_PORT, window))
+            procs.append(run_iperf(cpus[0], BASE_PORT, window, binding))
         elif config == "incast":
-            procs += [run_iperf(cpus[0], BASE_PORT + n, window) for n in range(num_connections)]
+            procs += [run_iperf(cpus[0], BASE_PORT + n, window, binding) for n in range(num_connections)]
         elif config in ["outcast", "one-to-one"]:
-            procs += [run_iperf(cpu, BASE_PORT + n, window) for n, cpu in enumerate(cpus)]
+            procs += [run_iperf(cpu, BASE_PORT + n, window, binding) for n, cpu in enumerate(cpus)]
         else:
             for i, sender_cpu in enumerate(cpus):
                 for j, receiver_cpu in enumerate(cpus):
-                    procs.append(run_iperf(receiver_cpu, BASE_PORT + i * MAX_CONNECTIONS + j, window))
+                    procs.append(run_iperf(receiver_cpu, BASE_PORT + i * MAX_CONNECTIONS + j, window, binding))
     else:
         if config in ["single", "incast"]:
-            procs.append(run_netperf(cpus[0], BASE_PORT))
+            procs.append(run_netperf(cpus[0], BASE_PORT, binding))
         else:
-            procs += [run_netperf(cpu, BASE_PORT + n) for n, cpu in enumerate(cpus)]
+            procs += [run_netperf(cpu, BASE_PORT + n, binding) for n, cpu in enumerate(cpus)]
 
     return procs
 
 
 def run_perf_cache(cpus):
     args = [PERF_PATH, "stat", "-C", ",".join(map(str, set(cpus))), "-e", "LLC-loads,LLC-load-misses,LLC-stores,LLC-store-misses"]
-    return subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
+    return supervisor.launch(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
+
+
+def run_perf_node_loads(cpus):
+    args = [PERF_PATH, "stat", "-C", ",".join(map(str, set(cpus))), "-e", "node-loads,node-load-misses"]
+    return supervisor.launch(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
 
 
 def run_perf_record_util(cpus, perf_data_file):
     args = [PERF_PATH, "record", "-C", ",".join(map(str, set(cpus))), "-o", str(perf_data_file)]
-    return subprocess.Popen(args, stdout=None, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
+    return supervisor.launch(args, stdout=None, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
 
 
 def run_perf_record_cache(cpus, perf_data_file):
     args = [PERF_PATH, "record", "-e", "cache-misses", "-C", ",".join(map(str, set(cpus))), "-o", str(perf_data_file)]
-    return subprocess.Popen(args, stdout=None, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
+    return supervisor.launch(args, stdout=None, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
 
 
 def run_perf_record_flame(cpus, perf_data_file):
     args = [PERF_PATH, "record", "-g", "-F", "99", "-C", ",".join(map(str, set(cpus))), "-o", str(perf_data_file)]
-    return subprocess.Popen(args, stdout=None, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
-
-
-def run_perf_report(perf_data_file):
-    args = ["bash", "-c", "{} report --stdio --stdio-color never --percent-limit 0.01 -i {} | cat".format(PERF_PATH, perf_data_file)]
-    return subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
-
-
-def run_flamegraph(perf_data_file, output_svg_file):
-    os.system("{} script -i {} | {}/stackcollapse-perf.pl > out.perf-folded".format(PERF_PATH, perf_data_file, FLAME_PATH))
-    os.system("{}/flamegraph.pl out.perf-folded > {}".format(FLAME_PATH, output_svg_file))
+    return supervisor.launch(args, stdout=None, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
 
 
 def run_sar(cpus):
     args = ["sar", "-u", "-P", ",".join(map(str, set(cpus))), "1", "1000"]
-    return subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
+    return supervisor.launch(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
 
 
 def dmesg_clear():
     os.system("dmesg -c > /dev/null 2> /dev/null")
 
 
-def run_dmesg(level="info"):
+# Dump the kernel logs to the output directory (or a temporary file), returns the path and whether it is temporary
+def dump_dmesg(output_dir, filename, level="info"):
+    if output_dir is None:
+        fd, path = tempfile.mkstemp(suffix=".log")
+        os.close(fd)
+    else:
+        path = os.path.join(output_dir, filename)
+
     args = ["dmesg", "-c", "-l", level]
-    return subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
+    with open(path, "w") as f:
+        subprocess.Popen(args, stdout=f, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL).wait()
+    return path, output_dir is None
 
 
 def latency_measurement(enabled):
@@ -286,47 +420,114 @@ def skb_hist_measurement(enabled):
     os.system("echo {} > /sys/module/ip_input/parameters/skb_size_hist_on".format(int(enabled)))
 
 
-def set_packet_drop_rate(rate):
-    os.system("sysctl -w net.core.packet_loss_gen={}".format(rate))
+# Run the experiments with the sender, measuring the collectors around every one of them on top of the TCP counters
+# What the run sets up is undone when it returns or fails, in reverse order, so it can run again in the same process
+def main(argv=None, collectors=None):
+    with contextlib.ExitStack() as cleanup:
+        run_experiments(argv, collectors, cleanup)
 
 
-if __name__ == "__main__":
+def run_experiments(argv, collectors, cleanup):
+    global args, telemetry, clock
+
     # Parse args
-    args = parse_args()
+    args = parse_args(argv)
     if args.verbose:
         subprocess.enable_logging()
 
+    # Results and live metrics of a previous run in this process
+    __results.clear()
+    telemetry = None
+    clock = None
+
+    # Post-process in the background, away from the CPUs of the experiment, unless it is left to the caller
+    postprocessor = PostProcessor(args.cpus + args.affinity, defer=args.defer_postprocess)
+
+    # Publish live metrics while the experiments run, away from the CPUs of the experiment
+    if args.telemetry_port is not None:
+        telemetry_cpus = set(args.telemetry_cpus) if args.telemetry_cpus else housekeeping_cpus(args.cpus + args.affinity)
+        telemetry_log = None if args.output is None else os.path.join(args.output, "telemetry.jsonl")
+        telemetry = Telemetry("receiver", args.cpus + args.affinity, args.telemetry_iface, args.telemetry_port, telemetry_log, telemetry_cpus).start()
+        cleanup.callback(telemetry.stop)
+        print("[telemetry] serving live metrics on port {}".format(args.telemetry_port))
+
+    # Effective configuration of the NIC and the network stack during the run
+    __results["nic"] = None if args.iface is None else read_nic_state(args.iface)
+
+    # Serve the synchronisation calls and the raw outputs of the run to the sender
+    server, server_thread = start_server(COMM_PORT)
+    if args.output is not None:
+        ArtifactDirectory(args.output).register(server)
+
     # Start the XMLRPC server thread
     server_thread.start()
+    cleanup.callback(stop_server, server, server_thread)
 
-    # SWG: In ZCRX, we dont care about packet drop.
-    # Set packet drop rate
-    # set_packet_drop_rate(args.packet_drop)
+    # The sender may synchronise over the binary control protocol instead
+    control_server, control_thread = start_control_server(CONTROL_PORT, [mark_sender_ready, is_receiver_ready, mark_sender_done, get_results, set_clock])
+    cleanup.callback(stop_server, control_server, control_thread)
+
+    # Inject loss, delay and reordering into what the receiver gets, removed at the end of the run
+    if args.iface is not None:
+        netem = Netem(args.iface)
+        if netem.apply(args.packet_drop, args.netem_delay, args.netem_jitter, args.netem_reorder):
+            cleanup.callback(netem.clear)
 
     # Print the output directory
     if args.output is not None:
         print("[output] writing results to {}".format(args.output))
 
-    # Run the experiments
-    clear_processes()
+    # Steer every flow to the queue of its IRQ CPU, undone at the end of the run
+    # NOTE: XML-RPC only allows string keys
+    __results["steering"] = None
+    if args.steer:
+        steering = FlowSteering(args.iface, "receiver")
+        cleanup.callback(steering.remove)
+        __results["steering"] = {str(port): flow for port, flow in steering.setup(args.config, args.num_connections, args.cpus, args.affinity).items()}
+
+    # Measure the energy of the host over the throughput experiment, away from the CPUs of the experiment
+    energy_meter = None
+    if args.energy:
+        energy_meter = EnergyMeter(pin_cpus=housekeeping_cpus(args.cpus + args.affinity))
+        if len(energy_meter.domains) == 0:
+            print("[energy] no RAPL domains found, not measuring energy")
+            energy_meter = None
+
+    # Run the flow processes on their CPU, with their memory bound if asked
+    binding = NumaBinding(args.membind)
+
+    # Run the experiments, after killing what a previous run that didn't exit cleanly left behind
+    supervisor.clear_stale()
+    cleanup.callback(supervisor.terminate_all)
     header = []
     output = []
+    phase_times = {}
+    collectors = CollectorSet([supervisor] + list(collectors or []))
     if args.throughput:
         # Wait till sender starts
         is_sender_ready()
         print("[throughput] starting experiment...")
+        phase_start = time.time()
+        collectors.start("throughput")
+
+        if energy_meter is not None:
+            energy_meter.start()
 
         # Start iperf and/or netperf instances
-        procs = run_flows(args.flow_type, args.config, args.num_connections, args.cpus, args.window)
+        procs = run_flows(args.flow_type, args.config, args.num_connections, args.cpus, args.window, binding)
 
         # Wait till sender is done sending
         mark_receiver_ready()
         is_sender_done()
+        if energy_meter is not None:
+            __results["energy"] = energy_meter.stop()
+            print("[energy] power: {:.3f} W".format(__results["energy"]["power"]))
 
-        # Kill all the processes
-        for p in procs:
-            p.kill()
+        # Stop all the processes
+        supervisor.terminate(procs)
         print("[throughput] finished experiment.")
+        phase_times["throughput"] = [phase_start, time.time()]
+        collectors.stop("throughput")
 
         # Process and write the raw output
         for i, p in enumerate(procs):
@@ -339,9 +540,11 @@ if __name__ == "__main__":
         # Wait till sender starts
         is_sender_ready()
         print("[utilisation] starting experiment...")
+        phase_start = time.time()
+        collectors.start("utilisation")
 
         # Start iperf and/or netperf instances
-        procs = run_flows(args.flow_type, args.config, args.num_connections, args.cpus, args.window)
+        procs = run_flows(args.flow_type, args.config, args.num_connections, args.cpus, args.window, binding)
 
         # Start the sar instance
         sar = run_sar(list(set(args.cpus + args.affinity)))
@@ -350,14 +553,14 @@ if __name__ == "__main__":
         mark_receiver_ready()
         is_sender_done()
 
-        # Kill sar
-        sar.send_signal(signal.SIGINT)
-        sar.wait()
+        # Stop sar
+        supervisor.terminate([sar], signal.SIGINT)
 
-        # Kill all the processes
-        for p in procs:
-            p.kill()
+        # Stop all the processes
+        supervisor.terminate(procs)
         print("[utilisation] finished experiment.")
+        phase_times["utilisation"] = [phase_start, time.time()]
+        collectors.stop("utilisation")
 
         # Process and write the raw output
         for i, p in enumerate(procs):
@@ -367,8 +570,11 @@ if __name__ == "__main__":
                     f.writelines(lines)
 
         lines = sar.stdout.readlines()
-        cpu_util = sum(process_util_output(lines).values())
+        cpu_utils = process_util_output(lines)
+        cpu_util = sum(cpu_utils.values())
         __results["cpu_util"] = cpu_util
+        __results["cpu_utils"] = [[cpu, util] for cpu, util in sorted(cpu_utils.items())]
+        __results["cpu_utils_window"] = supervisor.times(sar)
         if args.output is not None:
             with open(os.path.join(args.output, "utilisation_sar.log"), "w") as f:
                 f.writelines(lines)
@@ -382,9 +588,11 @@ if __name__ == "__main__":
         # Wait till sender starts
         is_sender_ready()
         print("[cache miss] starting experiment...")
+        phase_start = time.time()
+        collectors.start("cache miss")
 
        # Start iperf and/or netperf instances
-        procs = run_flows(args.flow_type, args.config, args.num_connections, args.cpus, args.window)
+        procs = run_flows(args.flow_type, args.config, args.num_connections, args.cpus, args.window, binding)
 
         # Start the perf instance
         perf = run_perf_cache(list(set(args.cpus + args.affinity)))
@@ -394,13 +602,13 @@ if __name__ == "__main__":
         is_sender_done()
 
         # Kill perf
-        perf.send_signal(signal.SIGINT)
-        perf.wait()
+        supervisor.terminate([perf], signal.SIGINT)
 
-        # Kill all the processes
-        for p in procs:
-            p.kill()
+        # Stop all the processes
+        supervisor.terminate(procs)
         print("[cache miss] finished experiment.")
+        phase_times["cache miss"] = [phase_start, time.time()]
+        collectors.stop("cache miss")
 
         # Process and write the raw output
         for i, p in enumerate(procs):
@@ -421,66 +629,116 @@ if __name__ == "__main__":
         header.append("receiver cache miss (%)")
         output.append("{:.3f}".format(cache_miss))
 
-    if args.util_breakdown:
+    if args.numa:
         # Wait till sender starts
         is_sender_ready()
-        print("[util breakdown] starting experiment...")
+        print("[numa] starting experiment...")
+        phase_start = time.time()
+        collectors.start("numa")
+        numastat_before = read_node_numastat()
 
         # Start iperf and/or netperf instances
-        procs = run_flows(args.flow_type, args.config, args.num_connections, args.cpus, args.window)
+        procs = run_flows(args.flow_type, args.config, args.num_connections, args.cpus, args.window, binding)
 
         # Start the perf instance
-        output_dir = tempfile.TemporaryDirectory()
-        perf_data_file = os.path.join(output_dir.name, "perf.data")
-        perf = run_perf_record_util(list(set(args.cpus + args.affinity)), perf_data_file)
+        perf = run_perf_node_loads(list(set(args.cpus + args.affinity)))
 
         # Wait till sender is done sending
         mark_receiver_ready()
         is_sender_done()
 
+        # Find where the memory of the flows lives, before the servers go away
+        flow_nodes, remote_memory = flow_memory(procs, binding)
+
         # Kill perf
-        perf.send_signal(signal.SIGINT)
-        perf.wait()
+        supervisor.terminate([perf], signal.SIGINT)
 
-        # Kill all the processes
-        for p in procs:
-            p.kill()
-        print("[util breakdown] finished experiment.")
+        # Stop all the processes
+        supervisor.terminate(procs)
+        numastat = numastat_delta(numastat_before, read_node_numastat())
+        print("[numa] finished experiment.")
+        phase_times["numa"] = [phase_start, time.time()]
+        collectors.stop("numa")
 
         # Process and write the raw output
         for i, p in enumerate(procs):
             lines = p.stdout.readlines()
             if args.output is not None:
-                with open(os.path.join(args.output, "util-breakdown_benchmark_{}.log".format(i)), "w") as f:
+                with open(os.path.join(args.output, "numa_benchmark_{}.log".format(i)), "w") as f:
                     f.writelines(lines)
 
-        # Start a perf report instance
-        perf = run_perf_report(perf_data_file)
-        perf.wait()
-        output_dir.cleanup()
         lines = perf.stdout.readlines()
-        total_contrib, unaccounted_contrib, util_contibutions, not_found = process_util_breakdown_output(lines)
-        __results["util_contibutions"] = util_contibutions
+        remote_access = process_node_loads_output(lines)
+        remote_alloc = remote_alloc_fraction(numastat)
+        if remote_access is not None:
+            __results["remote_access"] = remote_access
+        __results["remote_alloc"] = remote_alloc
+        __results["remote_memory"] = remote_memory
+        # NOTE: XML-RPC only allows string keys and 32-bit integers, the memory goes in MB and the page counts as floats
+        __results["numa"] = {"numastat": {str(node): {name: float(pages) for name, pages in stats.items()} for node, stats in numastat.items()},
+                             "flow_memory": {str(node): size / 2 ** 20 for node, size in flow_nodes.items()}}
         if args.output is not None:
-            with open(os.path.join(args.output, "util-breakdown_perf.log"), "w") as f:
+            with open(os.path.join(args.output, "numa_perf.log"), "w") as f:
                 f.writelines(lines)
 
         # Print the output
-        print("[util breakdown] total contribution: {:.3f}\tunaccounted contribution: {:.3f}".format(total_contrib, unaccounted_contrib))
-        if unaccounted_contrib > 5 and args.verbose:
-            print("[util breakdown] unknown symbols: {}".format(", ".join(not_found)))
+        print("[numa] remote access: {}\tremote alloc: {:.3f}\tremote memory: {:.3f}".format(
+            "-" if remote_access is None else "{:.3f}".format(remote_access), remote_alloc, remote_memory))
+        header += ["receiver remote access (%)", "receiver remote alloc (%)", "receiver remote memory (%)"]
+        output += ["-" if remote_access is None else "{:.3f}".format(remote_access), "{:.3f}".format(remote_alloc), "{:.3f}".format(remote_memory)]
+
+    if args.util_breakdown:
+        # Wait till sender starts
+        is_sender_ready()
+        print("[util breakdown] starting experiment...")
+        phase_start = time.time()
+        collectors.start("util breakdown")
+
+        # Start iperf and/or netperf instances
+        procs = run_flows(args.flow_type, args.config, args.num_connections, args.cpus, args.window, binding)
+
+        # Start the perf instance
+        perf_data_dir = tempfile.mkdtemp(prefix="zc_bench_perf_")
+        perf_data_file = os.path.join(perf_data_dir, "perf.data")
+        perf = run_perf_record_util(list(set(args.cpus + args.affinity)), perf_data_file)
+
+        # Wait till sender is done sending
+        mark_receiver_ready()
+        is_sender_done()
+
+        # Kill perf
+        supervisor.terminate([perf], signal.SIGINT)
+
+        # Stop all the processes
+        supervisor.terminate(procs)
+        print("[util breakdown] finished experiment.")
+        phase_times["util breakdown"] = [phase_start, time.time()]
+        collectors.stop("util breakdown")
+
+        # Process and write the raw output
+        for i, p in enumerate(procs):
+            lines = p.stdout.readlines()
+            if args.output is not None:
+                with open(os.path.join(args.output, "util-breakdown_benchmark_{}.log".format(i)), "w") as f:
+                    f.writelines(lines)
+
+        # Run perf report in the background while the next experiment runs (or the next run, if deferred)
+        perf_log_file = None if args.output is None else os.path.join(args.output, "util-breakdown_perf.log")
+        postprocessor.submit_job({"name": "util breakdown", "kind": "breakdown", "breakdown": "util", "data": perf_data_dir, "log": perf_log_file})
 
     if args.cache_breakdown:
         # Wait till sender starts
         is_sender_ready()
         print("[cache breakdown] starting experiment...")
+        phase_start = time.time()
+        collectors.start("cache breakdown")
 
         # Start iperf and/or netperf instances
-        procs = run_flows(args.flow_type, args.config, args.num_connections, args.cpus, args.window)
+        procs = run_flows(args.flow_type, args.config, args.num_connections, args.cpus, args.window, binding)
 
         # Start the perf instance
-        output_dir = tempfile.TemporaryDirectory()
-        perf_data_file = os.path.join(output_dir.name, "perf.data")
+        perf_data_dir = tempfile.mkdtemp(prefix="zc_bench_perf_")
+        perf_data_file = os.path.join(perf_data_dir, "perf.data")
         perf = run_perf_record_cache(list(set(args.cpus + args.affinity)), perf_data_file)
 
         # Wait till sender is done sending
@@ -488,13 +746,13 @@ if __name__ == "__main__":
         is_sender_done()
 
         # Kill perf
-        perf.send_signal(signal.SIGINT)
-        perf.wait()
+        supervisor.terminate([perf], signal.SIGINT)
 
-        # Kill all the processes
-        for p in procs:
-            p.kill()
+        # Stop all the processes
+        supervisor.terminate(procs)
         print("[cache breakdown] finished experiment.")
+        phase_times["cache breakdown"] = [phase_start, time.time()]
+        collectors.stop("cache breakdown")
 
         # Process and write the raw output
         for i, p in enumerate(procs):
@@ -503,33 +761,23 @@ if __name__ == "__main__":
                 with open(os.path.join(args.output, "cache-breakdown_benchmark_{}.log".format(i)), "w") as f:
                     f.writelines(lines)
 
-        # Start a perf report instance
-        perf = run_perf_report(perf_data_file)
-        perf.wait()
-        output_dir.cleanup()
-        lines = perf.stdout.readlines()
-        total_contrib, unaccounted_contrib, cache_contibutions, not_found = process_util_breakdown_output(lines)
-        __results["cache_contibutions"] = cache_contibutions
-        if args.output is not None:
-            with open(os.path.join(args.output, "cache-breakdown_perf.log"), "w") as f:
-                f.writelines(lines)
-
-        # Print the output
-        print("[cache breakdown] total contribution: {:.3f}\tunaccounted contribution: {:.3f}".format(total_contrib, unaccounted_contrib))
-        if unaccounted_contrib > 5 and not args.verbose:
-            print("[cache breakdown] unknown symbols: {}".format(", ".join(not_found)))
+        # Run perf report in the background while the next experiment runs (or the next run, if deferred)
+        perf_log_file = None if args.output is None else os.path.join(args.output, "cache-breakdown_perf.log")
+        postprocessor.submit_job({"name": "cache breakdown", "kind": "breakdown", "breakdown": "cache", "data": perf_data_dir, "log": perf_log_file})
 
     if args.flame:
         # Wait till sender starts
         is_sender_ready()
         print("[flame] starting experiment...")
+        phase_start = time.time()
+        collectors.start("flame")
 
        # Start iperf and/or netperf instances
-        procs = run_flows(args.flow_type, args.config, args.num_connections, args.cpus, args.window)
+        procs = run_flows(args.flow_type, args.config, args.num_connections, args.cpus, args.window, binding)
 
         # Start the perf instance
-        output_dir = tempfile.TemporaryDirectory()
-        perf_data_file = os.path.join(output_dir.name, "perf.data")
+        perf_data_dir = tempfile.mkdtemp(prefix="zc_bench_perf_")
+        perf_data_file = os.path.join(perf_data_dir, "perf.data")
         perf = run_perf_record_flame(list(set(args.cpus + args.affinity)), perf_data_file)
 
         # Wait till sender is done sending
@@ -537,13 +785,13 @@ if __name__ == "__main__":
         is_sender_done()
 
         # Kill perf
-        perf.send_signal(signal.SIGINT)
-        perf.wait()
+        supervisor.terminate([perf], signal.SIGINT)
 
-        # Kill all the processes
-        for p in procs:
-            p.kill()
+        # Stop all the processes
+        supervisor.terminate(procs)
         print("[flame] finished experiment.")
+        phase_times["flame"] = [phase_start, time.time()]
+        collectors.stop("flame")
 
         # Process and write the raw output
         for i, p in enumerate(procs):
@@ -552,10 +800,9 @@ if __name__ == "__main__":
                 with open(os.path.join(args.output, "flame_benchmark_{}.log".format(i)), "w") as f:
                     f.writelines(lines)
 
-        # Start a perf report instance
+        # Create the flamegraph in the background while the next experiment runs (or the next run, if deferred)
         output_svg_file = os.path.join(args.output, "flame.svg")
-        run_flamegraph(perf_data_file, output_svg_file)
-        output_dir.cleanup()
+        postprocessor.submit_job({"name": "flame", "kind": "flame", "data": perf_data_dir, "svg": output_svg_file})
 
     if args.latency:
         # Clear dmesg
@@ -567,18 +814,21 @@ if __name__ == "__main__":
         # Wait till sender starts
         is_sender_ready()
         print("[latency] starting experiment...")
+        phase_start = time.time()
+        collectors.start("latency")
 
         # Start iperf and/or netperf instances
-        procs = run_flows(args.flow_type, args.config, args.num_connections, args.cpus, args.window)
+        procs = run_flows(args.flow_type, args.config, args.num_connections, args.cpus, args.window, binding)
 
         # Wait till sender is done sending
         mark_receiver_ready()
         is_sender_done()
 
-        # Kill all the processes
-        for p in procs:
-            p.kill()
+        # Stop all the processes
+        supervisor.terminate(procs)
         print("[latency] finished experiment.")
+        phase_times["latency"] = [phase_start, time.time()]
+        collectors.stop("latency")
 
         # Disable latency measurement
         latency_measurement(enabled=False)
@@ -590,27 +840,9 @@ if __name__ == "__main__":
                 with open(os.path.join(args.output, "latency_benchmark_{}.log".format(i)), "w") as f:
                     f.writelines(lines)
 
-        # Start a dmesg instance to read the kernel logs
-        dmesg = run_dmesg()
-        lines = []
-        while True:
-            new_lines = dmesg.stdout.readlines()
-            lines += new_lines
-            if len(new_lines) == 0 and dmesg.poll() != None:
-                break
-        avg_latency, tail_latency = process_latency_output(lines)
-        __results["avg_latency"] = avg_latency
-        __results["tail_latency"] = tail_latency
-        if args.output is not None:
-            with open(os.path.join(args.output, "latency_dmesg.log"), "w") as f:
-                f.writelines(lines)
-
-        # Print the output
-        print("[latency] avg. data copy latency: {:.3f}\ttail data copy latency: {}".format(avg_latency, tail_latency))
-        header.append("avg. data copy latency (us)")
-        output.append("{:.3f}".format(avg_latency))
-        header.append("tail data copy latency (us)")
-        output.append("{}".format(tail_latency))
+        # Dump the kernel logs, they are parsed in the background while the next experiment runs
+        dmesg_file, temporary = dump_dmesg(args.output, "latency_dmesg.log")
+        postprocessor.submit_job({"name": "latency", "kind": "latency", "path": dmesg_file, "temporary": temporary})
 
     if args.skb_hist:
         # Clear dmesg
@@ -622,18 +854,21 @@ if __name__ == "__main__":
         # Wait till sender starts
         is_sender_ready()
         print("[skb hist] starting experiment...")
+        phase_start = time.time()
+        collectors.start("skb hist")
 
         # Start iperf and/or netperf instances
-        procs = run_flows(args.flow_type, args.config, args.num_connections, args.cpus, args.window)
+        procs = run_flows(args.flow_type, args.config, args.num_connections, args.cpus, args.window, binding)
 
         # Wait till sender is done sending
         mark_receiver_ready()
         is_sender_done()
 
-        # Kill all the processes
-        for p in procs:
-            p.kill()
+        # Stop all the processes
+        supervisor.terminate(procs)
         print("[skb hist] finished experiment.")
+        phase_times["skb hist"] = [phase_start, time.time()]
+        collectors.stop("skb hist")
 
         # Disable skb size histogram measurement
         skb_hist_measurement(enabled=False)
@@ -645,31 +880,113 @@ if __name__ == "__main__":
                 with open(os.path.join(args.output, "skb-hist_benchmark_{}.log".format(i)), "w") as f:
                     f.writelines(lines)
 
-        # Start a dmesg instance to read the kernel logs
-        dmesg = run_dmesg()
-        lines = []
-        while True:
-            new_lines = dmesg.stdout.readlines()
-            lines += new_lines
-            if len(new_lines) == 0 and dmesg.poll() != None:
-                break
-        skb_sizes = process_skb_sizes_output(lines)
-        __results["skb_sizes"] = skb_sizes
-        if args.output is not None:
-            with open(os.path.join(args.output, "skb-hist_dmesg.log"), "w") as f:
-                f.writelines(lines)
+        # Dump the kernel logs, they are parsed in the background while the next experiment runs
+        dmesg_file, temporary = dump_dmesg(args.output, "skb-hist_dmesg.log")
+        postprocessor.submit_job({"name": "skb hist", "kind": "skb hist", "path": dmesg_file, "temporary": temporary, "layout": args.skb_hist_layout,
+                                  "width": args.skb_hist_width, "buckets": args.skb_hist_buckets, "interval": args.skb_hist_interval})
+
+    if args.soak:
+        # Wait till sender starts
+        is_sender_ready()
+        print("[soak] starting experiment...")
+        phase_start = time.time()
+        collectors.start("soak")
+
+        # Start iperf instances, their output is drained into rotated logs as it comes
+        procs = run_flows(args.flow_type, args.config, args.num_connections, args.cpus, args.window, binding)
+        monitor = SoakMonitor(args.cpus + args.affinity, args.soak_window, float("inf"))
+        soak_log = None if args.output is None else RotatingLog(os.path.join(args.output, "soak_benchmark.log"))
+        monitor.start()
+        drain_thread = threading.Thread(target=drain_flows, args=(procs, soak_log, monitor.on_line), daemon=True)
+        drain_thread.start()
+
+        # Close the windows as they fill up, till the sender is done sending
+        mark_receiver_ready()
+        while not __sender_done.wait(1):
+            monitor.tick()
+        is_sender_done()
+
+        # Stop all the processes
+        supervisor.terminate(procs)
+        drain_thread.join()
+        monitor.tick(final=True)
+        if soak_log is not None:
+            soak_log.close()
+        print("[soak] finished experiment.")
+        phase_times["soak"] = [phase_start, time.time()]
+        collectors.stop("soak")
+
+        # Print the output
+        soak_util = 0 if len(monitor.windows) == 0 else sum(w.cpu_util for w in monitor.windows) / len(monitor.windows)
+        __results["soak_utilisation"] = soak_util
+        print("[soak] mean utilisation: {:.3f}".format(soak_util))
+        header.append("utilisation (%)")
+        output.append("{:.3f}".format(soak_util))
+
+    # Stop the live metrics
+    if telemetry is not None:
+        telemetry.stop()
+
+    # Wait for the background post-processing of all the experiments, the deferred jobs are handed to the sender, the failed ones are left out
+    postprocessed = {name: result for name, result, error in postprocessor.results() if error is None}
+    postprocessor.shutdown()
+    __results["postprocess"] = postprocessor.deferred
+
+    if "util breakdown" in postprocessed:
+        breakdown = postprocessed["util breakdown"]
+        __results["util_contibutions"] = breakdown["contributions"]
+
+        # Print the output
+        print("[util breakdown] total contribution: {:.3f}\tunaccounted contribution: {:.3f}".format(breakdown["total"], breakdown["unaccounted"]))
+        if breakdown["unaccounted"] > 5 and args.verbose:
+            print("[util breakdown] unknown symbols: {}".format(", ".join(breakdown["not_found"])))
+
+    if "cache breakdown" in postprocessed:
+        breakdown = postprocessed["cache breakdown"]
+        __results["cache_contibutions"] = breakdown["contributions"]
+
+        # Print the output
+        print("[cache breakdown] total contribution: {:.3f}\tunaccounted contribution: {:.3f}".format(breakdown["total"], breakdown["unaccounted"]))
+        if breakdown["unaccounted"] > 5 and not args.verbose:
+            print("[cache breakdown] unknown symbols: {}".format(", ".join(breakdown["not_found"])))
+
+    if "latency" in postprocessed:
+        avg_latency = postprocessed["latency"]["avg_latency"]
+        tail_latency = postprocessed["latency"]["tail_latency"]
+        __results["avg_latency"] = avg_latency
+        __results["tail_latency"] = tail_latency
+        __results["latency_hist"] = postprocessed["latency"]["hist"]
+
+        # Print the output
+        print("[latency] avg. data copy latency: {:.3f}\ttail data copy latency: {}".format(avg_latency, tail_latency))
+        header.append("avg. data copy latency (us)")
+        output.append("{:.3f}".format(avg_latency))
+        header.append("tail data copy latency (us)")
+        output.append("{}".format(tail_latency))
+
+    if "skb hist" in postprocessed:
+        __results["skb_sizes"] = postprocessed["skb hist"]["fractions"]
+        __results["skb_sizes_hist"] = postprocessed["skb hist"]["hist"]
+
+    # Add the arguments of the receiver and the time of each experiment (in the receiver clock) to the results
+    __results["args"] = vars(args)
+    __results["phase_times"] = phase_times
+
+    # Add what the collectors measured in every experiment, the TCP counters on their own as before
+    collected = collectors.results()
+    __results["tcp_counters"] = collected.pop("tcp_counters")
+    __results["collectors"] = collected
+    __results["collector_metrics"] = collectors.metrics()
 
     # Add the headers to the results
     __results["header"] = header
     __results["output"] = output
 
-    # Sync with server again
+    # Sync with server again, the servers are closed once the run returns
     mark_receiver_ready()
     is_sender_ready()
 
-    # Close the server
-    server.shutdown()
-    server_thread.join()
 
-    # Reset packet drop rate
-    # set_packet_drop_rate(0)
+if __name__ == "__main__":
+    main()
+
@@ -1,16 +1,34 @@
 #!/usr/bin/env python3
 
 import argparse
+import contextlib
+import importlib
 import os
 import shlex
+import shutil
 import signal
 import subprocess as _sp
+import sys
 import tempfile
 import threading
 import time
 import xmlrpc.client
+from artifacts import *
+from collectors import *
 from constants import *
+from control import *
+from netem import *
+from numa import *
+from nic_config import read_nic_state
+from energy import *
+from postprocess import *
 from process_output import *
+from results_store import *
+from soak import *
+from steering import *
+from supervisor import *
+from telemetry import *
+from topology import *
 
 
 # For debugging
@@ -30,7 +48,11 @@ class subprocess:
         return _sp.Popen(*args, **kwargs)
 
 
-def parse_args():
+# Children of the experiments, signalled by process group instead of by name
+supervisor = Supervisor("sender", subprocess.Popen)
+
+
+def parse_args(argv=None):
     parser = argparse.ArgumentParser(description="Run TCP measurement experiments on the sender.")
 
     # Add arguments
@@ -40,6 +62,10 @@ def parse_args():
     parser.add_argument("--config", choices=["one-to-one", "incast", "outcast", "all-to-all", "single"], default="single", help="Configuration to run the experiment with.")
     parser.add_argument("--cpus", type=int, nargs="*", help="Which CPUs to use for experiment.")
     parser.add_argument("--affinity", type=int, nargs="*", help="Which CPUs are being used for IRQ processing.")
+    parser.add_argument("--iface", type=str, default=None, help="Interface the experiments run on, its configuration is recorded with the results.")
+    parser.add_argument("--steer", action="store_true", help="Pin the RX queue IRQs to --affinity and steer every flow to its queue with ntuple rules (needs --iface).")
+    parser.add_argument("--place-near", type=str, default=None, help="Plan --cpus and --affinity from the CPU/NUMA topology, close to this interface.")
+    parser.add_argument("--membind", type=str, default=None, help="Bind the memory of the flow processes to the node of their CPU (local), another node (remote) or a given node.")
     parser.add_argument("--num-connections", type=int, default=1, help="Number of connections.")
     parser.add_argument("--rpc-size", type=int, default=4000, help="Size of the RPC for short flows.")
     parser.add_argument("--num-rpcs", type=int, default=0, help="Number of short flows (for mixed flow type).")
@@ -47,18 +73,34 @@ def parse_args():
     parser.add_argument("--duration", type=int, default=20, help="Duration of the experiment in seconds.")
     parser.add_argument("--window", type=int, default=None, help="Specify the TCP window size (KB).")
     parser.add_argument("--output", type=str, default=None, help="Write raw output to the directory.")
+    parser.add_argument("--fetch-artifacts", action="store_true", help="Copy the raw outputs of the receiver into the receiver/ subdirectory of --output.")
+    parser.add_argument("--control", action="store_true", help="Synchronise with the receiver over the binary control protocol and estimate its clock offset.")
     parser.add_argument("--throughput", action="store_true", help="Measure throughput.")
     parser.add_argument("--utilisation", action="store_true", help="Measure CPU utilisation.")
+    parser.add_argument("--energy", action="store_true", help="Measure the energy used by the RAPL domains of both hosts during --throughput.")
     parser.add_argument("--cache-miss", action="store_true", help="Measure LLC miss rate.")
+    parser.add_argument("--numa", action="store_true", help="Measure the NUMA locality of the memory accesses, allocations and flow buffers.")
     parser.add_argument("--util-breakdown", action="store_true", help="Calculate CPU utilisation breakdown.")
     parser.add_argument("--cache-breakdown", action="store_true", help="Calculate cache miss breakdown.")
     parser.add_argument("--flame", action="store_true", help="Create a flame graph from the experiment.")
     parser.add_argument("--latency", action="store_true", help="Calculate the average data copy latency for each packet.")
     parser.add_argument("--skb-hist", action="store_true", help="Record the skb sizes histogram.")
+    parser.add_argument("--soak", action="store_true", help="Run the flows for a long --duration, reporting rolling windows and throughput degradation.")
+    parser.add_argument("--soak-window", type=int, default=60, help="Length of the rolling windows of --soak in seconds.")
+    parser.add_argument("--soak-checkpoint", type=int, default=600, help="Seconds between checkpoints of the --soak windows to the results store.")
+    parser.add_argument("--store", type=str, default=None, help="Append the results to the results store at this path.")
+    parser.add_argument("--experiment", type=str, default=None, help="Name of the experiment recorded in the results store.")
+    parser.add_argument("--label", type=str, default=None, help="Label of the run (e.g. optimisations) recorded in the results store.")
+    parser.add_argument("--point-key", type=str, default=None, help="Key of the experiment point recorded in the results store.")
+    parser.add_argument("--dashboard", action="store_true", help="Show live throughput, CPU utilisation and receiver counters in the terminal.")
+    parser.add_argument("--telemetry-port", type=int, default=None, help="Serve live metrics over HTTP on this port (/metrics and /stream).")
+    parser.add_argument("--telemetry-iface", type=str, default=None, help="Interface whose NIC counters are included in the live metrics.")
+    parser.add_argument("--telemetry-cpus", type=int, nargs="*", default=None, help="CPUs to collect the live metrics on (default: the CPUs not used by the experiment).")
+    parser.add_argument("--defer-postprocess", action="store_true", help="Keep the raw data of the post-processed experiments and record their jobs in the manifest, for the caller to process while the next run goes on.")
     parser.add_argument("--verbose", action="store_true", help="Print extra output.")
 
     # Parse and verify arguments
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # Report errors
     if args.config == "single" and args.num_connections != 1:
@@ -89,14 +131,73 @@ def parse_args():
         print("Can't set --num-rpcs outside of [0, {}].".format(MAX_RPCS))
         exit(1)
 
-    if not (5 <= args.duration <= 60):
-        print("Can't set --duration outside of [5, 60].")
+    # Soak runs last for hours, their outputs are never held in memory as a whole
+    if not args.soak and not (5 <= args.duration <= 60):
+        print("Can't set --duration outside of [5, 60] without --soak.")
+        exit(1)
+
+    if args.soak and args.duration < 5:
+        print("Can't set --duration < 5.")
+        exit(1)
+
+    if args.soak and any([args.throughput, args.utilisation, args.cache_miss, args.numa, args.util_breakdown, args.cache_breakdown, args.flame, args.latency, args.skb_hist]):
+        print("Can't combine --soak with other measurements.")
+        exit(1)
+
+    if args.soak and args.flow_type != "long":
+        print("Can't use --soak with --flow-type short/mixed.")
+        exit(1)
+
+    if args.soak_window <= 0 or args.soak_checkpoint <= 0:
+        print("Can't set --soak-window/--soak-checkpoint <= 0.")
         exit(1)
 
     if args.flame and args.output is None:
         print("Please provide --output if using --flame.")
         exit(1)
 
+    if args.energy and not args.throughput:
+        print("Please measure --throughput with --energy.")
+        exit(1)
+
+    if args.dashboard and not sys.stdout.isatty():
+        print("Can't use --dashboard without a terminal.")
+        exit(1)
+
+    if args.fetch_artifacts and args.output is None:
+        print("Please provide --output if using --fetch-artifacts.")
+        exit(1)
+
+    if args.steer and (args.iface is None or args.arfs or args.flow_type != "long"):
+        print("Can't use --steer without --iface, with --arfs or with --flow-type short/mixed.")
+        exit(1)
+
+    # CPUs of the host, the placement is planned and checked against them
+    topology = Topology()
+
+    if args.membind is not None:
+        error = check_membind(args.membind, topology)
+        if error is not None:
+            print("{}.".format(error))
+            exit(1)
+        if shutil.which("numactl") is None:
+            print("Please install numactl to use --membind.")
+            exit(1)
+
+    # Plan the placement from the topology: NUMA-local to the NIC, without sharing physical cores
+    if args.place_near is not None:
+        if args.cpus is not None or args.affinity is not None:
+            print("Can't set --cpus/--affinity with --place-near.")
+            exit(1)
+
+        try:
+            plan = plan_placement(topology, "sender", args.config, args.num_connections, args.place_near, args.arfs)
+        except ValueError as e:
+            print("{}.".format(e))
+            exit(1)
+        args.cpus = plan["cpus"]
+        args.affinity = None if args.arfs else plan["affinity"]
+
     # Set CPUs to be used
     if args.cpus is not None:
         if args.config in ["single", "outcast"] and len(args.cpus) != 1:
@@ -107,8 +208,8 @@ def parse_args():
             print("Please provide as many --cpus as --num-connections for --config incast/one-to-one/all-to-all.")
             exit(1)
 
-        if not all(map(lambda c: 0 <= c < MAX_CPUS, args.cpus)):
-            print("Can't set --cpus outside of [0, {}].".format(MAX_CPUS))
+        if not all(c in topology.cpus for c in args.cpus):
+            print("Can't set --cpus outside of the online CPUs ({}).".format(format_cpu_list(topology.online_cpus())))
             exit(1)
     else:
         if args.config in ["outcast", "single"]:
@@ -122,8 +223,8 @@ def parse_args():
 
     # Set IRQ processing CPUs
     if args.affinity is not None:
-        if not all(map(lambda c: 0 <= c < MAX_CPUS, args.affinity)):
-            print("Can't set --affinity outside of [0, {}].".format(MAX_CPUS))
+        if not all(c in topology.cpus for c in args.affinity):
+            print("Can't set --affinity outside of the online CPUs ({}).".format(format_cpu_list(topology.online_cpus())))
             exit(1)
     elif not args.arfs:
         if args.config in ["outcast", "single"]:
@@ -131,7 +232,7 @@ def parse_args():
         elif args.config in ["incast", "one-to-one"]:
             args.affinity = [cpu + 1 for cpu in args.cpus]
         elif args.config == "all-to-all":
-            args.affinity = list(range(MAX_CPUS))
+            args.affinity = topology.online_cpus()
     else:
         args.affinity = []
 
@@ -144,102 +245,104 @@ def parse_args():
 
 
 # Convenience functions
-def clear_processes():
-    os.system("pkill iperf")
-    os.system("pkill netserver")
-    os.system("pkill netperf")
-    os.system("pkill perf")
-    os.system("pkill sar")
-
-
-def run_iperf(cpu, addr, port, duration, window):
+def run_iperf(cpu, addr, port, duration, window, binding):
     if window is None:
-        args = ["taskset", "-c", str(cpu), "iperf3", "-i", "1", "-c", addr, "-t", str(duration), "-p", str(port)]
+        args = binding.argv(cpu) + ["iperf3", "-i", "1", "-c", addr, "-t", str(duration), "-p", str(port)]
     else:
-        args = ["taskset", "-c", str(cpu), "iperf3", "-i", "1", "-c", addr, "-t", str(duration), "-p", str(port), "-w", str(window / 2) + "K"]
+        args = binding.argv(cpu) + ["iperf3", "-i", "1", "-c", addr, "-t", str(duration), "-p", str(port), "-w", str(window / 2) + "K"]
 
-    return subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
+    return supervisor.launch(args, "flow", duration, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
 
 
-def run_netperf(cpu, addr, port, duration, rpc_size):
-    args = ["taskset", "-c", str(cpu), "netperf", "-H", addr, "-t", "TCP_RR", "-l", str(duration), "-p", str(port), "-f", "g", "--", "-r", "{0},{0}".format(rpc_size), "-o", "throughput"]
+def run_netperf(cpu, addr, port, duration, rpc_size, binding):
+    args = binding.argv(cpu) + ["netperf", "-H", addr, "-t", "TCP_RR", "-l", str(duration), "-p", str(port), "-f", "g", "--", "-r", "{0},{0}".format(rpc_size), "-o", "throughput"]
 
-    return subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
+    return supervisor.launch(args, "flow", duration, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
 
 
 # We run one iperf client process per flow, and one netperf process per flow
-def run_flows(flow_type, config, addr, num_connections, num_rpcs, cpus, duration, window, rpc_size):
+def run_flows(flow_type, config, addr, num_connections, num_rpcs, cpus, duration, window, rpc_size, binding):
     procs = []
     if flow_type == "mixed":
-        procs.append(run_iperf(cpus[0], addr, BASE_PORT, duration, window))
+        procs.append(run_iperf(cpus[0], addr, BASE_PORT, duration, window, binding))
         for _ in range(num_rpcs):
-            procs.append(run_netperf(cpus[0], addr, ADDITIONAL_BASE_PORT, duration, rpc_size))
+            procs.append(run_netperf(cpus[0], addr, ADDITIONAL_BASE_PORT, duration, rpc_size, binding))
     elif flow_type == "long":
         if config == "single":
-            procs.append(run_iperf(cpus[0], addr, BASE_PORT, duration, window))
+            procs.append(run_iperf(cpus[0], addr, BASE_PORT, duration, window, binding))
         elif config == "outcast":
-            procs += [run_iperf(cpus[0], addr, BASE_PORT + n, duration, window) for n in range(num_connections)]
+            procs += [run_iperf(cpus[0], addr, BASE_PORT + n, duration, window, binding) for n in range(num_connections)]
         elif config in ["incast", "one-to-one"]:
-            procs += [run_iperf(cpu, addr, BASE_PORT + n, duration, window) for n, cpu in enumerate(cpus)]
+            procs += [run_iperf(cpu, addr, BASE_PORT + n, duration, window, binding) for n, cpu in enumerate(cpus)]
         else:
             for i, sender_cpu in enumerate(cpus):
                 for j, receiver_cpu in enumerate(cpus):
-                    procs.append(run_iperf(sender_cpu, addr, BASE_PORT + i * MAX_CONNECTIONS + j, duration, window))
+                    procs.append(run_iperf(sender_cpu, addr, BASE_PORT + i * MAX_CONNECTIONS + j, duration, window, binding))
     else:
         if config == "single":
-            procs.append(run_netperf(cpus[0], addr, BASE_PORT, duration, rpc_size))
+            procs.append(run_netperf(cpus[0], addr, BASE_PORT, duration, rpc_size, binding))
         elif config == "incast":
-            procs += [run_netperf(cpu, addr, BASE_PORT, duration, rpc_size) for cpu in cpus]
+            procs += [run_netperf(cpu, addr, BASE_PORT, duration, rpc_size, binding) for cpu in cpus]
         elif config == "outcast":
-            procs += [run_netperf(cpus[0], addr, BASE_PORT + n, duration, rpc_size) for n in range(num_connections)]
+            procs += [run_netperf(cpus[0], addr, BASE_PORT + n, duration, rpc_size, binding) for n in range(num_connections)]
         elif config == "one-to-one":
-            procs += [run_netperf(cpu, addr, BASE_PORT + n, duration, rpc_size) for n, cpu in enumerate(cpus)]
+            procs += [run_netperf(cpu, addr, BASE_PORT + n, duration, rpc_size, binding) for n, cpu in enumerate(cpus)]
         else:
             for i, sender_cpu in enumerate(cpus):
                 for j, receiver_cpu in enumerate(cpus):
-                    procs.append(run_netperf(sender_cpu, addr, BASE_PORT + j, duration, rpc_size))
+                    procs.append(run_netperf(sender_cpu, addr, BASE_PORT + j, duration, rpc_size, binding))
 
     return procs
 
 
 def run_perf_cache(cpus):
     args = [PERF_PATH, "stat", "-C", ",".join(map(str, set(cpus))), "-e", "LLC-loads,LLC-load-misses,LLC-stores,LLC-store-misses"]
-    return subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
+    return supervisor.launch(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
+
+
+def run_perf_node_loads(cpus):
+    args = [PERF_PATH, "stat", "-C", ",".join(map(str, set(cpus))), "-e", "node-loads,node-load-misses"]
+    return supervisor.launch(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
+
+
+# perf record prints its progress, which would draw over the dashboard
+def perf_record_output():
+    return subprocess.DEVNULL if args.dashboard else None
 
 
 def run_perf_record_util(cpus, perf_data_file):
     args = [PERF_PATH, "record", "-C", ",".join(map(str, set(cpus))), "-o", str(perf_data_file)]
-    return subprocess.Popen(args, stdout=None, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
+    return supervisor.launch(args, stdout=perf_record_output(), stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
 
 
 def run_perf_record_cache(cpus, perf_data_file):
     args = [PERF_PATH, "record", "-e", "cache-misses", "-C", ",".join(map(str, set(cpus))), "-o", str(perf_data_file)]
-    return subprocess.Popen(args, stdout=None, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
+    return supervisor.launch(args, stdout=perf_record_output(), stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
 
 
 def run_perf_record_flame(cpus, perf_data_file):
     args = [PERF_PATH, "record", "-g", "-F", "99", "-C", ",".join(map(str, set(cpus))), "-o", str(perf_data_file)]
-    return subprocess.Popen(args, stdout=None, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
+    return supervisor.launch(args, stdout=perf_record_output(), stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
 
 
-def run_perf_report(perf_data_file):
-    args = ["bash", "-c", "{} report --stdio --stdio-color never --percent-limit 0.01 -i {} | cat".format(PERF_PATH, perf_data_file)]
-    return subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
-
+def run_sar(cpus):
+    args = ["sar", "-u", "-P", ",".join(map(str, set(cpus))), "1", "1000"]
+    return supervisor.launch(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
 
-def run_flamegraph(perf_data_file, output_svg_file):
-    os.system("{} script -i {} | {}/stackcollapse-perf.pl > out.perf-folded".format(PERF_PATH, perf_data_file, FLAME_PATH))
-    os.system("{}/flamegraph.pl out.perf-folded > {}".format(FLAME_PATH, output_svg_file))
 
+# Run the experiments with the receiver, measuring the collectors around every one of them on top of the TCP counters
+# Returns the record of the run, and its id in the results store if there is one
+# What the run sets up is undone when it returns or fails, in reverse order
+def main(argv=None, collectors=None):
+    with contextlib.ExitStack() as cleanup:
+        return run_experiments(argv, collectors, cleanup)
 
-def run_sar(cpus):
-    args = ["sar", "-u", "-P", ",".join(map(str, set(cpus))), "1", "1000"]
-    return subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
 
+def run_experiments(argv, collectors, cleanup):
+    global args
 
-if __name__ == "__main__":
     # Parse args
-    args = parse_args()
+    args = parse_args(argv)
     if args.verbose:
         subprocess.enable_logging()
 
@@ -254,30 +357,96 @@ if __name__ == "__main__":
         except ConnectionRefusedError:
             time.sleep(1)
 
+    # Synchronise over the binary control protocol instead, and estimate the clock offset of the receiver
+    rpc = receiver
+    if args.control:
+        receiver = ControlClient(args.receiver, CONTROL_PORT).connect()
+        clock = receiver.sync_clock()
+        print("[control] receiver clock offset: {:.6f} s\tround trip: {:.6f} s".format(clock["offset"], clock["delay"]))
+
+        # The receiver stamps its live metrics in the sender clock with it
+        receiver.set_clock(clock)
+
     # Print the output directory
     if args.output is not None:
         print("[output] writing results to {}".format(args.output))
 
-    # Run the experiments
-    clear_processes()
+    # Record of everything measured in this run
+    record = RunRecord(manifest_from_args(args))
+
+    # Effective configuration of the NIC and the network stack during the run
+    nic_state = None if args.iface is None else read_nic_state(args.iface)
+
+    # Post-process in the background, away from the CPUs of the experiment, unless it is left to the caller
+    postprocessor = PostProcessor(args.cpus + args.affinity, defer=args.defer_postprocess)
+
+    # Publish live metrics while the experiments run, away from the CPUs of the experiment
+    telemetry = None
+    if args.telemetry_port is not None or args.dashboard:
+        telemetry_cpus = set(args.telemetry_cpus) if args.telemetry_cpus else housekeeping_cpus(args.cpus + args.affinity)
+        telemetry_log = None if args.output is None else os.path.join(args.output, "telemetry.jsonl")
+        telemetry = Telemetry("sender", args.cpus + args.affinity, args.telemetry_iface, args.telemetry_port, telemetry_log, telemetry_cpus).start()
+        cleanup.callback(telemetry.stop)
+        if args.telemetry_port is not None:
+            print("[telemetry] serving live metrics on port {}".format(args.telemetry_port))
+
+    # Show the live metrics of both sides in the terminal
+    dashboard = None
+    if args.dashboard:
+        dashboard = importlib.import_module("dashboard").Dashboard(telemetry, args.receiver, COMM_PORT).start()
+        cleanup.callback(dashboard.stop)
+
+    # Steer every flow to the queue of its IRQ CPU, undone at the end of the run
+    steering_plan = None
+    if args.steer:
+        steering = FlowSteering(args.iface, "sender")
+        cleanup.callback(steering.remove)
+        steering_plan = {str(port): flow for port, flow in steering.setup(args.config, args.num_connections, args.cpus, args.affinity).items()}
+
+    # Measure the energy of the host over the throughput experiment, away from the CPUs of the experiment
+    energy_meter = None
+    if args.energy:
+        energy_meter = EnergyMeter(pin_cpus=housekeeping_cpus(args.cpus + args.affinity))
+        if len(energy_meter.domains) == 0:
+            print("[energy] no RAPL domains found, not measuring energy")
+            energy_meter = None
+
+    # Run the flow processes on their CPU, with their memory bound if asked
+    binding = NumaBinding(args.membind)
+
+    # Run the experiments, after killing what a previous run that didn't exit cleanly left behind
+    supervisor.clear_stale()
+    cleanup.callback(supervisor.terminate_all)
     header = []
     output = []
+    phase_times = {}
+    collectors = CollectorSet([supervisor] + list(collectors or []))
+    numa_stats = None
+    energy = None
     if args.throughput:
         # Wait till receiver starts
         receiver.mark_sender_ready()
         receiver.is_receiver_ready()
         print("[throughput] starting experiment...")
+        phase_start = time.time()
+        collectors.start("throughput")
+
+        if energy_meter is not None:
+            energy_meter.start()
 
         # Start iperf and/or netperf instances
-        procs = run_flows(args.flow_type, args.config, args.addr, args.num_connections, args.num_rpcs, args.cpus, args.duration, args.window, args.rpc_size)
+        procs = run_flows(args.flow_type, args.config, args.addr, args.num_connections, args.num_rpcs, args.cpus, args.duration, args.window, args.rpc_size, binding)
 
         # Wait till all experiments finish
-        for p in procs:
-            p.wait()
+        supervisor.wait(procs)
+        if energy_meter is not None:
+            energy = energy_meter.stop()
 
         # Sender is done sending
         receiver.mark_sender_done()
         print("[throughput] finished experiment.")
+        phase_times["throughput"] = [phase_start, time.time()]
+        collectors.stop("throughput")
 
         # Process and write the raw output
         total_throughput = 0
@@ -287,9 +456,11 @@ if __name__ == "__main__":
                 with open(os.path.join(args.output, "throughput_benchmark_{}.log".format(i)), "w") as f:
                     f.writelines(lines)
             total_throughput += process_throughput_output(lines)
+            record.add_flow_series("sender", "throughput", i, process_throughput_series(lines), supervisor.times(p)[0])
 
         # Print the output
         print("[throughput] total throughput: {:.3f}".format(total_throughput))
+        record.add_metric("sender", "throughput", total_throughput)
         header.append("throughput (Gbps)")
         output.append("{:.3f}".format(total_throughput))
 
@@ -298,24 +469,26 @@ if __name__ == "__main__":
         receiver.mark_sender_ready()
         receiver.is_receiver_ready()
         print("[utilisation] starting experiment...")
+        phase_start = time.time()
+        collectors.start("utilisation")
 
         # Start iperf and/or netperf instances
-        procs = run_flows(args.flow_type, args.config, args.addr, args.num_connections, args.num_rpcs, args.cpus, args.duration, args.window, args.rpc_size)
+        procs = run_flows(args.flow_type, args.config, args.addr, args.num_connections, args.num_rpcs, args.cpus, args.duration, args.window, args.rpc_size, binding)
 
         # Start the sar instance
         sar = run_sar(list(set(args.cpus + args.affinity)))
 
         # Wait till all experiments finish
-        for p in procs:
-            p.wait()
+        supervisor.wait(procs)
 
         # Sender is done sending
         receiver.mark_sender_done()
 
-        # Kill the sar instance
-        sar.send_signal(signal.SIGINT)
-        sar.wait()
+        # Stop the sar instance
+        supervisor.terminate([sar], signal.SIGINT)
         print("[utilisation] finished experiment.")
+        phase_times["utilisation"] = [phase_start, time.time()]
+        collectors.stop("utilisation")
 
         # Process and write the raw output
         throughput = 0
@@ -325,9 +498,13 @@ if __name__ == "__main__":
                 with open(os.path.join(args.output, "utilisation_benchmark_{}.log".format(i)), "w") as f:
                     f.writelines(lines)
             throughput += process_throughput_output(lines)
+            record.add_flow_series("sender", "utilisation", i, process_throughput_series(lines), supervisor.times(p)[0])
 
         lines = sar.stdout.readlines()
-        cpu_util = sum(process_util_output(lines).values())
+        cpu_utils = process_util_output(lines)
+        cpu_util = sum(cpu_utils.values())
+        record.add_metric("sender", "utilisation", cpu_util)
+        record.add_cpu_samples("sender", "utilisation", cpu_utils, supervisor.times(sar))
         if args.output is not None:
             with open(os.path.join(args.output, "utilisation_sar.log"), "w") as f:
                 f.writelines(lines)
@@ -342,24 +519,26 @@ if __name__ == "__main__":
         receiver.mark_sender_ready()
         receiver.is_receiver_ready()
         print("[cache miss] starting experiment...")
+        phase_start = time.time()
+        collectors.start("cache miss")
 
         # Start iperf and/or netperf instances
-        procs = run_flows(args.flow_type, args.config, args.addr, args.num_connections, args.num_rpcs, args.cpus, args.duration, args.window, args.rpc_size)
+        procs = run_flows(args.flow_type, args.config, args.addr, args.num_connections, args.num_rpcs, args.cpus, args.duration, args.window, args.rpc_size, binding)
 
         # Start the perf instance
         perf = run_perf_cache(list(set(args.cpus + args.affinity)))
 
         # Wait till all experiments finish
-        for p in procs:
-            p.wait()
+        supervisor.wait(procs)
 
         # Sender is done sending
         receiver.mark_sender_done()
 
-        # Kill the perf instance
-        perf.send_signal(signal.SIGINT)
-        perf.wait()
+        # Stop the perf instance
+        supervisor.terminate([perf], signal.SIGINT)
         print("[cache miss] finished experiment.")
+        phase_times["cache miss"] = [phase_start, time.time()]
+        collectors.stop("cache miss")
 
         # Process and write the raw output
         throughput = 0
@@ -369,9 +548,11 @@ if __name__ == "__main__":
                 with open(os.path.join(args.output, "cache-miss_benchmark_{}.log".format(i)), "w") as f:
                     f.writelines(lines)
             throughput += process_throughput_output(lines)
+            record.add_flow_series("sender", "cache-miss", i, process_throughput_series(lines), supervisor.times(p)[0])
 
         lines = perf.stdout.readlines()
         cache_miss = process_cache_miss_output(lines)
+        record.add_metric("sender", "cache_miss", cache_miss)
         if args.output is not None:
             with open(os.path.join(args.output, "cache-miss_perf.log"), "w") as f:
                 f.writelines(lines)
@@ -381,31 +562,93 @@ if __name__ == "__main__":
         header.append("sender cache miss (%)")
         output.append("{:.3f}".format(cache_miss))
 
+    if args.numa:
+        # Wait till receiver starts
+        receiver.mark_sender_ready()
+        receiver.is_receiver_ready()
+        print("[numa] starting experiment...")
+        phase_start = time.time()
+        collectors.start("numa")
+        numastat_before = read_node_numastat()
+
+        # Start iperf and/or netperf instances
+        procs = run_flows(args.flow_type, args.config, args.addr, args.num_connections, args.num_rpcs, args.cpus, args.duration, args.window, args.rpc_size, binding)
+
+        # Start the perf instance
+        perf = run_perf_node_loads(list(set(args.cpus + args.affinity)))
+
+        # Find where the memory of the flows lives half way through, the clients exit at the end
+        time.sleep(args.duration / 2)
+        flow_nodes, remote_memory = flow_memory(procs, binding)
+
+        # Wait till all experiments finish
+        supervisor.wait(procs)
+
+        # Sender is done sending
+        receiver.mark_sender_done()
+
+        # Stop the perf instance
+        supervisor.terminate([perf], signal.SIGINT)
+        numastat = numastat_delta(numastat_before, read_node_numastat())
+        print("[numa] finished experiment.")
+        phase_times["numa"] = [phase_start, time.time()]
+        collectors.stop("numa")
+
+        # Process and write the raw output
+        throughput = 0
+        for i, p in enumerate(procs):
+            lines = p.stdout.readlines()
+            if args.output is not None:
+                with open(os.path.join(args.output, "numa_benchmark_{}.log".format(i)), "w") as f:
+                    f.writelines(lines)
+            throughput += process_throughput_output(lines)
+            record.add_flow_series("sender", "numa", i, process_throughput_series(lines), supervisor.times(p)[0])
+
+        lines = perf.stdout.readlines()
+        remote_access = process_node_loads_output(lines)
+        remote_alloc = remote_alloc_fraction(numastat)
+        if args.output is not None:
+            with open(os.path.join(args.output, "numa_perf.log"), "w") as f:
+                f.writelines(lines)
+        if remote_access is not None:
+            record.add_metric("sender", "remote_access", remote_access)
+        record.add_metric("sender", "remote_alloc", remote_alloc)
+        record.add_metric("sender", "remote_memory", remote_memory)
+        numa_stats = {"numastat": {str(node): stats for node, stats in numastat.items()}, "flow_memory": {str(node): size / 2 ** 20 for node, size in flow_nodes.items()}}
+
+        # Print the output
+        print("[numa] total throughput: {:.3f}\tremote access: {}\tremote alloc: {:.3f}\tremote memory: {:.3f}".format(
+            throughput, "-" if remote_access is None else "{:.3f}".format(remote_access), remote_alloc, remote_memory))
+        header += ["sender remote access (%)", "sender remote alloc (%)", "sender remote memory (%)"]
+        output += ["-" if remote_access is None else "{:.3f}".format(remote_access), "{:.3f}".format(remote_alloc), "{:.3f}".format(remote_memory)]
+
     if args.util_breakdown:
         # Wait till receiver starts
         receiver.mark_sender_ready()
         receiver.is_receiver_ready()
         print("[util breakdown] starting experiment...")
+        phase_start = time.time()
+        collectors.start("util breakdown")
 
         # Start iperf and/or netperf instances
-        procs = run_flows(args.flow_type, args.config, args.addr, args.num_connections, args.num_rpcs, args.cpus, args.duration, args.window, args.rpc_size)
+        procs = run_flows(args.flow_type, args.config, args.addr, args.num_connections, args.num_rpcs, args.cpus, args.duration, args.window, args.rpc_size, binding)
 
         # Start the perf instance
-        output_dir = tempfile.TemporaryDirectory()
-        perf_data_file = os.path.join(output_dir.name, "perf.data")
+        perf_data_dir = tempfile.mkdtemp(prefix="zc_bench_perf_")
+        perf_data_file = os.path.join(perf_data_dir, "perf.data")
         perf = run_perf_record_util(list(set(args.cpus + args.affinity)), perf_data_file)
 
         # Wait till all experiments finish
-        for p in procs:
-            p.wait()
+        supervisor.wait(procs)
 
         # Sender is done sending
         receiver.mark_sender_done()
 
-        # Kill the perf instance
-        perf.send_signal(signal.SIGINT)
-        perf.wait()
+        # Stop the perf instance
+        supervisor.terminate([perf], signal.SIGINT)
         print("[util breakdown] finished experiment.")
+        phase_times["util breakdown"] = [phase_start, time.time()]
+        collectors.stop("util breakdown")
 
         # Process and write the raw output
         throughput = 0
@@ -415,52 +658,42 @@ if __name__ == "__main__":
                 with open(os.path.join(args.output, "util-breakdown_benchmark_{}.log".format(i)), "w") as f:
                     f.writelines(lines)
             throughput += process_throughput_output(lines)
+            record.add_flow_series("sender", "util-breakdown", i, process_throughput_series(lines), supervisor.times(p)[0])
 
-        # Run a perf report instance
-        perf = run_perf_report(perf_data_file)
-        lines = []
-        while True:
-            new_lines =  perf.stdout.readlines()
-            lines += new_lines
-            if len(new_lines) == 0:
-                break
-        perf.wait()
-        output_dir.cleanup()
-        total_contrib, unaccounted_contrib, util_contibutions, not_found = process_util_breakdown_output(lines)
-        if args.output is not None:
-            with open(os.path.join(args.output, "util-breakdown_perf.log"), "w") as f:
-                f.writelines(lines)
+        # Run perf report in the background while the next experiment runs (or the next run, if deferred)
+        perf_log_file = None if args.output is None else os.path.join(args.output, "util-breakdown_perf.log")
+        postprocessor.submit_job({"name": "util breakdown", "kind": "breakdown", "breakdown": "util", "data": perf_data_dir, "log": perf_log_file})
 
         # Print the output
-        print("[util breakdown] total throughput: {:.3f}\ttotal contribution: {:.3f}\tunaccounted contribution: {:.3f}".format(throughput, total_contrib, unaccounted_contrib))
-        if unaccounted_contrib > 5 and args.verbose:
-            print("[util breakdown] unknown symbols: {}".format(", ".join(not_found)))
+        print("[util breakdown] total throughput: {:.3f}".format(throughput))
 
     if args.cache_breakdown:
         # Wait till receiver starts
         receiver.mark_sender_ready()
         receiver.is_receiver_ready()
         print("[cache breakdown] starting experiment...")
+        phase_start = time.time()
+        collectors.start("cache breakdown")
 
         # Start iperf and/or netperf instances
-        procs = run_flows(args.flow_type, args.config, args.addr, args.num_connections, args.num_rpcs, args.cpus, args.duration, args.window, args.rpc_size)
+        procs = run_flows(args.flow_type, args.config, args.addr, args.num_connections, args.num_rpcs, args.cpus, args.duration, args.window, args.rpc_size, binding)
 
         # Start the perf instance
-        output_dir = tempfile.TemporaryDirectory()
-        perf_data_file = os.path.join(output_dir.name, "perf.data")
+        perf_data_dir = tempfile.mkdtemp(prefix="zc_bench_perf_")
+        perf_data_file = os.path.join(perf_data_dir, "perf.data")
         perf = run_perf_record_cache(list(set(args.cpus + args.affinity)), perf_data_file)
 
         # Wait till all experiments finish
-        for p in procs:
-            p.wait()
+        supervisor.wait(procs)
 
         # Sender is done sending
         receiver.mark_sender_done()
 
-        # Kill the perf instance
-        perf.send_signal(signal.SIGINT)
-        perf.wait()
+        # Stop the perf instance
+        supervisor.terminate([perf], signal.SIGINT)
         print("[cache breakdown] finished experiment.")
+        phase_times["cache breakdown"] = [phase_start, time.time()]
+        collectors.stop("cache breakdown")
 
         # Process and write the raw output
         throughput = 0
@@ -470,51 +703,42 @@ if __name__ == "__main__":
                 with open(os.path.join(args.output, "cache-breakdown_benchmark_{}.log".format(i)), "w") as f:
                     f.writelines(lines)
             throughput += process_throughput_output(lines)
+            record.add_flow_series("sender", "cache-breakdown", i, process_throughput_series(lines), supervisor.times(p)[0])
 
-        # Run a perf report instance
-        perf = run_perf_report(perf_data_file)
-        lines = []
-        while True:
-            new_lines =  perf.stdout.readlines()
-            lines += new_lines
-            if len(new_lines) == 0:
-                break
-        perf.wait()
-        total_contrib, unaccounted_contrib, cache_contibutions, not_found = process_util_breakdown_output(lines)
-        if args.output is not None:
-            with open(os.path.join(args.output, "cache-breakdown_perf.log"), "w") as f:
-                f.writelines(lines)
+        # Run perf report in the background while the next experiment runs (or the next run, if deferred)
+        perf_log_file = None if args.output is None else os.path.join(args.output, "cache-breakdown_perf.log")
+        postprocessor.submit_job({"name": "cache breakdown", "kind": "breakdown", "breakdown": "cache", "data": perf_data_dir, "log": perf_log_file})
 
         # Print the output
-        print("[cache breakdown] total throughput: {:.3f}\ttotal contribution: {:.3f}\tunaccounted contribution: {:.3f}".format(throughput, total_contrib, unaccounted_contrib))
-        if unaccounted_contrib > 5 and not args.verbose:
-            print("[cache breakdown] unknown symbols: {}".format(", ".join(not_found)))
+        print("[cache breakdown] total throughput: {:.3f}".format(throughput))
 
     if args.flame:
         # Wait till receiver starts
         receiver.mark_sender_ready()
         receiver.is_receiver_ready()
         print("[flame] starting experiment...")
+        phase_start = time.time()
+        collectors.start("flame")
 
         # Start iperf and/or netperf instances
-        procs = run_flows(args.flow_type, args.config, args.addr, args.num_connections, args.num_rpcs, args.cpus, args.duration, args.window, args.rpc_size)
+        procs = run_flows(args.flow_type, args.config, args.addr, args.num_connections, args.num_rpcs, args.cpus, args.duration, args.window, args.rpc_size, binding)
 
         # Start the perf instance
-        output_dir = tempfile.TemporaryDirectory()
-        perf_data_file = os.path.join(output_dir.name, "perf.data")
+        perf_data_dir = tempfile.mkdtemp(prefix="zc_bench_perf_")
+        perf_data_file = os.path.join(perf_data_dir, "perf.data")
         perf = run_perf_record_flame(list(set(args.cpus + args.affinity)), perf_data_file)
 
         # Wait till all experiments finish
-        for p in procs:
-            p.wait()
+        supervisor.wait(procs)
 
         # Sender is done sending
         receiver.mark_sender_done()
 
-        # Kill the perf instance
-        perf.send_signal(signal.SIGINT)
-        perf.wait()
+        # Stop the perf instance
+        supervisor.terminate([perf], signal.SIGINT)
         print("[flame] finished experiment.")
+        phase_times["flame"] = [phase_start, time.time()]
+        collectors.stop("flame")
 
         # Process and write the raw output
         throughput = 0
@@ -524,11 +748,11 @@ if __name__ == "__main__":
                 with open(os.path.join(args.output, "flame_benchmark_{}.log".format(i)), "w") as f:
                     f.writelines(lines)
             throughput += process_throughput_output(lines)
+            record.add_flow_series("sender", "flame", i, process_throughput_series(lines), supervisor.times(p)[0])
 
-        # Run a perf report instance
+        # Create the flamegraph in the background while the next experiment runs (or the next run, if deferred)
         output_svg_file = os.path.join(args.output, "flame.svg")
-        run_flamegraph(perf_data_file, output_svg_file)
-        output_dir.cleanup()
+        postprocessor.submit_job({"name": "flame", "kind": "flame", "data": perf_data_dir, "svg": output_svg_file})
 
         # Print the output
         print("[flame] total throughput: {:.3f}".format(throughput))
@@ -538,17 +762,20 @@ if __name__ == "__main__":
         receiver.mark_sender_ready()
         receiver.is_receiver_ready()
         print("[latency] starting experiment...")
+        phase_start = time.time()
+        collectors.start("latency")
 
         # Start iperf and/or netperf instances
-        procs = run_flows(args.flow_type, args.config, args.addr, args.num_connections, args.num_rpcs, args.cpus, args.duration, args.window, args.rpc_size)
+        procs = run_flows(args.flow_type, args.config, args.addr, args.num_connections, args.num_rpcs, args.cpus, args.duration, args.window, args.rpc_size, binding)
 
         # Wait till all experiments finish
-        for p in procs:
-            p.wait()
+        supervisor.wait(procs)
 
         # Sender is done sending
         receiver.mark_sender_done()
         print("[latency] finished experiment.")
+        phase_times["latency"] = [phase_start, time.time()]
+        collectors.stop("latency")
 
         # Process and write the raw output
         throughput = 0
@@ -558,6 +785,7 @@ if __name__ == "__main__":
                 with open(os.path.join(args.output, "latency_benchmark_{}.log".format(i)), "w") as f:
                     f.writelines(lines)
             throughput += process_throughput_output(lines)
+            record.add_flow_series("sender", "latency", i, process_throughput_series(lines), supervisor.times(p)[0])
 
         # Print the output
         print("[latency] total throughput: {:.3f}".format(throughput))
@@ -567,17 +795,20 @@ if __name__ == "__main__":
         receiver.mark_sender_ready()
         receiver.is_receiver_ready()
         print("[skb hist] starting experiment...")
+        phase_start = time.time()
+        collectors.start("skb hist")
 
         # Start iperf and/or netperf instances
-        procs = run_flows(args.flow_type, args.config, args.addr, args.num_connections, args.num_rpcs, args.cpus, args.duration, args.window, args.rpc_size)
+        procs = run_flows(args.flow_type, args.config, args.addr, args.num_connections, args.num_rpcs, args.cpus, args.duration, args.window, args.rpc_size, binding)
 
         # Wait till all experiments finish
-        for p in procs:
-            p.wait()
+        supervisor.wait(procs)
 
         # Sender is done sending
         receiver.mark_sender_done()
         print("[skb hist] finished experiment.")
+        phase_times["skb hist"] = [phase_start, time.time()]
+        collectors.stop("skb hist")
 
         # Process and write the raw output
         throughput = 0
@@ -587,13 +818,95 @@ if __name__ == "__main__":
                 with open(os.path.join(args.output, "skb-hist_benchmark_{}.log".format(i)), "w") as f:
                     f.writelines(lines)
             throughput += process_throughput_output(lines)
+            record.add_flow_series("sender", "skb-hist", i, process_throughput_series(lines), supervisor.times(p)[0])
 
         # Print the output
         print("[skb hist] total throughput: {:.3f}".format(throughput))
 
+    if args.soak:
+        # Wait till receiver starts
+        receiver.mark_sender_ready()
+        receiver.is_receiver_ready()
+        print("[soak] starting experiment...")
+        phase_start = time.time()
+        collectors.start("soak")
+
+        # Closed windows are checkpointed to the store while the run goes on
+        def checkpoint(soak_id, rows):
+            with ResultsStore(args.store) as store:
+                store.append_soak_windows(soak_id, rows)
+        monitor = SoakMonitor(args.cpus + args.affinity, args.soak_window, args.soak_checkpoint, None if args.store is None else checkpoint)
+        record.manifest["soak_id"] = monitor.soak_id
+
+        # Start iperf instances, their output is consumed as it comes
+        procs = run_flows(args.flow_type, args.config, args.addr, args.num_connections, args.num_rpcs, args.cpus, args.duration, args.window, args.rpc_size, binding)
+        soak_log = None if args.output is None else RotatingLog(os.path.join(args.output, "soak_benchmark.log"))
+        monitor.start()
+        drain_thread = threading.Thread(target=drain_flows, args=(procs, soak_log, monitor.on_line), daemon=True)
+        drain_thread.start()
+
+        # Close the windows as they fill up, till all experiments finish
+        while drain_thread.is_alive():
+            drain_thread.join(1)
+            monitor.tick()
+        supervisor.wait(procs)
+        monitor.tick(final=True)
+        if soak_log is not None:
+            soak_log.close()
+
+        # Sender is done sending
+        receiver.mark_sender_done()
+        print("[soak] finished experiment.")
+        phase_times["soak"] = [phase_start, time.time()]
+        collectors.stop("soak")
+
+        # Print the output
+        soak_throughput = monitor.mean_throughput()
+        soak_trend, soak_r2 = monitor.trend()
+        print("[soak] mean throughput: {:.3f}\ttrend: {:+.2f}% per hour (r^2 {:.2f})".format(soak_throughput, soak_trend, soak_r2))
+        if monitor.degrading():
+            print("[soak] WARNING: throughput degraded over the run")
+        record.add_metric("sender", "throughput", soak_throughput)
+        record.add_metric("sender", "soak_trend", soak_trend)
+        record.add_metric("sender", "soak_trend_r2", soak_r2)
+        record.add_histogram("sender", "soak_flow_throughput", monitor.total_hist.to_dict())
+        header.append("throughput (Gbps)")
+        output.append("{:.3f}".format(soak_throughput))
+        header.append("throughput trend (%/h)")
+        output.append("{:.2f}".format(soak_trend))
+
+    # Stop the live metrics
+    if dashboard is not None:
+        dashboard.stop()
+    if telemetry is not None:
+        telemetry.stop()
+
+    # Wait for the background post-processing of all the experiments, the failed ones are left out
+    postprocessed = {name: result for name, result, error in postprocessor.results() if error is None}
+    postprocessor.shutdown()
+
+    if "util breakdown" in postprocessed:
+        breakdown = postprocessed["util breakdown"]
+        record.add_breakdown("sender", "util", breakdown["contributions"])
+        print("[util breakdown] total contribution: {:.3f}\tunaccounted contribution: {:.3f}".format(breakdown["total"], breakdown["unaccounted"]))
+        if breakdown["unaccounted"] > 5 and args.verbose:
+            print("[util breakdown] unknown symbols: {}".format(", ".join(breakdown["not_found"])))
+
+    if "cache breakdown" in postprocessed:
+        breakdown = postprocessed["cache breakdown"]
+        record.add_breakdown("sender", "cache", breakdown["contributions"])
+        print("[cache breakdown] total contribution: {:.3f}\tunaccounted contribution: {:.3f}".format(breakdown["total"], breakdown["unaccounted"]))
+        if breakdown["unaccounted"] > 5 and not args.verbose:
+            print("[cache breakdown] unknown symbols: {}".format(", ".join(breakdown["not_found"])))
+
     # Sync with receiver before exiting
     receiver.is_receiver_ready()
 
+    # Estimate the clock drift over the whole run
+    if args.control:
+        clock = receiver.sync_clock()
+        print("[control] receiver clock offset: {:.6f} s\tdrift: {:.3f} us/s".format(clock["offset"], clock["drift"] * 1e6))
+
     # Get the results from receiver-side
     receiver_results = receiver.get_results()
     header += receiver_results["header"]
@@ -601,12 +914,77 @@ if __name__ == "__main__":
     if args.throughput and args.utilisation:
         header.append("throughput per core (Gbps)")
         if args.config == "outcast":
-            output.append("{:.3f}".format(total_throughput * 100 / cpu_util))
+            throughput_per_core = total_throughput * 100 / cpu_util
         else:
-            output.append("{:.3f}".format(total_throughput * 100 / receiver_results["cpu_util"]))
+            throughput_per_core = total_throughput * 100 / receiver_results["cpu_util"]
+        output.append("{:.3f}".format(throughput_per_core))
+        record.add_metric("sender", "throughput_per_core", throughput_per_core)
+
+    # Add the receiver-side results to the record
+    record.manifest["receiver"] = receiver_results.get("args")
+    record.manifest["nic"] = {"sender": nic_state, "receiver": receiver_results.get("nic")}
+    record.manifest["steering"] = {"sender": steering_plan, "receiver": receiver_results.get("steering")}
+    record.manifest["numa"] = {"sender": numa_stats, "receiver": receiver_results.get("numa")}
+
+    # Post-processing jobs of both sides left to the caller, their results are attached to the run once done
+    record.manifest["postprocess"] = {"sender": postprocessor.deferred, "receiver": receiver_results.get("postprocess", [])}
+
+    # Energy of both hosts per unit of traffic, at the throughput of the throughput experiment
+    record.manifest["energy"] = {"sender": energy, "receiver": receiver_results.get("energy")}
+    for side, side_energy in [("sender", energy), ("receiver", receiver_results.get("energy"))]:
+        if side_energy is None:
+            continue
+        efficiency = energy_efficiency(side_energy["power"], total_throughput)
+        record.add_metric(side, "power", side_energy["power"])
+        for name in ["watts_per_gbps", "joules_per_gb"]:
+            if efficiency[name] is not None:
+                record.add_metric(side, name, efficiency[name])
+        print("[energy] {} power: {:.3f} W\tpower per Gbps: {}\tenergy per GB: {}".format(side, side_energy["power"],
+              "-" if efficiency["watts_per_gbps"] is None else "{:.3f} W".format(efficiency["watts_per_gbps"]),
+              "-" if efficiency["joules_per_gb"] is None else "{:.3f} J".format(efficiency["joules_per_gb"])))
+        header += ["{} power (W)".format(side), "{} energy per GB (J)".format(side)]
+        output += ["{:.3f}".format(side_energy["power"]), "-" if efficiency["joules_per_gb"] is None else "{:.3f}".format(efficiency["joules_per_gb"])]
+
+    # What the collectors measured on both sides in every experiment, and their metrics (e.g. the loss recovery totals)
+    collected = collectors.results()
+    record.manifest["tcp_counters"] = {"sender": collected.pop("tcp_counters"), "receiver": receiver_results.get("tcp_counters", {})}
+    record.manifest["collectors"] = {"sender": collected, "receiver": receiver_results.get("collectors", {})}
+    for side, metrics in [("sender", collectors.metrics()), ("receiver", receiver_results.get("collector_metrics", {}))]:
+        for name, value in sorted(metrics.items()):
+            record.add_metric(side, name, value)
+
+    # Time of each experiment on both sides, in the sender clock if the offset of the receiver is known
+    receiver_phase_times = receiver_results.get("phase_times", {})
+    if args.control:
+        receiver_phase_times = {phase: [receiver.clock.to_local(t) for t in times] for phase, times in receiver_phase_times.items()}
+    record.manifest["clock"] = receiver.clock.fit() if args.control else None
+    record.manifest["phase_times"] = {"sender": phase_times, "receiver": receiver_phase_times}
+    for name in ["cpu_util", "cache_miss", "remote_access", "remote_alloc", "remote_memory", "avg_latency", "tail_latency", "soak_utilisation"]:
+        if name in receiver_results:
+            record.add_metric("receiver", "utilisation" if name == "cpu_util" else name, receiver_results[name])
+    if "cpu_utils" in receiver_results:
+        window = receiver_results.get("cpu_utils_window")
+        if args.control and window is not None:
+            window = [receiver.clock.to_local(t) for t in window]
+        record.add_cpu_samples("receiver", "utilisation", dict(receiver_results["cpu_utils"]), window)
+    if "util_contibutions" in receiver_results:
+        record.add_breakdown("receiver", "util", receiver_results["util_contibutions"])
+    if "cache_contibutions" in receiver_results:
+        record.add_breakdown("receiver", "cache", receiver_results["cache_contibutions"])
+    if "latency_hist" in receiver_results:
+        record.add_histogram("receiver", "latency", receiver_results["latency_hist"])
+    if "skb_sizes_hist" in receiver_results:
+        record.add_histogram("receiver", "skb_sizes", receiver_results["skb_sizes_hist"])
+
+    # Pull the raw outputs of the receiver before it exits
+    if args.fetch_artifacts:
+        transferred, skipped = fetch_artifacts(rpc, os.path.join(args.output, "receiver"))
+        print("[artifacts] fetched {} receiver artifacts ({} already present)".format(transferred, skipped))
 
     # Mark sender as done
     receiver.mark_sender_ready()
+    if args.control:
+        receiver.close()
 
     # Sleep before beginning the next experiment
     time.sleep(1)
@@ -619,37 +997,41 @@ if __name__ == "__main__":
         print("\t".join(header))
         print("\t".join(output))
 
-    # Print utilisation breakdown if required
-    if args.util_breakdown:
-        keys = sorted(util_contibutions.keys())
-        print("[sender utilisation breakdown]")
-        print("\t".join(keys))
-        print("\t".join(["{:.3f}".format(util_contibutions[k]) for k in keys]))
-
-        util_contibutions = receiver_results["util_contibutions"]
-        keys = sorted(util_contibutions.keys())
-        print("[receiver utilisation breakdown]")
-        print("\t".join(keys))
-        print("\t".join(["{:.3f}".format(util_contibutions[k]) for k in keys]))
-
-    # Print cache breakdown if required
-    if args.cache_breakdown:
-        keys = sorted(cache_contibutions.keys())
-        print("[sender cache breakdown]")
-        print("\t".join(keys))
-        print("\t".join(["{:.3f}".format(cache_contibutions[k]) for k in keys]))
-
-        cache_contibutions = receiver_results["cache_contibutions"]
-        keys = sorted(cache_contibutions.keys())
-        print("[receiver cache breakdown]")
-        print("\t".join(keys))
-        print("\t".join(["{:.3f}".format(cache_contibutions[k]) for k in keys]))
+    # Print the breakdowns of both sides, those deferred to the caller aren't known yet
+    for kind, title in [("util", "utilisation"), ("cache", "cache")]:
+        sender_breakdown = postprocessed.get("{} breakdown".format(kind))
+        for side, contributions in [("sender", None if sender_breakdown is None else sender_breakdown["contributions"]),
+                                    ("receiver", receiver_results.get("{}_contibutions".format(kind)))]:
+            if contributions is None:
+                continue
+            keys = sorted(contributions.keys())
+            print("[{} {} breakdown]".format(side, title))
+            print("\t".join(keys))
+            print("\t".join(["{:.3f}".format(contributions[k]) for k in keys]))
 
     # Print skb sizes histogram
-    if args.skb_hist:
-        skb_sizes = receiver_results["skb_sizes"]
-        keys = ["{}-{}".format(a, b) for a, b in zip(range(0, 65, 5), range(5, 70, 5))]
+    if "skb_sizes_hist" in receiver_results:
+        skb_sizes_hist = histogram_group_from_dict(receiver_results["skb_sizes_hist"])
         print("[skb sizes histogram]")
-        print("\t".join(keys))
-        print("\t".join(["{:.3f}".format(s) for s in skb_sizes]))
+        print("\t".join(skb_sizes_hist.total.labels()))
+        print("\t".join(["{:.3f}".format(s) for s in skb_sizes_hist.total.fractions()]))
 
+        # Print how the skb sizes evolve over the run
+        if len(skb_sizes_hist.per_interval) > 1:
+            print("[skb sizes over time]")
+            print("\t".join(["time (s)", "mean (KB)"] + skb_sizes_hist.total.labels()))
+            for start, hist in skb_sizes_hist.intervals():
+                print("\t".join(["{:g}".format(start), "{:.3f}".format(hist.mean())] + ["{:.3f}".format(s) for s in hist.fractions()]))
+
+    # Append the results to the store
+    run_id = None
+    if args.store is not None:
+        with ResultsStore(args.store) as store:
+            run_id = store.append(record)
+        print("[store] recorded run {} in {}".format(run_id, args.store))
+
+    return record, run_id
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import resource
+import signal
+import subprocess
+import sys
+import threading
+import time
+import xmlrpc.client
+import xmlrpc.server
+from artifacts import *
+from constants import *
+from nic_config import *
+from postprocess import *
+from results_store import *
+from scenario import *
+
+
+# Directory of this project
+DIR = os.path.split(os.path.realpath(__file__))[0]
+
+# Default addresses and interfaces of the hosts
+TOPOLOGY_FILE = os.path.join(SCENARIO_DIR, "topology.toml")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run an experiment scenario on the sender, or serve as the agent on the receiver.")
+
+    # Add arguments
+    parser.add_argument("scenario", nargs="?", type=str, help="Name or path of the scenario file (on the sender).")
+    parser.add_argument("--agent", action="store_true", help="Run as the receiver-side agent driven by the sender.")
+    parser.add_argument("--topology", type=str, default=TOPOLOGY_FILE, help="File with the default addresses and interfaces of the hosts.")
+    parser.add_argument("--receiver", type=str, default=None, help="Address of the receiver to communicate metadata.")
+    parser.add_argument("--addr", type=str, default=None, help="Address of the receiver interface to run experiments on.")
+    parser.add_argument("--iface", type=str, default=None, help="Interface to run experiments on.")
+    parser.add_argument("--results-dir", type=str, default=os.path.join(DIR, "results"), help="Directory for the logs, raw outputs and results store.")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the points of the scenario.")
+    parser.add_argument("--force", action="store_true", help="Re-measure points already recorded in the results store.")
+    parser.add_argument("--fetch-artifacts", action="store_true", help="Copy the raw outputs of the receiver next to the ones of the sender after every point.")
+    parser.add_argument("--verbose", action="store_true", help="Print extra output.")
+
+    # Parse and verify arguments
+    args = parser.parse_args()
+
+    if not args.agent and args.scenario is None:
+        print("Please provide a scenario unless running with --agent.")
+        exit(1)
+
+    # Fill in the topology defaults
+    topology = load_toml(args.topology) if os.path.exists(args.topology) else {}
+    side = topology.get("receiver" if args.agent else "sender", {})
+    if args.iface is None:
+        args.iface = side.get("iface")
+    if args.receiver is None:
+        args.receiver = topology.get("receiver", {}).get("public_addr")
+    if args.addr is None:
+        args.addr = topology.get("receiver", {}).get("addr")
+
+    if not args.agent and not args.dry_run and (args.receiver is None or args.addr is None):
+        print("Please provide --receiver and --addr, or set them in {}.".format(args.topology))
+        exit(1)
+
+    # Create the directory for writing results
+    os.makedirs(args.results_dir, exist_ok=True)
+
+    # Return parsed and verified arguments
+    return args
+
+
+# Raise the limit of open files (e.g. all-to-all opens one socket per pair of CPUs)
+def raise_open_files(limit):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < limit:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(limit, hard), hard))
+
+
+# Configure the NIC before a rung of the ladder, returns the number of changes that failed
+def run_network_setup(nic, flags):
+    if nic is None:
+        print("[scenario] no interface given, skipping NIC setup")
+        return 0
+    return len(nic.apply(flags))
+
+
+# Run a process, printing its output and writing it to the log file, started is called with the process
+def run_logged(argv, log_file, started=None):
+    with open(log_file, "w") as f:
+        p = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
+        if started is not None:
+            started(p)
+        for line in p.stdout:
+            sys.stdout.write(line)
+            f.write(line)
+        return p.wait()
+
+
+# Receiver-side agent, the sender drives every point through it
+class Agent:
+    def __init__(self, iface, results_dir):
+        self.iface = iface
+        self.results_dir = results_dir
+        self.nic = tool_nic_config(iface)
+        self.receiver = None
+        self.receiver_proc = None
+        self.exit_code = None
+        self.postprocessor = None
+
+    def environment(self):
+        return host_environment(self.iface)
+
+    def interface(self):
+        return self.iface
+
+    def setup_network(self, flags):
+        print("[agent] network setup: {}".format(" ".join(flags)))
+        return run_network_setup(self.nic, flags)
+
+    def restore_network(self):
+        return 0 if self.nic is None else len(self.nic.restore())
+
+    def start_receiver(self, argv, name, open_files):
+        if self.receiver is not None and self.receiver.is_alive():
+            raise RuntimeError("Receiver of the previous point is still running")
+
+        raise_open_files(open_files)
+        argv = [os.path.join(DIR, "run_experiment_receiver.py")] + argv + ["--output", os.path.join(self.results_dir, name)]
+        if self.iface is not None:
+            argv += ["--iface", self.iface]
+        log_file = os.path.join(self.results_dir, "{}.log".format(name))
+        print("[agent] starting {}".format(name))
+
+        self.exit_code = None
+        self.receiver_proc = None
+        def started(p):
+            self.receiver_proc = p
+        def run():
+            self.exit_code = run_logged(argv, log_file, started)
+        self.receiver = threading.Thread(target=run, daemon=True)
+        self.receiver.start()
+        return True
+
+    def wait_receiver(self):
+        if self.receiver is not None:
+            self.receiver.join()
+        return self.exit_code
+
+    # Interrupt a receiver whose sender failed, it would wait for it forever, the receiver undoes its setup as on ^C
+    def stop_receiver(self):
+        if self.receiver is not None and self.receiver.is_alive() and self.receiver_proc is not None:
+            print("[agent] stopping the receiver")
+            self.receiver_proc.send_signal(signal.SIGINT)
+        return self.wait_receiver()
+
+    # Process the deferred post-processing jobs of a run in the background, away from the CPUs of the next runs
+    def postprocess(self, run_id, specs, experiment_cpus):
+        if self.postprocessor is None:
+            self.postprocessor = PostProcessor(experiment_cpus)
+        self.postprocessor.avoid(experiment_cpus)
+        for spec in specs:
+            self.postprocessor.submit((run_id, spec["name"]), run_job, spec)
+        return True
+
+    # Finished post-processing jobs (all of them if waiting), as [run_id, name, result, error]
+    def collect_postprocessed(self, wait):
+        if self.postprocessor is None:
+            return []
+        return [[run_id, name, result, error] for (run_id, name), result, error in self.postprocessor.collect(wait)]
+
+
+def run_agent(args):
+    agent = Agent(args.iface, args.results_dir)
+    server = xmlrpc.server.SimpleXMLRPCServer(("0.0.0.0", AGENT_PORT), logRequests=False, allow_none=True)
+    server.register_introspection_functions()
+    server.register_instance(agent)
+    ArtifactDirectory(args.results_dir).register(server)
+    print("[agent] waiting for the sender on port {}".format(AGENT_PORT))
+    server.serve_forever()
+
+
+def connect_agent(receiver):
+    agent = xmlrpc.client.ServerProxy("http://{}:{}".format(receiver, AGENT_PORT), allow_none=True)
+
+    # Wait till the agent is up
+    while True:
+        try:
+            agent.system.listMethods()
+            return agent
+        except ConnectionRefusedError:
+            time.sleep(1)
+
+
+# Post-processing deferred by the points of a scenario, done while the next points run (on the receiver by the agent),
+# with the results attached to the runs in the results store as they finish
+class ScenarioPostProcessor:
+    def __init__(self, agent, store_path):
+        self.agent = agent
+        self.store_path = store_path
+        self.pool = None
+        self.specs = {}
+
+    # Submit the jobs of a run recorded in the store, away from the CPUs of the experiments of the run
+    def submit(self, run):
+        run_id = run["run_id"]
+        manifest = json.loads(run["manifest"])
+        jobs = manifest.get("postprocess") or {}
+        sides = {"sender": manifest, "receiver": manifest.get("receiver") or {}}
+        for side, side_args in sides.items():
+            specs = jobs.get(side, [])
+            if len(specs) == 0:
+                continue
+            experiment_cpus = (side_args.get("cpus") or []) + (side_args.get("affinity") or [])
+            for spec in specs:
+                self.specs[(side, run_id, spec["name"])] = spec
+            if side == "receiver":
+                self.agent.postprocess(run_id, specs, experiment_cpus)
+                continue
+            if self.pool is None:
+                self.pool = PostProcessor(experiment_cpus)
+            self.pool.avoid(experiment_cpus)
+            for spec in specs:
+                self.pool.submit((run_id, spec["name"]), run_job, spec)
+
+        names = ["{} {}".format(side, name) for side, job_run_id, name in self.specs if job_run_id == run_id]
+        if len(names) > 0:
+            print("[scenario] post-processing {} of run {} in the background".format(", ".join(names), run_id))
+
+    # Attach the results of the finished jobs (all of them if waiting) to their runs
+    def attach(self, wait=False):
+        finished = [] if self.pool is None else [["sender", run_id, name, result, error] for (run_id, name), result, error in self.pool.collect(wait)]
+        finished += [["receiver"] + job for job in self.agent.collect_postprocessed(wait)]
+
+        records = {}
+        for side, run_id, name, result, error in finished:
+            spec = self.specs.pop((side, run_id, name))
+            if error is not None:
+                print("[scenario] {} post-processing {} of run {} failed: {}".format(side, name, run_id, error))
+                continue
+            record_job(records.setdefault(run_id, RunRecord({})), side, spec, result)
+
+        if len(records) > 0:
+            with ResultsStore(self.store_path) as store:
+                for run_id, record in sorted(records.items()):
+                    store.attach(run_id, record)
+        return len(finished)
+
+    def finish(self):
+        if len(self.specs) > 0:
+            print("[scenario] waiting for the post-processing of {} jobs".format(len(self.specs)))
+        self.attach(wait=True)
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+# Run a point, its post-processing is left to the given scenario post-processor if any
+def run_point(args, agent, scenario, point, key, postprocessing=None):
+    name = point.name()
+    store = os.path.join(args.results_dir, "results.db")
+    defer = [] if postprocessing is None else ["--defer-postprocess"]
+
+    # Start the receiver first, the sender waits till it is up
+    agent.start_receiver(point.argv("receiver") + defer, name, scenario.get("open_files", 0))
+    argv = [os.path.join(DIR, "run_experiment_sender.py"), "--receiver", args.receiver, "--addr", args.addr] + point.argv("sender") + defer
+    argv += ["--store", store, "--experiment", scenario["name"], "--label", point.label, "--point-key", key, "--output", os.path.join(args.results_dir, name)]
+    if args.iface is not None:
+        argv += ["--iface", args.iface]
+    if args.verbose:
+        argv.append("--verbose")
+    sender_exit = run_logged(argv, os.path.join(args.results_dir, "{}.log".format(name)))
+
+    # A receiver whose sender failed waits for it forever, it is stopped instead so the sweep goes on
+    receiver_exit = agent.wait_receiver() if sender_exit == 0 else agent.stop_receiver()
+
+    # Collect the raw outputs of both sides in one place
+    if args.fetch_artifacts:
+        transferred, skipped = fetch_artifacts(agent, os.path.join(args.results_dir, name, "receiver"), name)
+        print("[scenario] fetched {} receiver artifacts of {} ({} already present)".format(transferred, name, skipped))
+
+    if sender_exit != 0 or receiver_exit != 0:
+        print("[scenario] {} failed (sender exit {}, receiver exit {})".format(name, sender_exit, receiver_exit))
+        return False
+
+    # Flag the points whose flows didn't last the whole run, their results are suspect
+    with ResultsStore(store) as results:
+        run = results.completed(key)
+        metrics = {} if run is None else results.run_metrics(run["run_id"])
+    early = {side: int(metrics.get((side, "early_exits"), 0)) for side in ["sender", "receiver"]}
+    if sum(early.values()) > 0:
+        print("[scenario] WARNING: flows of {} died early (sender {}, receiver {}), see the processes in the run manifest".format(name, early["sender"], early["receiver"]))
+
+    # Post-process the point while the next one runs
+    if postprocessing is not None and run is not None:
+        postprocessing.submit(run)
+    return True
+
+
+# Run a point unless the results store already has it, returns its latest run (None if it failed)
+def measure_point(args, agent, scenario, point, key):
+    store_path = os.path.join(args.results_dir, "results.db")
+    with ResultsStore(store_path) as store:
+        run = None if args.force else store.completed(key)
+    if run is not None:
+        print("[scenario] {} already in the results store (run {})".format(point.name(), run["run_id"]))
+        return run
+    if not run_point(args, agent, scenario, point, key):
+        return None
+    with ResultsStore(store_path) as store:
+        return store.completed(key)
+
+
+def run_scenario(args):
+    scenario = load_scenario(args.scenario)
+    points = expand_scenario(scenario)
+    print("[scenario] {}: {} points".format(scenario["name"], len(points)))
+
+    if args.dry_run:
+        for point in points:
+            print("{}\n  setup: {}\n  sender: {}\n  receiver: {}".format(point.name(), " ".join(point.setup), " ".join(point.argv("sender")), " ".join(point.argv("receiver"))))
+        return
+
+    raise_open_files(scenario.get("open_files", 0))
+    agent = connect_agent(args.receiver)
+
+    # Key every point by its full configuration, including both hosts
+    environment = {"sender": host_environment(args.iface), "receiver": agent.environment()}
+    keys = [point_key(scenario, point, environment) for point in points]
+
+    # Find the points already measured
+    with ResultsStore(os.path.join(args.results_dir, "results.db")) as store:
+        done = set() if args.force else {key for key in keys if store.completed(key) is not None}
+    if len(done) > 0:
+        print("[scenario] skipping {} points already in the results store (use --force to re-measure)".format(len(done)))
+
+    # Restore the original NIC configuration of both sides at the end, even if the scenario is interrupted
+    nic = tool_nic_config(args.iface)
+    applied_rung = -1
+    failed_rungs = set()
+    failed = []
+    postprocessing = ScenarioPostProcessor(agent, os.path.join(args.results_dir, "results.db"))
+    try:
+        for i, (point, key) in enumerate(zip(points, keys)):
+            if key in done:
+                continue
+
+            # Configure both NICs up to the rung of the point, setup of skipped rungs still applies
+            while applied_rung < point.rung_idx:
+                applied_rung += 1
+                setup = scenario["ladder"][applied_rung].get("setup", [])
+                print("[scenario] network setup: {}".format(" ".join(setup)))
+                setup_failed = run_network_setup(nic, setup) + agent.setup_network(setup)
+                if setup_failed > 0:
+                    print("[scenario] {} NIC changes of rung {} failed, skipping its points".format(setup_failed, applied_rung))
+                    failed_rungs.add(applied_rung)
+
+            # The points of a rung the NICs rejected would be measured with the old settings
+            if point.rung_idx in failed_rungs:
+                failed.append(point.name())
+                continue
+
+            print("[scenario] point {}/{}: {}".format(i + 1, len(points), point.name()))
+            if not run_point(args, agent, scenario, point, key, postprocessing):
+                failed.append(point.name())
+            postprocessing.attach()
+    finally:
+        if nic is not None:
+            nic.restore()
+        agent.restore_network()
+
+    # The report needs the post-processing of every point
+    postprocessing.finish()
+
+    if len(failed) > 0:
+        print("[scenario] failed points: {}".format(", ".join(failed)))
+
+    # Print the report of the scenario
+    subprocess.call([os.path.join(DIR, "report.py"), scenario["report"], "--store", os.path.join(args.results_dir, "results.db")])
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.agent:
+        run_agent(args)
+    else:
+        run_scenario(args)
@@ -0,0 +1,159 @@
+import hashlib
+import itertools
+import json
+import os
+import platform
+import tomllib
+
+
+# Directory holding the scenario files
+SCENARIO_DIR = os.path.join(os.path.split(os.path.realpath(__file__))[0], "scenarios")
+
+# Options understood by each side, parameters are only passed to the side that knows them
+COMMON_OPTIONS = {"flow_type", "config", "cpus", "affinity", "num_connections", "arfs", "window", "soak_window", "place_near", "steer", "membind", "verbose"}
+SENDER_OPTIONS = COMMON_OPTIONS | {"rpc_size", "num_rpcs", "duration", "control", "soak_checkpoint"}
+RECEIVER_OPTIONS = COMMON_OPTIONS | {"packet_drop", "netem_delay", "netem_jitter", "netem_reorder", "skb_hist_layout", "skb_hist_width", "skb_hist_buckets", "skb_hist_interval"}
+
+# Files whose contents change what the tool measures, hashed into the tool version
+# Every module the experiment scripts import is one (tests/test_scenario.py checks it)
+TOOL_FILES = ["artifacts.py", "collectors.py", "constants.py", "control.py", "energy.py", "histogram.py", "netem.py", "nic_config.py", "numa.py", "parallel_parse.py",
+              "postprocess.py", "process_output.py", "results_store.py", "run_experiment_receiver.py", "run_experiment_sender.py", "soak.py", "steering.py",
+              "supervisor.py", "symbol_mapping.tsv", "telemetry.py", "topology.py"]
+
+# Metrics that can be measured in a point, passed as flags to both sides
+METRICS = ["throughput", "utilisation", "energy", "cache-miss", "numa", "util-breakdown", "cache-breakdown", "flame", "latency", "skb-hist", "soak"]
+
+
+def load_toml(path):
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+
+# Find a scenario by name or path
+def scenario_path(name):
+    if os.path.exists(name):
+        return name
+    return os.path.join(SCENARIO_DIR, "{}.toml".format(name))
+
+
+def load_scenario(name):
+    scenario = load_toml(scenario_path(name))
+    scenario.setdefault("name", os.path.splitext(os.path.basename(name))[0])
+    scenario.setdefault("report", scenario["name"])
+    scenario.setdefault("metrics", ["throughput", "utilisation"])
+    scenario.setdefault("ladder", [{"label": "default"}])
+    scenario.setdefault("sweep", {})
+    scenario.setdefault("points", [{}])
+
+    # Check the scenario before running anything
+    for rung in scenario["ladder"]:
+        if "label" not in rung:
+            raise ValueError("Every rung of the ladder in {} needs a label".format(scenario["name"]))
+        for m in rung.get("metrics", scenario["metrics"]):
+            if m not in METRICS:
+                raise ValueError("Unknown metric {} in {}".format(m, scenario["name"]))
+    for key, values in scenario["sweep"].items():
+        if not isinstance(values, list) or len(values) == 0:
+            raise ValueError("Sweep axis {} in {} needs a non-empty list of values".format(key, scenario["name"]))
+
+    return scenario
+
+
+# Command line of one side for its parameters and the metrics, leaving out the options it doesn't know
+def side_argv(side, params, metrics):
+    options = SENDER_OPTIONS if side == "sender" else RECEIVER_OPTIONS
+    argv = []
+    for k, v in sorted(params.items()):
+        if k not in options:
+            continue
+        argv.append("--" + k.replace("_", "-"))
+        if isinstance(v, list):
+            argv += [str(x) for x in v]
+        elif v is not True:
+            argv.append(str(v))
+    argv += ["--" + m for m in metrics]
+    return argv
+
+
+# Merge layers of parameters, later layers win and None/false removes a parameter
+def merge_params(*layers):
+    params = {}
+    for layer in layers:
+        for k, v in layer.items():
+            if k in ["sender", "receiver"]:
+                continue
+            params[k] = v
+    return {k: v for k, v in params.items() if v is not None and v is not False}
+
+
+# A single run of the experiment, with everything needed to run both sides
+class Point:
+    def __init__(self, scenario, rung_idx, rung, sweep, point):
+        self.scenario = scenario["name"]
+        self.rung_idx = rung_idx
+        self.label = point.get("label", rung["label"])
+        self.tag = point.get("name")
+        self.setup = rung.get("setup", [])
+        self.metrics = point.get("metrics", rung.get("metrics", scenario["metrics"]))
+        self.sweep = sweep
+        self.params = merge_params(scenario.get("params", {}), rung.get("params", {}), sweep, point.get("params", {}))
+
+        # Parameters only used by one side
+        self.side_params = {}
+        for side in ["sender", "receiver"]:
+            self.side_params[side] = merge_params(self.params, scenario.get(side, {}), rung.get(side, {}), point.get(side, {}))
+
+    # Unique name of the point, used for the output directory and the log
+    def name(self):
+        parts = [self.scenario, self.label] + ["{}".format(v) for v in self.sweep.values()]
+        if self.tag is not None:
+            parts.append(self.tag)
+        return "_".join(parts)
+
+    def argv(self, side):
+        return side_argv(side, self.side_params[side], self.metrics)
+
+
+# Expand a scenario into its points: every rung of the ladder, for every combination of the sweep axes
+def expand_scenario(scenario):
+    keys = list(scenario["sweep"].keys())
+    points = []
+    for rung_idx, rung in enumerate(scenario["ladder"]):
+        for values in itertools.product(*[scenario["sweep"][k] for k in keys]):
+            for point in scenario["points"]:
+                points.append(Point(scenario, rung_idx, rung, dict(zip(keys, values)), point))
+    return points
+
+
+# Version of the measurement code, as a hash of its sources
+def tool_version():
+    h = hashlib.sha256()
+    base = os.path.split(os.path.realpath(__file__))[0]
+    for name in TOOL_FILES:
+        with open(os.path.join(base, name), "rb") as f:
+            h.update(name.encode())
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+# Local properties of a host that change the results of a point
+def host_environment(iface=None):
+    env = {"kernel": platform.release(), "tool": tool_version()}
+    if iface is not None:
+        driver_file = "/sys/class/net/{}/device/driver".format(iface)
+        env["driver"] = os.path.basename(os.path.realpath(driver_file)) if os.path.exists(driver_file) else None
+    return env
+
+
+# Key identifying a point by its full configuration: parameters of both sides,
+# NIC setup of all rungs up to the point (setup is incremental) and the environment of both hosts
+def point_key(scenario, point, environment):
+    config = {
+        "scenario": scenario["name"],
+        "label": point.label,
+        "setup": [rung.get("setup", []) for rung in scenario["ladder"][:point.rung_idx + 1]],
+        "sender": point.argv("sender"),
+        "receiver": point.argv("receiver"),
+        "environment": environment,
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
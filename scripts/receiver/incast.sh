@@ -7,29 +7,5 @@ DIR=$(realpath $(dirname $(readlink -f $0))/../..)
 iface=${1:-enp37s0f1}
 results_dir=${2:-$DIR/results}
 
-# Create results directory
-mkdir -p $results_dir
-
-# No Optimisations
-$DIR/network_setup.py $iface --no-lro --no-gso --no-gro --no-tso --mtu 1500 --sock-size  --no-arfs --config incast --receiver
-for i in 8 16 24; do
-        $DIR/run_experiment_receiver.py --config incast --num-connections $i --throughput --utilisation --output $results_dir/incast_${i}_no-opts | tee $results_dir/incast_${i}_no-opts.log
-done
-
-# TSO/GRO
-$DIR/network_setup.py $iface --gro --tso
-for i in 8 16 24; do
-        $DIR/run_experiment_receiver.py --config incast --num-connections $i --throughput --utilisation --output $results_dir/incast_${i}_tsogro | tee $results_dir/incast_${i}_tsogro.log
-done
-
-# TSO/GRO+Jumbo Frame
-$DIR/network_setup.py $iface --mtu 9000
-for i in 8 16 24; do
-        $DIR/run_experiment_receiver.py --config incast --num-connections $i --throughput --utilisation --output $results_dir/incast_${i}_tsogro+jumbo | tee $results_dir/incast_${i}_tsogro+jumbo.log
-done
-
-# TSO/GRO+Jumbo Frame+aRFS
-$DIR/network_setup.py $iface --arfs
-for i in 8 16 24; do
-        $DIR/run_experiment_receiver.py --config incast --num-connections $i --throughput --utilisation --cache-miss --util-breakdown --arfs --output $results_dir/incast_${i}_all-opts | tee $results_dir/incast_${i}_all-opts.log
-done
+# Serve the scenario agent, the sender drives all points of the scenario
+$DIR/run_scenario.py --agent --iface $iface --results-dir $results_dir
@@ -0,0 +1,254 @@
+import collections
+import os
+import selectors
+import threading
+import time
+import uuid
+from histogram import *
+from process_output import *
+from telemetry import read_cpu_times
+
+
+# Size of a raw log before it is rotated, and number of rotated logs kept
+SOAK_LOG_MAX_BYTES = 64 * 1024 * 1024
+SOAK_LOG_BACKUPS = 8
+
+# Windows kept in memory, older ones are only in the results store (24 hours of 1 minute windows)
+SOAK_MAX_WINDOWS = 1440
+
+# Throughput degradation worth reporting (% per hour), and how well the trend must fit the windows
+SOAK_DEGRADATION_THRESHOLD = 2
+SOAK_TREND_MIN_R2 = 0.5
+SOAK_TREND_MIN_WINDOWS = 10
+
+# Seconds to wait for the late interval reports of a window before closing it
+SOAK_WINDOW_GRACE = 3
+
+# Bytes read from the output of a flow at once
+DRAIN_READ_SIZE = 65536
+
+
+# Log file rotated by size: path, path.1, ..., path.<backups>
+class RotatingLog:
+    def __init__(self, path, max_bytes=SOAK_LOG_MAX_BYTES, backups=SOAK_LOG_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.f = open(path, "w")
+        self.size = 0
+
+    def rotate(self):
+        self.f.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists("{}.{}".format(self.path, i)):
+                os.replace("{}.{}".format(self.path, i), "{}.{}".format(self.path, i + 1))
+        os.replace(self.path, "{}.1".format(self.path))
+        self.f = open(self.path, "w")
+        self.size = 0
+
+    def write(self, line):
+        if self.size + len(line) > self.max_bytes and self.size > 0:
+            self.rotate()
+        self.f.write(line)
+        self.size += len(line)
+
+    def close(self):
+        self.f.close()
+
+
+# Aggregates of one window of the run, small and fixed in size
+# Its start and end are relative to the start of the run, its time is the start in the clock of the host (the sender for the stored windows)
+class SoakWindow:
+    def __init__(self, idx, length, start_time):
+        self.idx = idx
+        self.start = idx * length
+        self.end = (idx + 1) * length
+        self.time = start_time + self.start
+        self.per_second = {}
+        self.flow_hist = LogHistogram()
+        self.cpu_util = None
+
+    # Per-second report of one flow (Gbps), recorded in Mbps in the histogram
+    def add(self, second, throughput):
+        self.per_second[second] = self.per_second.get(second, 0) + throughput
+        self.flow_hist.record(int(throughput * 1000))
+
+    def throughput(self):
+        return 0 if len(self.per_second) == 0 else sum(self.per_second.values()) / len(self.per_second)
+
+    def min_throughput(self):
+        return 0 if len(self.per_second) == 0 else min(self.per_second.values())
+
+    def to_row(self):
+        return (self.idx, self.start, self.end, self.throughput(), self.min_throughput(), self.cpu_util, self.flow_hist.to_dict(), self.time)
+
+
+# Least-squares trend of the window throughput: (% change per hour, r^2)
+def throughput_trend(windows):
+    points = [((w.start + w.end) / 2 / 3600, w.throughput()) for w in windows]
+    if len(points) < 2:
+        return 0, 0
+
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    var_y = sum((y - mean_y) ** 2 for _, y in points)
+    if var_x == 0 or mean_y == 0:
+        return 0, 0
+
+    cov = sum((x - mean_x) * (y - mean_y) for x, y in points)
+    slope = cov / var_x
+    r2 = 0 if var_y == 0 else cov ** 2 / (var_x * var_y)
+    return slope / mean_y * 100, r2
+
+
+# Drain the output of long-running flows into a rotating log (if any), calling back with every line
+# Pipes must be drained continuously, or the flows block once the pipe buffers fill up
+# The raw descriptors are read with os.read and split into lines here: a buffered readline after select can block
+# on a partial line, or leave lines in its buffer that select doesn't see
+def drain_flows(procs, log, on_line=None):
+    sel = selectors.DefaultSelector()
+    partial = {}
+    for i, p in enumerate(procs):
+        fd = p.stdout.fileno()
+        sel.register(fd, selectors.EVENT_READ, i)
+        partial[fd] = b""
+
+    while len(sel.get_map()) > 0:
+        for key, _ in sel.select(timeout=1):
+            data = os.read(key.fd, DRAIN_READ_SIZE)
+            if data == b"":
+                sel.unregister(key.fd)
+                lines = [partial.pop(key.fd)] if len(partial[key.fd]) > 0 else []
+            else:
+                lines = (partial[key.fd] + data).split(b"\n")
+                partial[key.fd] = lines.pop()
+                lines = [line + b"\n" for line in lines]
+            for line in lines:
+                line = line.decode(errors="replace")
+                # A last line without a newline gets one in the log, or the next line of another flow would join it
+                if log is not None:
+                    log.write("{}: {}{}".format(key.data, line, "" if line.endswith("\n") else "\n"))
+                if on_line is not None:
+                    on_line(key.data, line)
+    sel.close()
+
+
+# Rolling view of a soak run: per-window aggregates and histograms in bounded memory,
+# checkpoints of the closed windows and detection of throughput degradation over time
+class SoakMonitor:
+    def __init__(self, cpus, window, checkpoint_interval, checkpoint=None):
+        self.soak_id = uuid.uuid4().hex
+        self.cpus = sorted(set(cpus))
+        self.window = window
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint = checkpoint
+        self.windows = collections.deque(maxlen=SOAK_MAX_WINDOWS)
+        self.open_windows = {}
+        self.pending = []
+        self.total_hist = LogHistogram()
+        self.total_throughput = 0.
+        self.num_windows = 0
+        self.lock = threading.Lock()
+        self.start_time = None
+        self.cpu_times = None
+        self.cpu_samples = []
+        self.last_sample = None
+        self.next_window = 0
+        self.last_checkpoint = None
+
+    def start(self):
+        self.start_time = time.time()
+        self.last_checkpoint = self.start_time
+        self.last_sample = 0
+        self.cpu_times = read_cpu_times()
+
+    # Interval report of a flow, windows are aligned to the seconds of iperf
+    def on_line(self, flow, line):
+        match = IPERF_INTERVAL_PATTERN.match(line)
+        if match is None or "sender" in match.group(5) or "receiver" in match.group(5):
+            return
+        second = int(float(match.group(1)))
+        throughput = float(match.group(3)) * IPERF_UNITS[match.group(4)]
+        with self.lock:
+            idx = second // self.window
+            if idx not in self.open_windows:
+                self.open_windows[idx] = SoakWindow(idx, self.window, self.start_time)
+            self.open_windows[idx].add(second, throughput)
+
+    def cpu_util(self):
+        cpu_times = read_cpu_times()
+        util = 0.
+        for cpu in self.cpus:
+            if cpu in cpu_times and cpu in self.cpu_times:
+                busy = cpu_times[cpu][0] - self.cpu_times[cpu][0]
+                total = cpu_times[cpu][1] - self.cpu_times[cpu][1]
+                util += 0 if total == 0 else busy * 100 / total
+        self.cpu_times = cpu_times
+        return util
+
+    # Utilisation since the previous sample, over [start, end] relative to the start of the run
+    def sample_cpu_util(self, elapsed):
+        self.cpu_samples.append((self.last_sample, elapsed, self.cpu_util()))
+        self.last_sample = elapsed
+
+    # Utilisation over the span of a window, from the samples overlapping it weighted by the overlap
+    def window_cpu_util(self, w):
+        util, weight = 0., 0.
+        for start, end, sample in self.cpu_samples:
+            overlap = min(end, w.end) - max(start, w.start)
+            if overlap > 0:
+                util += sample * overlap
+                weight += overlap
+        return None if weight == 0 else util / weight
+
+    # Close the windows whose reports are all in, called periodically
+    # The utilisation is sampled on every tick, so that each window gets the utilisation over its own span
+    def tick(self, final=False):
+        elapsed = time.time() - self.start_time
+        self.sample_cpu_util(elapsed)
+        with self.lock:
+            done = sorted(idx for idx in self.open_windows if final or (idx + 1) * self.window + SOAK_WINDOW_GRACE <= elapsed)
+            closed = [self.open_windows.pop(idx) for idx in done]
+            if len(done) > 0:
+                self.next_window = max(self.next_window, done[-1] + 1)
+            first_open = min([idx for idx in self.open_windows] + [self.next_window]) * self.window
+
+        for w in closed:
+            w.cpu_util = self.window_cpu_util(w)
+            self.windows.append(w)
+            if self.checkpoint is not None:
+                self.pending.append(w)
+            self.total_hist.merge(w.flow_hist)
+            self.total_throughput += w.throughput()
+            self.num_windows += 1
+            print("[soak] window {} ({}-{} s): throughput: {:.3f}\tmin: {:.3f}\tutilisation: {}".format(
+                w.idx, w.start, w.end, w.throughput(), w.min_throughput(), "-" if w.cpu_util is None else "{:.3f}".format(w.cpu_util)))
+
+        # Samples are only kept while a window they overlap can still close
+        self.cpu_samples = [s for s in self.cpu_samples if s[1] > first_open]
+
+        if final or time.time() - self.last_checkpoint >= self.checkpoint_interval:
+            self.flush()
+
+    # Write the pending windows out and report the trend so far
+    def flush(self):
+        self.last_checkpoint = time.time()
+        if self.checkpoint is not None and len(self.pending) > 0:
+            self.checkpoint(self.soak_id, [w.to_row() for w in self.pending])
+        self.pending = []
+
+        trend, r2 = self.trend()
+        if self.degrading():
+            print("[soak] throughput degrading by {:.2f}% per hour (r^2 {:.2f})".format(-trend, r2))
+
+    def trend(self):
+        return throughput_trend(self.windows)
+
+    def degrading(self):
+        trend, r2 = self.trend()
+        return len(self.windows) >= SOAK_TREND_MIN_WINDOWS and trend <= -SOAK_DEGRADATION_THRESHOLD and r2 >= SOAK_TREND_MIN_R2
+
+    def mean_throughput(self):
+        return 0 if self.num_windows == 0 else self.total_throughput / self.num_windows
@@ -0,0 +1,145 @@
+import re
+import subprocess
+from constants import *
+from topology import *
+
+
+# Existing ntuple rules in ethtool -n
+RULE_PATTERN = re.compile(r"^\s*Filter:\s*(\d+)")
+
+
+def irq_affinity_path(irq):
+    return "/proc/irq/{}/smp_affinity_list".format(irq)
+
+
+def read_irq_affinity(irq):
+    return read_value(irq_affinity_path(irq))
+
+
+def write_irq_affinity(irq, cpus):
+    with open(irq_affinity_path(irq), "w") as f:
+        f.write(cpus)
+
+
+# Queue of each CPU in the default IRQ affinity mode, CPUs past the map spread over the queues
+def default_queue(cpu, num_queues):
+    if cpu < len(CPU_TO_RX_QUEUE_MAP) and CPU_TO_RX_QUEUE_MAP[cpu] < num_queues:
+        return CPU_TO_RX_QUEUE_MAP[cpu]
+    return cpu % num_queues
+
+
+# IRQ affinity of every queue in the default mode (one queue per CPU, as in CPU_TO_RX_QUEUE_MAP),
+# or with all queues on the given CPUs
+def queue_irq_affinity(queues, affinity=None):
+    if affinity is not None:
+        return {str(irq): ",".join(map(str, sorted(set(affinity)))) for irq in queues.values()}
+
+    cpus = {}
+    for cpu in range(MAX_CPUS):
+        queue = default_queue(cpu, len(queues))
+        if queue in queues and str(queues[queue]) not in cpus:
+            cpus[str(queues[queue])] = str(cpu)
+    return cpus
+
+
+# CPU processing the packets of every flow of an experiment on one side, keyed by the port of the flow
+# Flows follow the ports of run_flows: the IRQ CPU of a flow is the --affinity CPU of its connection,
+# all-to-all flows stay on the CPU of their application when it processes IRQs
+def flow_irq_cpus(side, config, num_connections, cpus, affinity):
+    flows = {}
+    if config == "all-to-all":
+        for i in range(len(cpus)):
+            for j in range(len(cpus)):
+                idx = j if side == "receiver" else i
+                flows[BASE_PORT + i * MAX_CONNECTIONS + j] = cpus[idx] if cpus[idx] in affinity else affinity[idx % len(affinity)]
+    elif config == "single":
+        flows[BASE_PORT] = affinity[0]
+    else:
+        for n in range(num_connections):
+            flows[BASE_PORT + n] = affinity[n % len(affinity)]
+    return flows
+
+
+# Pins the IRQ of an RX queue to every IRQ CPU of the experiment and steers every flow to the queue of its
+# IRQ CPU with ntuple rules, so the packets of a flow are always processed where --affinity says
+# The rules and the IRQ affinities are undone at the end
+class FlowSteering:
+    def __init__(self, iface, side):
+        self.iface = iface
+        self.side = side
+        self.rules = []
+        self.original_affinity = {}
+        self.plan = {}
+
+    def ethtool(self, *argv):
+        p = subprocess.run(["ethtool"] + list(argv), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, universal_newlines=True)
+        if p.returncode != 0:
+            raise RuntimeError("ethtool {} failed: {}".format(" ".join(argv), p.stdout.strip()))
+        return p.stdout
+
+    # Rule slots not used by anyone else, up to MAX_RULE_LOC
+    def free_locs(self):
+        used = set()
+        for line in self.ethtool("-n", self.iface).splitlines():
+            match = RULE_PATTERN.match(line)
+            if match is not None:
+                used.add(int(match.group(1)))
+        return [loc for loc in range(MAX_RULE_LOC + 1) if loc not in used]
+
+    # One queue for every IRQ CPU, the one of the default mode if it is free
+    def assign_queues(self, irq_cpus, queues):
+        assigned = {}
+        for cpu in sorted(set(irq_cpus)):
+            queue = default_queue(cpu, len(queues))
+            if queue not in queues or queue in assigned.values():
+                free = [q for q in sorted(queues) if q not in assigned.values()]
+                if len(free) == 0:
+                    raise RuntimeError("{} has {} RX queues, not enough for {} IRQ CPUs".format(self.iface, len(queues), len(set(irq_cpus))))
+                queue = free[0]
+            assigned[cpu] = queue
+        return assigned
+
+    def setup(self, config, num_connections, cpus, affinity):
+        queues, _ = Topology().nic_irqs(self.iface)
+        if len(queues) == 0:
+            raise RuntimeError("Can't find the RX queue IRQs of {}".format(self.iface))
+
+        flows = flow_irq_cpus(self.side, config, num_connections, cpus, affinity)
+        cpu_queues = self.assign_queues(flows.values(), queues)
+
+        # Pin the IRQ of each queue to its CPU
+        for cpu, queue in sorted(cpu_queues.items()):
+            irq = queues[queue]
+            if irq not in self.original_affinity:
+                self.original_affinity[irq] = read_irq_affinity(irq)
+            write_irq_affinity(irq, str(cpu))
+
+        # Steer each flow to its queue, by the port of the receiver (the destination of the data on the receiver,
+        # the source of the ACKs on the sender)
+        locs = self.free_locs()
+        if len(locs) < len(flows):
+            raise RuntimeError("Only {} free ntuple rule slots on {} for {} flows".format(len(locs), self.iface, len(flows)))
+        port_field = "dst-port" if self.side == "receiver" else "src-port"
+        for (port, cpu), loc in zip(sorted(flows.items()), locs):
+            self.ethtool("-N", self.iface, "flow-type", "tcp4", port_field, str(port), "action", str(cpu_queues[cpu]), "loc", str(loc))
+            self.rules.append(loc)
+            self.plan[port] = {"cpu": cpu, "queue": cpu_queues[cpu], "loc": loc}
+
+        print("[steering] {}: {} flows steered to {} queues".format(self.iface, len(flows), len(cpu_queues)))
+        return self.plan
+
+    def remove(self):
+        for loc in self.rules:
+            try:
+                self.ethtool("-N", self.iface, "delete", str(loc))
+            except RuntimeError as e:
+                print("[steering] {}".format(e))
+        self.rules = []
+
+        for irq, cpus in sorted(self.original_affinity.items()):
+            if cpus is not None:
+                try:
+                    write_irq_affinity(irq, cpus)
+                except OSError as e:
+                    print("[steering] restoring the affinity of IRQ {} failed: {}".format(irq, e))
+        self.original_affinity = {}
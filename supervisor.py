@@ -0,0 +1,295 @@
+import json
+import os
+import signal
+import subprocess
+import tempfile
+import time
+from collectors import *
+
+
+# Seconds a child gets to exit after the graceful signal before it is killed
+TERM_GRACE = 5
+
+# A child with a known run time that exits before this fraction of it died early
+EARLY_FRACTION = 0.9
+
+# Seconds between checks for exited children
+REAP_INTERVAL = 0.1
+
+# cgroup v2 hierarchy the children get a cgroup of their own in, if it is writable
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+
+def read_file(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def write_file(path, value):
+    try:
+        with open(path, "w") as f:
+            f.write(value)
+        return True
+    except OSError:
+        return False
+
+
+# Start time of a process (clock ticks since boot, field 22 of /proc/<pid>/stat), None if it is gone
+# With the pid, it tells a process apart from a later one that reused the pid
+def start_time(pid):
+    stat = read_file("/proc/{}/stat".format(pid))
+    if stat is None:
+        return None
+    # The command name can hold spaces and parentheses, the fields after it start at the state (field 3)
+    return int(stat.rpartition(")")[2].split()[19])
+
+
+# CPU time (s) and peak memory (MB) of a cgroup, None for what the kernel doesn't have
+def cgroup_stats(path):
+    stats = {"cgroup_cpu": None, "cgroup_memory_peak": None}
+    if path is None:
+        return stats
+    cpu = read_file(os.path.join(path, "cpu.stat"))
+    if cpu is not None:
+        for line in cpu.splitlines():
+            comps = line.split()
+            if len(comps) == 2 and comps[0] == "usage_usec":
+                stats["cgroup_cpu"] = int(comps[1]) / 1e6
+    peak = read_file(os.path.join(path, "memory.peak"))
+    if peak is not None and peak.strip().isdigit():
+        stats["cgroup_memory_peak"] = int(peak) / 2 ** 20
+    return stats
+
+
+# A child of an experiment: a flow or a measurement tool, with how long it is expected to run (None: till it is stopped)
+class Child:
+    def __init__(self, proc, argv, kind, expected, cgroup):
+        self.proc = proc
+        self.argv = argv
+        self.kind = kind
+        self.expected = expected
+        self.cgroup = cgroup
+        self.started = time.time()
+        self.start_time = start_time(proc.pid)
+        self.ended = None
+        self.rusage = None
+        self.stopped = False
+        self.escalated = False
+
+    # Reap the child if it has exited, with its resource usage
+    def reap(self, block=False):
+        if self.ended is not None:
+            return True
+        try:
+            pid, status, rusage = os.wait4(self.proc.pid, 0 if block else os.WNOHANG)
+        except ChildProcessError:
+            # Reaped elsewhere, the exit status and resource usage are lost
+            pid, status, rusage = self.proc.pid, None, None
+        if pid == 0:
+            return False
+        self.ended = time.time()
+        self.rusage = rusage
+        if status is not None:
+            self.proc.returncode = os.waitstatus_to_exitcode(status)
+        return True
+
+    # Signal the process group of the child, which holds anything it started
+    def send(self, sig):
+        try:
+            os.killpg(self.proc.pid, sig)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    # A child that exits on its own before its time or with an error, or at all if it is meant to run till it is stopped
+    def early(self):
+        if self.stopped:
+            return False
+        if self.expected is None:
+            return True
+        return self.proc.returncode != 0 or self.ended - self.started < EARLY_FRACTION * self.expected
+
+    # NOTE: XML-RPC only allows ints up to 2^31, sizes are in MB and times in s (floats), the pid and exit code are small
+    def report(self):
+        report = {"kind": self.kind, "command": " ".join(self.argv), "pid": self.proc.pid, "exit_code": self.proc.returncode,
+                  "stopped": self.stopped, "escalated": self.escalated, "runtime": self.ended - self.started, "early": self.early(),
+                  "user_time": None, "system_time": None, "max_rss": None}
+        if self.rusage is not None:
+            report.update({"user_time": self.rusage.ru_utime, "system_time": self.rusage.ru_stime, "max_rss": self.rusage.ru_maxrss / 1024})
+        report.update(cgroup_stats(self.cgroup))
+        return report
+
+
+# Children of the experiments of one side, each in a process group of its own (and a cgroup when cgroup v2 is
+# writable), so that only what the tool started is ever signalled, stopped gracefully before being killed, and
+# reaped with its exit status and resource usage
+# As a collector, it reports the children of every phase and counts the flows that died early
+class Supervisor(Collector):
+    name = "processes"
+
+    def __init__(self, side, popen=subprocess.Popen, grace=TERM_GRACE, cgroup_root=CGROUP_ROOT):
+        self.side = side
+        self.popen = popen
+        self.grace = grace
+        self.cgroup_root = cgroup_root
+        self.cgroup = None
+        self.children = []
+        self.launched = {}
+        self.state_file = os.path.join(tempfile.gettempdir(), "zc_bench_{}.json".format(side))
+
+    # cgroup holding the cgroups of the children, created on the first launch (False if it can't be)
+    def cgroup_dir(self):
+        if self.cgroup is None:
+            self.cgroup = False
+            path = os.path.join(self.cgroup_root, "zc_bench-{}-{}".format(self.side, os.getpid()))
+            if os.path.exists(os.path.join(self.cgroup_root, "cgroup.controllers")):
+                try:
+                    os.makedirs(path, exist_ok=True)
+                    write_file(os.path.join(path, "cgroup.subtree_control"), "+cpu +memory")
+                    self.cgroup = path
+                except OSError:
+                    pass
+        return self.cgroup or None
+
+    # Live children, so that a run that didn't exit cleanly can have them killed by the next one
+    # Each is the leader of its process group (the pgid is its pid), kept with its start time
+    def save_state(self):
+        live = [[c.proc.pid, c.start_time] for c in self.children if c.ended is None]
+        write_file(self.state_file, json.dumps({"owner": os.getpid(), "children": live}))
+
+    def launch(self, argv, kind="tool", expected=None, **kwargs):
+        proc = self.popen(argv, start_new_session=True, **kwargs)
+
+        # The child is moved once started, taskset/numactl exec the command without forking before that
+        cgroup = None
+        if self.cgroup_dir() is not None:
+            cgroup = os.path.join(self.cgroup, str(proc.pid))
+            try:
+                os.mkdir(cgroup)
+                if not write_file(os.path.join(cgroup, "cgroup.procs"), str(proc.pid)):
+                    os.rmdir(cgroup)
+                    cgroup = None
+            except OSError:
+                cgroup = None
+
+        child = Child(proc, argv, kind, expected, cgroup)
+        self.children.append(child)
+        self.launched[proc] = child
+        self.save_state()
+        return proc
+
+    # Start and end (None while it runs) of a child launched in this run, in the clock of this host
+    def times(self, proc):
+        child = self.launched[proc]
+        return [child.started, child.ended]
+
+    def find(self, procs):
+        pids = {p.pid for p in procs}
+        return [c for c in self.children if c.proc.pid in pids]
+
+    def finish(self, child):
+        if child.early():
+            print("[supervisor] {} died early: {} (exit {}, after {:.1f} s)".format(child.kind, " ".join(child.argv), child.proc.returncode,
+                                                                                   child.ended - child.started))
+        self.save_state()
+
+    # Wait for children to exit on their own, polling all of them so that each one's exit time is known
+    def wait(self, procs):
+        children = [c for c in self.find(procs) if c.ended is None]
+        while len(children) > 0:
+            for c in children:
+                if c.reap():
+                    self.finish(c)
+            children = [c for c in children if c.ended is None]
+            if len(children) > 0:
+                time.sleep(REAP_INTERVAL)
+
+    # Stop children with a signal (SIGTERM, or the one a tool prints its results on), then kill what is left after the grace period
+    def terminate(self, procs, sig=signal.SIGTERM):
+        children = []
+        for c in self.find(procs):
+            if c.ended is not None:
+                continue
+            if c.reap():
+                self.finish(c)
+                continue
+            c.stopped = True
+            c.send(sig)
+            children.append(c)
+
+        deadline = time.time() + self.grace
+        while not all(c.reap() for c in children) and time.time() < deadline:
+            time.sleep(REAP_INTERVAL)
+
+        for c in children:
+            if c.ended is None:
+                c.escalated = True
+                if c.cgroup is None or not write_file(os.path.join(c.cgroup, "cgroup.kill"), "1"):
+                    c.send(signal.SIGKILL)
+                c.reap(block=True)
+                print("[supervisor] killed {} after {} s".format(" ".join(c.argv), self.grace))
+            self.finish(c)
+
+    # Stop every child still running and remove the cgroups, at exit
+    def terminate_all(self):
+        self.terminate([c.proc for c in self.children if c.ended is None])
+        for c in self.children:
+            self.remove_cgroup(c)
+        if self.cgroup:
+            try:
+                os.rmdir(self.cgroup)
+            except OSError:
+                pass
+            self.cgroup = None
+
+    def remove_cgroup(self, child):
+        if child.cgroup is not None:
+            try:
+                os.rmdir(child.cgroup)
+            except OSError:
+                pass
+
+    # Kill the process groups of the children left behind by a previous run of this side that didn't exit cleanly
+    # Children of a run that is still going, and processes that reused their pid, are left alone
+    # The command can't be checked instead, taskset/numactl exec the flows; a group whose leader is gone still holds
+    # its id, which isn't reused till the group is empty
+    def clear_stale(self):
+        try:
+            state = json.loads(read_file(self.state_file) or "{}")
+        except ValueError:
+            state = {}
+        owner = state.get("owner")
+        if owner is not None and owner != os.getpid() and os.path.exists("/proc/{}".format(owner)):
+            return 0
+
+        killed = 0
+        for pid, started in state.get("children", []):
+            current = start_time(pid)
+            if current is not None and current != started:
+                continue
+            try:
+                os.killpg(pid, signal.SIGKILL)
+                killed += 1
+            except (ProcessLookupError, PermissionError):
+                pass
+        if killed > 0:
+            print("[supervisor] killed {} children left behind by a previous run".format(killed))
+        self.launched = {}
+        self.save_state()
+        return killed
+
+    # Children reaped during the phase, forgotten (and their cgroups removed) once reported
+    def stop(self, phase):
+        reaped = [c for c in self.children if c.ended is not None]
+        self.children = [c for c in self.children if c.ended is None]
+        reports = []
+        for c in reaped:
+            reports.append(c.report())
+            self.remove_cgroup(c)
+        return reports
+
+    # Flows that died early over the run
+    def metrics(self, phases):
+        return {"early_exits": sum(1 for reports in phases.values() for r in reports if r["kind"] == "flow" and r["early"])}
@@ -0,0 +1,255 @@
+import collections
+import importlib
+import json
+import os
+import re
+import subprocess
+import threading
+import time
+from constants import *
+from control import *
+
+
+# Seconds between samples
+TELEMETRY_INTERVAL = 1
+
+# Number of samples kept for clients joining the stream
+TELEMETRY_HISTORY = 60
+
+# Softirqs reported, the network ones are the interesting ones
+SOFTIRQS = ["NET_RX", "NET_TX"]
+
+# Per-queue NIC counters in ethtool -S, across the usual driver namings (rx_queue_0_bytes, rx0_bytes, ...)
+NIC_QUEUE_COUNTER_PATTERN = re.compile(r"^(rx|tx)_?(queue_)?\d+_(bytes|packets|drops?)$")
+
+# Ports of the flows, the iperf/netperf servers listen on them
+FLOW_PORTS = set(range(BASE_PORT, BASE_PORT + MAX_CONNECTIONS * MAX_CONNECTIONS)) | {ADDITIONAL_BASE_PORT}
+
+# Counter of ss -i that moves with the data of a flow on each side, a socket has both and they can't be added up
+FLOW_BYTES_FIELD = {"sender": "bytes_acked", "receiver": "bytes_received"}
+
+
+# Busy and total jiffies of each CPU
+def read_cpu_times():
+    times = {}
+    with open("/proc/stat") as f:
+        for line in f:
+            comps = line.split()
+            if len(comps) < 5 or not comps[0].startswith("cpu") or comps[0] == "cpu":
+                continue
+            values = [int(v) for v in comps[1:]]
+            idle = values[3] + (values[4] if len(values) > 4 else 0)
+            times[int(comps[0][3:])] = (sum(values[:8]) - idle, sum(values[:8]))
+    return times
+
+
+# Count of each network softirq on each CPU
+def read_softirqs():
+    counts = {}
+    with open("/proc/softirqs") as f:
+        cpus = [int(c[3:]) for c in f.readline().split()]
+        for line in f:
+            comps = line.split()
+            name = comps[0].rstrip(":")
+            if name in SOFTIRQS:
+                for cpu, c in zip(cpus, comps[1:]):
+                    counts[(name, cpu)] = int(c)
+    return counts
+
+
+# Interface counters of the NIC
+def read_nic_counters(iface):
+    counters = {}
+    stats_dir = "/sys/class/net/{}/statistics".format(iface)
+    for name in ["rx_bytes", "tx_bytes", "rx_packets", "tx_packets", "rx_dropped"]:
+        path = os.path.join(stats_dir, name)
+        if os.path.exists(path):
+            with open(path) as f:
+                counters[name] = int(f.read())
+    return counters
+
+
+# Per-queue counters of the NIC, raises OSError without ethtool
+def read_nic_queue_counters(iface):
+    counters = {}
+    out = subprocess.run(["ethtool", "-S", iface], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True).stdout
+    for line in out.splitlines():
+        comps = line.split(":")
+        if len(comps) == 2 and NIC_QUEUE_COUNTER_PATTERN.match(comps[0].strip()) and comps[1].strip().isdigit():
+            counters[comps[0].strip()] = int(comps[1])
+    return counters
+
+
+# Bytes moved by the sockets of each flow (the given counter of ss -i), keyed by the port of the flow, raises OSError without ss
+def read_flow_bytes(counter):
+    flows = {}
+    out = subprocess.run(["ss", "-tinH"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True).stdout
+    port = None
+    for line in out.splitlines():
+        if not line.startswith((" ", "\t")):
+            comps = line.split()
+            ports = [int(addr.rsplit(":", 1)[1]) for addr in comps[3:5] if ":" in addr and addr.rsplit(":", 1)[1].isdigit()]
+            port = next((p for p in ports if p in FLOW_PORTS), None)
+        elif port is not None:
+            for field in line.split():
+                name, _, value = field.partition(":")
+                if name == counter:
+                    flows[port] = flows.get(port, 0) + int(value)
+    return flows
+
+
+# Rates of the counters between two readings, counters that went backwards (e.g. a new socket) are skipped
+def rates(before, after, dt):
+    return {k: (v - before[k]) / dt for k, v in after.items() if k in before and v >= before[k]}
+
+
+# Samples the counters every second, publishing them over HTTP (OpenMetrics and JSON lines) and to a file
+class Telemetry:
+    def __init__(self, side, cpus, iface=None, port=None, log_file=None, pin_cpus=None):
+        self.side = side
+        self.cpus = sorted(set(cpus))
+        self.iface = iface
+        self.port = port
+        self.log_file = log_file
+        self.pin_cpus = pin_cpus
+        self.history = collections.deque(maxlen=TELEMETRY_HISTORY)
+        self.updated = threading.Condition()
+        self.stopped = threading.Event()
+        self.threads = []
+        self.server = None
+        self.unavailable = set()
+
+        # Fit of the clock of this host against the sender, samples are also stamped in the sender clock once it is known
+        self.clock = LOCAL_CLOCK if side == "sender" else None
+
+    def pin(self):
+        if self.pin_cpus is not None:
+            os.sched_setaffinity(0, self.pin_cpus)
+
+    # Counters of a tool that may be missing, reported once and left out of the samples
+    def read_tool(self, tool, read, *args):
+        try:
+            return read(*args)
+        except OSError as e:
+            if tool not in self.unavailable:
+                self.unavailable.add(tool)
+                print("[telemetry] {} unavailable, sampling without it: {}".format(tool, e))
+            return {}
+
+    def read(self):
+        nic = {}
+        if self.iface is not None:
+            nic = read_nic_counters(self.iface)
+            nic.update(self.read_tool("ethtool", read_nic_queue_counters, self.iface))
+        return {
+            "time": time.time(),
+            "cpus": read_cpu_times(),
+            "softirqs": read_softirqs(),
+            "nic": nic,
+            "flows": self.read_tool("ss", read_flow_bytes, FLOW_BYTES_FIELD[self.side]),
+        }
+
+    def sample(self, before, after):
+        dt = after["time"] - before["time"]
+        cpu_util = {}
+        for cpu in self.cpus:
+            if cpu in before["cpus"] and cpu in after["cpus"]:
+                busy = after["cpus"][cpu][0] - before["cpus"][cpu][0]
+                total = after["cpus"][cpu][1] - before["cpus"][cpu][1]
+                cpu_util[cpu] = 0 if total == 0 else busy * 100 / total
+
+        softirqs = {name: {} for name in SOFTIRQS}
+        for (name, cpu), rate in rates(before["softirqs"], after["softirqs"], dt).items():
+            if cpu in self.cpus:
+                softirqs[name][cpu] = rate
+
+        flows = {port: rate * 8 / 1e9 for port, rate in rates(before["flows"], after["flows"], dt).items()}
+        clock = self.clock
+        return {
+            "time": after["time"],
+            "common_time": None if clock is None else remote_to_local(clock, after["time"]),
+            "side": self.side,
+            "throughput": sum(flows.values()),
+            "flows": flows,
+            "cpu_util": cpu_util,
+            "softirqs": softirqs,
+            "nic": rates(before["nic"], after["nic"], dt),
+        }
+
+    def run(self):
+        self.pin()
+        log = None if self.log_file is None else open(self.log_file, "a")
+        before = self.read()
+        while not self.stopped.wait(TELEMETRY_INTERVAL):
+            after = self.read()
+            sample = self.sample(before, after)
+            before = after
+
+            with self.updated:
+                self.history.append(sample)
+                self.updated.notify_all()
+            if log is not None:
+                log.write(json.dumps(sample) + "\n")
+                log.flush()
+        if log is not None:
+            log.close()
+
+    def latest(self):
+        with self.updated:
+            return self.history[-1] if len(self.history) > 0 else None
+
+    # Wait for the sample after the given one (None for the latest)
+    def next_sample(self, last, timeout=2 * TELEMETRY_INTERVAL):
+        with self.updated:
+            self.updated.wait_for(lambda: self.stopped.is_set() or (len(self.history) > 0 and self.history[-1] is not last), timeout)
+            return self.history[-1] if len(self.history) > 0 and self.history[-1] is not last else None
+
+    def serve(self):
+        self.pin()
+        self.server.serve_forever()
+
+    def start(self):
+        self.threads.append(threading.Thread(target=self.run, daemon=True))
+        if self.port is not None:
+            # The HTTP server is only loaded when live metrics are served
+            self.server = importlib.import_module("telemetry_server").http_server(self.port, self)
+            self.threads.append(threading.Thread(target=self.serve, daemon=True))
+        for t in self.threads:
+            t.start()
+        return self
+
+    # Safe to call more than once, e.g. when the run fails after stopping it
+    def stop(self):
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        with self.updated:
+            self.updated.notify_all()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        for t in self.threads:
+            t.join()
+
+
+def openmetrics(sample):
+    lines = []
+
+    def family(name, typ, help, values):
+        lines.append("# TYPE {} {}".format(name, typ))
+        lines.append("# HELP {} {}".format(name, help))
+        for labels, value in values:
+            label_str = ",".join('{}="{}"'.format(k, v) for k, v in [("side", sample["side"])] + labels)
+            lines.append("{}{{{}}} {}".format(name, label_str, value))
+
+    family("zcbench_throughput_gbps", "gauge", "Throughput of all flows over the last second.", [([], sample["throughput"])])
+    family("zcbench_flow_throughput_gbps", "gauge", "Throughput of each flow (by port) over the last second.",
+           [([("port", port)], t) for port, t in sorted(sample["flows"].items())])
+    family("zcbench_cpu_utilisation_percent", "gauge", "Utilisation of each CPU of the experiment over the last second.",
+           [([("cpu", cpu)], u) for cpu, u in sorted(sample["cpu_util"].items())])
+    family("zcbench_softirq_rate", "gauge", "Network softirqs per second on each CPU of the experiment.",
+           [([("softirq", name), ("cpu", cpu)], r) for name, per_cpu in sorted(sample["softirqs"].items()) for cpu, r in sorted(per_cpu.items())])
+    family("zcbench_nic_counter_rate", "gauge", "Rate of the interface and per-queue NIC counters.",
+           [([("counter", name)], r) for name, r in sorted(sample["nic"].items())])
+    lines.append("# EOF")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,49 @@
+import http.server
+import json
+from telemetry import openmetrics
+
+
+# GET /metrics: latest sample in the OpenMetrics text format
+# GET /stream: JSON lines, one per sample, starting with the recent history
+class TelemetryHandler(http.server.BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        telemetry = self.server.telemetry
+        if self.path == "/metrics":
+            sample = telemetry.latest()
+            body = ("# EOF\n" if sample is None else openmetrics(sample)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/openmetrics-text; version=1.0.0; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == "/stream":
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            with telemetry.updated:
+                history = list(telemetry.history)
+            try:
+                for sample in history:
+                    self.wfile.write((json.dumps(sample) + "\n").encode())
+                last = history[-1] if len(history) > 0 else None
+                while not telemetry.stopped.is_set():
+                    sample = telemetry.next_sample(last)
+                    if sample is not None:
+                        self.wfile.write((json.dumps(sample) + "\n").encode())
+                        self.wfile.flush()
+                        last = sample
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+        else:
+            self.send_error(404)
+
+
+# Server of the live metrics of a Telemetry, kept out of telemetry.py so the tools only load it when serving them
+def http_server(port, telemetry):
+    server = http.server.ThreadingHTTPServer(("0.0.0.0", port), TelemetryHandler)
+    server.daemon_threads = True
+    server.telemetry = telemetry
+    return server
@@ -0,0 +1,6 @@
+import os
+import sys
+
+
+# The tools are flat modules at the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
@@ -0,0 +1,69 @@
+import os
+import pytest
+from energy import *
+
+
+def write_zone(root, zone, name, energy, max_range=1000):
+    path = os.path.join(str(root), "sys", "class", "powercap", zone)
+    os.makedirs(path, exist_ok=True)
+    for f, value in [("name", name), ("energy_uj", energy), ("max_energy_range_uj", max_range)]:
+        with open(os.path.join(path, f), "w") as out:
+            out.write("{}\n".format(value))
+
+
+def set_energy(root, zone, energy):
+    with open(os.path.join(str(root), "sys", "class", "powercap", zone, "energy_uj"), "w") as f:
+        f.write("{}\n".format(energy))
+
+
+# 2 packages with their core and DRAM subdomains, and the MMIO zone duplicating package 0
+@pytest.fixture
+def root(tmp_path):
+    write_zone(tmp_path, "intel-rapl:0", "package-0", 100)
+    write_zone(tmp_path, "intel-rapl:0:0", "core", 10)
+    write_zone(tmp_path, "intel-rapl:0:1", "dram", 20)
+    write_zone(tmp_path, "intel-rapl:1", "package-1", 200)
+    write_zone(tmp_path, "intel-rapl:1:0", "dram", 30)
+    write_zone(tmp_path, "intel-rapl-mmio:0", "package-0", 100)
+    return tmp_path
+
+
+def test_rapl_domains(root):
+    domains = rapl_domains(str(root))
+    assert sorted(domains) == ["package-0", "package-0/dram", "package-1", "package-1/dram"]
+    assert domains["package-0/dram"]["path"] == os.path.join(str(root), "sys", "class", "powercap", "intel-rapl:0:1", "energy_uj")
+    assert domains["package-1"]["max_range"] == 1000
+    assert read_energy(domains) == {"package-0": 100, "package-0/dram": 20, "package-1": 200, "package-1/dram": 30}
+
+
+def test_rapl_domains_unreadable(root):
+    os.remove(os.path.join(str(root), "sys", "class", "powercap", "intel-rapl:1", "energy_uj"))
+    assert sorted(rapl_domains(str(root))) == ["package-0", "package-0/dram", "package-1/dram"]
+    assert rapl_domains(str(root / "missing")) == {}
+
+
+def test_energy_delta():
+    assert energy_delta(100, 250, 1000) == 150
+    assert energy_delta(900, 100, 1000) == 200
+    assert energy_delta(100, 100, 1000) == 0
+
+
+def test_energy_meter_wraparound(root):
+    meter = EnergyMeter(str(root), interval=3600).start()
+    set_energy(root, "intel-rapl:0", 900)
+    set_energy(root, "intel-rapl:1", 300)
+    meter.sample()
+
+    # package-0 wraps around between the readings
+    set_energy(root, "intel-rapl:0", 50)
+    set_energy(root, "intel-rapl:0:1", 70)
+    meter.sample()
+    result = meter.stop()
+    assert meter.energy == {"package-0": 950, "package-0/dram": 50, "package-1": 100, "package-1/dram": 0}
+    assert result["domains"]["package-0"] == pytest.approx(950e-6)
+    assert result["power"] == pytest.approx(1100e-6 / result["elapsed"])
+
+
+def test_energy_efficiency():
+    assert energy_efficiency(100, 0) == {"watts_per_gbps": None, "joules_per_gb": None}
+    assert energy_efficiency(100, 50) == {"watts_per_gbps": 2, "joules_per_gb": 16}
@@ -0,0 +1,82 @@
+import math
+import random
+import xmlrpc.client
+import pytest
+from histogram import *
+
+
+def exact_percentile(values, q):
+    values = sorted(values)
+    return values[max(1, math.ceil(q / 100 * len(values))) - 1]
+
+
+@pytest.fixture
+def values():
+    rng = random.Random(1)
+    return [int(rng.lognormvariate(10, 2)) for _ in range(100000)]
+
+
+def test_percentiles(values):
+    hist = LogHistogram(8)
+    for v in values:
+        hist.record(v)
+
+    # Values past 2^bits are off by at most the relative error of their bucket
+    error = 2 ** (1 - hist.bits)
+    for q in [50, 99, 99.9]:
+        exact = exact_percentile(values, q)
+        assert hist.percentile(q) == pytest.approx(exact, rel=error)
+    assert hist.percentile(0) == min(values)
+    assert hist.percentile(100) == max(values)
+    assert hist.mean() == pytest.approx(sum(values) / len(values))
+
+
+def test_exact_below_sub_buckets():
+    hist = LogHistogram(8)
+    for v in range(256):
+        hist.record(v)
+    assert hist.percentile(50) == 127
+    assert [lo for lo, hi, c in hist.items()] == list(range(256))
+
+
+def test_merge(values):
+    half = len(values) // 2
+    a, b, whole = LogHistogram(8), LogHistogram(8), LogHistogram(8)
+    for v in values[:half]:
+        a.record(v)
+    for v in values[half:]:
+        b.record(v)
+    for v in values:
+        whole.record(v)
+
+    a.merge(b)
+    assert a.buckets == whole.buckets
+    assert (a.count, a.min, a.max) == (whole.count, whole.min, whole.max)
+    assert a.total == pytest.approx(whole.total)
+    assert a.percentiles([50, 99]) == whole.percentiles([50, 99])
+
+    with pytest.raises(ValueError):
+        a.merge(LogHistogram(4))
+    assert LogHistogram(8).merge(LogHistogram(8)).count == 0
+
+
+def test_round_trip(values):
+    hist = LogHistogram(8)
+    for v in values[:1000]:
+        hist.record(v)
+    loaded = histogram_from_dict(hist.to_dict())
+    assert loaded.buckets == hist.buckets
+    assert (loaded.count, loaded.total, loaded.min, loaded.max) == (hist.count, hist.total, hist.min, hist.max)
+    assert loaded.percentile(99) == hist.percentile(99)
+
+
+# Empty histograms go over XML-RPC without allow_none, and come back empty
+def test_empty():
+    for hist in [LogHistogram(8), make_bucket_histogram("linear", 4, 8), make_bucket_histogram("log2", 4, 8)]:
+        d = hist.to_dict()
+        assert None not in d.values()
+        xmlrpc.client.dumps((d,))
+        loaded = histogram_from_dict(d)
+        assert (loaded.count, loaded.min, loaded.max) == (0, None, None)
+        assert loaded.percentile(99) == 0
+        assert loaded.mean() == 0
@@ -0,0 +1,37 @@
+import ast
+import os
+from scenario import *
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+# Modules of the tool imported by a module, and by the modules it imports
+def local_imports(module, seen=None):
+    seen = set() if seen is None else seen
+    path = os.path.join(ROOT, "{}.py".format(module))
+    if module in seen or not os.path.exists(path):
+        return seen
+    seen.add(module)
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.level == 0 and node.module is not None:
+            local_imports(node.module, seen)
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                local_imports(alias.name, seen)
+    return seen
+
+
+# A module that changes what is measured has to change the key of the points, or their old runs are reused
+def test_tool_files_cover_imports():
+    modules = local_imports("run_experiment_sender") | local_imports("run_experiment_receiver")
+    missing = sorted("{}.py".format(m) for m in modules if "{}.py".format(m) not in TOOL_FILES)
+    assert missing == []
+
+
+def test_tool_files_exist():
+    for name in TOOL_FILES:
+        assert os.path.exists(os.path.join(ROOT, name)), name
+
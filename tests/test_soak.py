@@ -0,0 +1,130 @@
+import os
+import subprocess
+import sys
+import time
+import pytest
+from soak import *
+
+
+def interval(second, gbps, suffix=""):
+    return "[  5]   {:.2f}-{:.2f}   sec  1.00 GBytes  {:.2f} Gbits/sec{}\n".format(second, second + 1, gbps, suffix)
+
+
+# Monitor of one CPU with a fixed utilisation, whose clock is set by the test through the elapsed time
+class Monitor(SoakMonitor):
+    def __init__(self, window=10, util=50.):
+        super().__init__([0], window, checkpoint_interval=3600)
+        self.util = util
+        self.start()
+
+    def cpu_util(self):
+        return self.util
+
+    def at(self, elapsed):
+        self.start_time = time.time() - elapsed
+        self.last_checkpoint = time.time()
+
+
+def test_rotating_log(tmp_path):
+    path = str(tmp_path / "soak.log")
+    log = RotatingLog(path, max_bytes=10, backups=2)
+    for i in range(5):
+        log.write("{}\n".format(i) * 5)
+    log.close()
+
+    assert sorted(os.listdir(str(tmp_path))) == ["soak.log", "soak.log.1", "soak.log.2"]
+    with open(path) as f:
+        assert f.read() == "4\n" * 5
+    with open(path + ".2") as f:
+        assert f.read() == "2\n" * 5
+
+
+def test_windows_close_after_grace():
+    monitor = Monitor(window=10)
+    monitor.on_line(0, interval(0, 10))
+    monitor.on_line(1, interval(0, 5))
+    monitor.on_line(0, interval(9, 20))
+    monitor.on_line(0, interval(10, 30))
+    monitor.on_line(0, "[  5]   0.00-20.00  sec  1.00 GBytes  25.00 Gbits/sec  sender\n")
+
+    monitor.at(10 + SOAK_WINDOW_GRACE - 0.5)
+    monitor.tick()
+    assert len(monitor.windows) == 0
+
+    monitor.at(10 + SOAK_WINDOW_GRACE + 0.5)
+    monitor.tick()
+    assert [w.idx for w in monitor.windows] == [0]
+    w = monitor.windows[0]
+    assert w.per_second == {0: 15, 9: 20}
+    assert w.throughput() == pytest.approx(17.5)
+    assert w.min_throughput() == 15
+    assert w.cpu_util == 50
+    assert list(monitor.open_windows) == [1]
+
+    monitor.tick(final=True)
+    assert [w.idx for w in monitor.windows] == [0, 1]
+    assert monitor.mean_throughput() == pytest.approx((17.5 + 30) / 2)
+
+
+# Each window gets the utilisation of the ticks over its own span, weighted by the overlap
+def test_window_cpu_util():
+    monitor = Monitor(window=10)
+    monitor.on_line(0, interval(0, 10))
+    monitor.on_line(0, interval(10, 10))
+
+    monitor.util = 20.
+    monitor.at(5)
+    monitor.tick()
+    monitor.util = 80.
+    monitor.at(15)
+    monitor.tick()
+    monitor.util = 40.
+    monitor.at(25)
+    monitor.tick()
+
+    # Window 0 is [0, 5) at 20 and [5, 10) at 80, window 1 is [10, 15) at 80 and [15, 20) at 40
+    assert [w.cpu_util for w in monitor.windows] == [pytest.approx(50), pytest.approx(60)]
+    assert all(end > 20 for start, end, util in monitor.cpu_samples)
+
+
+def test_throughput_trend():
+    windows = []
+    for idx in range(60):
+        w = SoakWindow(idx, 60, 0)
+        w.add(idx * 60, 100 * (1 - 0.1 * (idx + 0.5) / 60))
+        windows.append(w)
+
+    # 10 Gbps lost per hour from about 95 Gbps on average
+    trend, r2 = throughput_trend(windows)
+    assert trend == pytest.approx(-10 / 95 * 100, rel=1e-3)
+    assert r2 == pytest.approx(1)
+    assert throughput_trend(windows[:1]) == (0, 0)
+
+
+def test_degrading():
+    monitor = Monitor(window=60)
+    for idx in range(SOAK_TREND_MIN_WINDOWS):
+        monitor.on_line(0, interval(idx * 60, 100 - idx * 10))
+    monitor.at(SOAK_TREND_MIN_WINDOWS * 60 - 60 + SOAK_WINDOW_GRACE)
+    monitor.tick()
+    assert len(monitor.windows) == SOAK_TREND_MIN_WINDOWS - 1
+    assert not monitor.degrading()
+
+    monitor.tick(final=True)
+    assert len(monitor.windows) == SOAK_TREND_MIN_WINDOWS
+    assert monitor.degrading()
+
+
+def test_drain_flows(tmp_path):
+    script = "import sys, time\nsys.stdout.write('a\\nb'); sys.stdout.flush(); time.sleep(0.2); sys.stdout.write('c\\nd')"
+    procs = [subprocess.Popen([sys.executable, "-c", script], stdout=subprocess.PIPE, universal_newlines=True) for _ in range(2)]
+    log = RotatingLog(str(tmp_path / "soak.log"))
+    lines = []
+    drain_flows(procs, log, lambda flow, line: lines.append((flow, line)))
+    log.close()
+    for p in procs:
+        p.wait()
+
+    assert sorted(lines) == sorted([(i, line) for i in range(2) for line in ["a\n", "bc\n", "d"]])
+    with open(str(tmp_path / "soak.log")) as f:
+        assert sorted(f.read().splitlines()) == sorted("{}: {}".format(i, line) for i in range(2) for line in ["a", "bc", "d"])
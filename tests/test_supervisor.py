@@ -0,0 +1,123 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+import pytest
+from supervisor import *
+
+
+def alive(pid):
+    stat = read_file("/proc/{}/stat".format(pid))
+    return stat is not None and stat.rpartition(")")[2].split()[0] != "Z"
+
+
+def launch_stale(tmp_path, argv):
+    supervisor = Supervisor("test", cgroup_root=str(tmp_path))
+    supervisor.state_file = str(tmp_path / "state.json")
+    proc = supervisor.launch(argv, stdout=subprocess.DEVNULL)
+    return supervisor, proc
+
+
+def test_start_time():
+    assert start_time(os.getpid()) == start_time(os.getpid())
+    assert start_time(2 ** 22 + 1) is None
+
+
+# The flows are started through taskset, which execs the command: the left behind child runs sleep, not taskset
+def test_clear_stale_exec(tmp_path):
+    _, proc = launch_stale(tmp_path, ["taskset", "-c", str(min(os.sched_getaffinity(0))), "sleep", "30"])
+    time.sleep(0.2)
+
+    supervisor = Supervisor("test", cgroup_root=str(tmp_path))
+    supervisor.state_file = str(tmp_path / "state.json")
+    assert supervisor.clear_stale() == 1
+    proc.wait(5)
+    assert not alive(proc.pid)
+
+
+# A process that reused the pid of a child is left alone
+def test_clear_stale_reused_pid(tmp_path):
+    stale, proc = launch_stale(tmp_path, ["sleep", "30"])
+    stale.children[0].start_time -= 1
+    stale.save_state()
+
+    supervisor = Supervisor("test", cgroup_root=str(tmp_path))
+    supervisor.state_file = str(tmp_path / "state.json")
+    assert supervisor.clear_stale() == 0
+    assert alive(proc.pid)
+    stale.terminate_all()
+    assert proc.returncode is not None
+
+
+def supervisor_in(tmp_path, grace=TERM_GRACE):
+    supervisor = Supervisor("test", grace=grace, cgroup_root=str(tmp_path))
+    supervisor.state_file = str(tmp_path / "state.json")
+    return supervisor
+
+
+# A child that ignores SIGTERM is killed once the grace period is over, and reaped
+def test_terminate_escalates(tmp_path):
+    supervisor = supervisor_in(tmp_path, grace=0.5)
+    script = "import signal, time\nsignal.signal(signal.SIGTERM, signal.SIG_IGN)\nprint('ready', flush=True)\ntime.sleep(30)"
+    proc = supervisor.launch([sys.executable, "-c", script], stdout=subprocess.PIPE, universal_newlines=True)
+    assert proc.stdout.readline() == "ready\n"
+
+    started = time.time()
+    supervisor.terminate([proc])
+    assert 0.5 <= time.time() - started < 5
+    child = supervisor.children[0]
+    assert child.stopped and child.escalated
+    assert proc.returncode == -signal.SIGKILL
+    assert not os.path.exists("/proc/{}".format(proc.pid))
+    with pytest.raises(ChildProcessError):
+        os.waitpid(proc.pid, os.WNOHANG)
+
+    report = supervisor.stop("phase")[0]
+    assert report["escalated"] and report["stopped"] and not report["early"]
+    proc.stdout.close()
+
+
+# A child that exits on SIGTERM isn't escalated
+def test_terminate_graceful(tmp_path):
+    supervisor = supervisor_in(tmp_path)
+    proc = supervisor.launch(["sleep", "30"])
+    supervisor.terminate([proc])
+    assert proc.returncode == -signal.SIGTERM
+    assert not supervisor.children[0].escalated
+
+
+def test_early_exits(tmp_path):
+    supervisor = supervisor_in(tmp_path)
+    early = supervisor.launch(["sh", "-c", "exit 0"], "flow", 10)
+    failed = supervisor.launch(["sh", "-c", "sleep 0.2; exit 1"], "flow", 0.1)
+    done = supervisor.launch(["sh", "-c", "sleep 0.2"], "flow", 0.1)
+    stopped = supervisor.launch(["sleep", "30"], "flow", None)
+    tool = supervisor.launch(["sh", "-c", "exit 0"], "tool", 10)
+    supervisor.wait([early, failed, done, tool])
+    supervisor.terminate([stopped])
+
+    reports = supervisor.stop("phase")
+    assert {r["pid"]: r["early"] for r in reports} == {early.pid: True, failed.pid: True, done.pid: False, stopped.pid: False, tool.pid: True}
+    # Only flows count
+    assert supervisor.metrics({"phase": reports}) == {"early_exits": 2}
+    assert supervisor.children == []
+
+
+# Every child is reported with its exit code and resource usage
+def test_report(tmp_path):
+    supervisor = supervisor_in(tmp_path)
+    busy = supervisor.launch([sys.executable, "-c", "import sys\nx = bytearray(32 * 2 ** 20)\nsum(range(10 ** 6))\nsys.exit(3)"], "flow", 0)
+    sleeper = supervisor.launch(["sleep", "30"])
+    supervisor.wait([busy])
+    supervisor.terminate([sleeper])
+
+    reports = {r["pid"]: r for r in supervisor.stop("phase")}
+    report = reports[busy.pid]
+    assert report["exit_code"] == 3
+    assert report["command"].endswith("sys.exit(3)")
+    assert report["user_time"] + report["system_time"] > 0
+    assert report["max_rss"] >= 32
+    assert report["runtime"] > 0
+    assert reports[sleeper.pid]["exit_code"] == -signal.SIGTERM
+    assert reports[sleeper.pid]["max_rss"] is not None
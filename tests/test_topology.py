@@ -0,0 +1,106 @@
+import os
+import pytest
+from topology import *
+
+
+def write(root, path, value):
+    path = os.path.join(str(root), path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(value)
+
+
+# 2 nodes of 2 cores with 2 threads each: cores (0, 4) (1, 5) on node 0, (2, 6) (3, 7) on node 1
+# eth0 is on node 1 with 4 queue IRQs (40-43) and an async IRQ (44)
+@pytest.fixture
+def root(tmp_path):
+    write(tmp_path, "sys/devices/system/cpu/online", "0-7\n")
+    for cpu in range(8):
+        topo = "sys/devices/system/cpu/cpu{}/topology/".format(cpu)
+        write(tmp_path, topo + "physical_package_id", "{}\n".format(cpu % 4 // 2))
+        write(tmp_path, topo + "core_id", "{}\n".format(cpu % 4))
+        write(tmp_path, topo + "thread_siblings_list", "{},{}\n".format(cpu % 4, cpu % 4 + 4))
+    write(tmp_path, "sys/devices/system/node/node0/cpulist", "0-1,4-5\n")
+    write(tmp_path, "sys/devices/system/node/node1/cpulist", "2-3,6-7\n")
+
+    write(tmp_path, "sys/class/net/eth0/device/numa_node", "1\n")
+    for irq in range(40, 45):
+        write(tmp_path, "sys/class/net/eth0/device/msi_irqs/{}".format(irq), "msix\n")
+    interrupts = ["           CPU0       CPU1", "  0:         10          0   IO-APIC    2-edge      timer"]
+    interrupts += [" {}:          0          0   PCI-MSI  mlx5_comp{}@pci:0000:81:00.0".format(40 + q, q) for q in range(4)]
+    interrupts += [" 44:          0          0   PCI-MSI  mlx5_async@pci:0000:81:00.0"]
+    write(tmp_path, "proc/interrupts", "\n".join(interrupts) + "\n")
+    return str(tmp_path)
+
+
+def test_cpu_lists():
+    assert parse_cpu_list("0-3,8,10-11\n") == [0, 1, 2, 3, 8, 10, 11]
+    assert parse_cpu_list("") == []
+    assert format_cpu_list([8, 0, 1, 2, 3, 11, 10]) == "0-3,8,10-11"
+    assert format_cpu_list([5]) == "5"
+
+
+def test_discover(root):
+    topology = Topology(root)
+    assert topology.online_cpus() == list(range(8))
+    assert topology.nodes == {0: [0, 1, 4, 5], 1: [2, 3, 6, 7]}
+    assert topology.cpus[6]["node"] == 1
+    assert topology.cpus[6]["core"] == topology.cpus[2]["core"]
+    assert topology.primary_threads() == [0, 1, 2, 3]
+    assert topology.siblings(1) == [5]
+
+
+def test_discover_without_numa(tmp_path):
+    write(tmp_path, "sys/devices/system/cpu/online", "0-1\n")
+    topology = Topology(str(tmp_path))
+    assert topology.nodes == {0: [0, 1]}
+    assert topology.primary_threads() == [0, 1]
+
+
+def test_nic(root):
+    topology = Topology(root)
+    assert topology.nic_node("eth0") == 1
+    assert topology.nic_node("eth1") is None
+    assert topology.nic_irqs("eth0") == ({0: 40, 1: 41, 2: 42, 3: 43}, [44])
+    assert topology.preferred_cpus(1) == [2, 3, 0, 1, 6, 7, 4, 5]
+
+
+def test_plan_single(root):
+    plan = plan_placement(Topology(root), "receiver", "incast", 4, "eth0")
+    assert plan["cpus"] == [2]
+    assert plan["affinity"] == [2]
+    assert plan["irqs"] == {40: 2, 41: 2, 42: 2, 43: 2}
+    assert plan["node"] == 1
+
+
+def test_plan_one_to_one(root):
+    plan = plan_placement(Topology(root), "sender", "one-to-one", 2, "eth0")
+    assert plan["cpus"] == [2, 0]
+    assert plan["affinity"] == [3, 1]
+    assert plan["irqs"] == {40: 3, 41: 1, 42: 3, 43: 1}
+
+
+def test_plan_all_to_all(root):
+    plan = plan_placement(Topology(root), "receiver", "all-to-all", 2, "eth0")
+    assert plan["cpus"] == [2, 3]
+    assert plan["affinity"] == [2, 3, 6, 7]
+    assert plan["irqs"] == {40: 2, 41: 3, 42: 6, 43: 7}
+
+
+def test_plan_arfs(root):
+    plan = plan_placement(Topology(root), "receiver", "one-to-one", 2, "eth0", arfs=True)
+    assert plan["affinity"] == []
+    assert plan["irqs"] == {}
+
+
+def test_plan_limits(root):
+    topology = Topology(root)
+    with pytest.raises(ValueError):
+        plan_placement(topology, "receiver", "one-to-one", 5, "eth0")
+    with pytest.raises(ValueError):
+        plan_placement(topology, "receiver", "one-to-one", 5)
+
+    # Without the NIC, any number of IRQ CPUs the CPUs allow
+    plan = plan_placement(topology, "receiver", "one-to-one", 4)
+    assert len(set(plan["cpus"] + plan["affinity"])) == 8
+    assert plan["irqs"] == {}
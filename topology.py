@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+
+import argparse
+import glob
+import os
+import re
+
+
+# IRQ names of the NIC queues across the usual driver namings (mlx5_comp3@pci:..., eth0-TxRx-3, ice-eth0-TxRx-3, eth0-rx-3)
+IRQ_QUEUE_PATTERN = re.compile(r"(?:comp|TxRx-|rx-|tx-|-)(\d+)(?:@.*)?$")
+
+# Configurations using a single CPU on each side, the application and the IRQs share it
+SINGLE_CPU_CONFIGS = {"sender": ["single", "outcast"], "receiver": ["single", "incast"]}
+
+
+# CPU lists as in sysfs, e.g. 0-3,8-11
+def parse_cpu_list(s):
+    cpus = []
+    for part in s.strip().split(","):
+        if part == "":
+            continue
+        if "-" in part:
+            start, end = part.split("-")
+            cpus += list(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+# CPU lists as in sysfs from a list of CPUs, e.g. [0, 1, 2, 3, 8] -> 0-3,8
+def format_cpu_list(cpus):
+    ranges = []
+    for cpu in sorted(set(cpus)):
+        if len(ranges) > 0 and ranges[-1][1] == cpu - 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(str(start) if start == end else "{}-{}".format(start, end) for start, end in ranges)
+
+
+def read_value(path, default=None):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return default
+
+
+# CPUs, cores and NUMA nodes of the machine, and the NICs' locality and queue IRQs
+# All paths are relative to root, so the discovery works on a copy of sysfs/procfs
+class Topology:
+    def __init__(self, root="/"):
+        self.root = root
+        self.cpus = {}
+        self.nodes = {}
+        self.discover()
+
+    def path(self, *comps):
+        return os.path.join(self.root, *comps)
+
+    def discover(self):
+        cpu_dir = self.path("sys", "devices", "system", "cpu")
+        online = read_value(os.path.join(cpu_dir, "online"))
+        if online is None:
+            online = ",".join(os.path.basename(p)[3:] for p in glob.glob(os.path.join(cpu_dir, "cpu[0-9]*")))
+
+        for cpu in parse_cpu_list(online):
+            topo_dir = os.path.join(cpu_dir, "cpu{}".format(cpu), "topology")
+            package = int(read_value(os.path.join(topo_dir, "physical_package_id"), 0))
+            core = int(read_value(os.path.join(topo_dir, "core_id"), cpu))
+            siblings = read_value(os.path.join(topo_dir, "thread_siblings_list"))
+            self.cpus[cpu] = {
+                "package": package,
+                "core": (package, core),
+                "siblings": [cpu] if siblings is None else parse_cpu_list(siblings),
+                "node": 0,
+            }
+
+        # Machines without NUMA have no node directories, everything is on node 0
+        for node_dir in glob.glob(self.path("sys", "devices", "system", "node", "node[0-9]*")):
+            node = int(os.path.basename(node_dir)[4:])
+            cpus = [c for c in parse_cpu_list(read_value(os.path.join(node_dir, "cpulist"), "")) if c in self.cpus]
+            self.nodes[node] = cpus
+            for cpu in cpus:
+                self.cpus[cpu]["node"] = node
+        if len(self.nodes) == 0:
+            self.nodes[0] = sorted(self.cpus)
+
+    def online_cpus(self):
+        return sorted(self.cpus)
+
+    # One CPU per physical core (the first thread), in order
+    def primary_threads(self, cpus=None):
+        cpus = self.online_cpus() if cpus is None else cpus
+        return [c for c in cpus if min(s for s in self.cpus[c]["siblings"] if s in self.cpus) == c]
+
+    def siblings(self, cpu):
+        return [s for s in self.cpus[cpu]["siblings"] if s != cpu and s in self.cpus]
+
+    # NUMA node the NIC is attached to, None if unknown
+    def nic_node(self, iface):
+        node = read_value(self.path("sys", "class", "net", iface, "device", "numa_node"))
+        return None if node is None or int(node) < 0 else int(node)
+
+    # IRQs of the NIC: the MSI vectors of the device, named after their queue in /proc/interrupts
+    # Returns the IRQ of each queue, and the IRQs of the device not tied to a queue
+    def nic_irqs(self, iface):
+        msi_irqs = set(int(os.path.basename(p)) for p in glob.glob(self.path("sys", "class", "net", iface, "device", "msi_irqs", "*")))
+        queues, others = {}, []
+        try:
+            f = open(self.path("proc", "interrupts"))
+        except OSError:
+            return queues, others
+
+        with f:
+            f.readline()
+            for line in f:
+                comps = line.split()
+                if len(comps) == 0 or not comps[0].rstrip(":").isdigit():
+                    continue
+                irq = int(comps[0].rstrip(":"))
+                name = comps[-1]
+                if irq not in msi_irqs and iface not in name:
+                    continue
+
+                match = IRQ_QUEUE_PATTERN.search(name)
+                if match is not None:
+                    queues[int(match.group(1))] = irq
+                else:
+                    others.append(irq)
+        return queues, others
+
+    # CPUs ordered by preference for an experiment close to the NIC: whole cores of the NIC node first,
+    # then whole cores of the other nodes, and the SMT siblings last
+    def preferred_cpus(self, node=None):
+        nodes = sorted(self.nodes, key=lambda n: (n != node, n))
+        primaries = [c for n in nodes for c in self.primary_threads(self.nodes[n])]
+        return primaries + [c for n in nodes for c in self.nodes[n] if c not in primaries]
+
+
+# Plan the application CPUs and the IRQ CPUs of a configuration, close to the NIC:
+# single-CPU configurations keep the IRQs on the application CPU, as with the defaults,
+# the others give every connection an application core and an IRQ core of its own, avoiding shared physical cores
+# The IRQ CPUs are limited by the queue IRQs of the NIC (when found), which are spread over them
+def plan_placement(topology, side, config, num_connections, iface=None, arfs=False):
+    nic_node = None if iface is None else topology.nic_node(iface)
+    queues = {} if iface is None else topology.nic_irqs(iface)[0]
+    preferred = topology.preferred_cpus(nic_node)
+    used_cpus, used_cores = set(), set()
+
+    # A CPU of a physical core not used yet, or a free SMT sibling once the cores run out
+    def take():
+        free = [c for c in preferred if c not in used_cpus]
+        if len(free) == 0:
+            raise ValueError("Not enough CPUs for --config {} with {} connections".format(config, num_connections))
+        cpu = next((c for c in free if topology.cpus[c]["core"] not in used_cores), free[0])
+        used_cpus.add(cpu)
+        used_cores.add(topology.cpus[cpu]["core"])
+        return cpu
+
+    if config in SINGLE_CPU_CONFIGS[side]:
+        cpus = [take()]
+        affinity = list(cpus)
+    elif config == "all-to-all":
+        cpus = [take() for _ in range(num_connections)]
+        affinity = [c for c in preferred if topology.cpus[c]["node"] == topology.cpus[cpus[0]]["node"]]
+        if len(queues) > 0:
+            affinity = affinity[:len(queues)]
+    else:
+        if not arfs and 0 < len(queues) < num_connections:
+            raise ValueError("{} has {} queue IRQs, not enough for {} IRQ CPUs".format(iface, len(queues), num_connections))
+        cpus, affinity = [], []
+        for _ in range(num_connections):
+            cpus.append(take())
+            affinity.append(take())
+
+    # IRQ CPU of every queue IRQ, round robin over the IRQ CPUs
+    irqs = {}
+    if not arfs:
+        for i, queue in enumerate(sorted(queues)):
+            irqs[queues[queue]] = affinity[i % len(affinity)]
+
+    return {
+        "cpus": cpus,
+        "affinity": [] if arfs else affinity,
+        "irqs": irqs,
+        "node": topology.cpus[cpus[0]]["node"],
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Show the CPU/NUMA topology and plan the placement of an experiment.")
+    parser.add_argument("--root", type=str, default="/", help="Root of the sysfs/procfs tree to read.")
+    parser.add_argument("--iface", type=str, default=None, help="Interface the experiment runs on.")
+    parser.add_argument("--side", choices=["sender", "receiver"], default="receiver", help="Side to plan the placement for.")
+    parser.add_argument("--config", choices=["one-to-one", "incast", "outcast", "all-to-all", "single"], default="single", help="Configuration to plan the placement for.")
+    parser.add_argument("--num-connections", type=int, default=1, help="Number of connections.")
+    parser.add_argument("--arfs", action="store_true", help="IRQs are steered by aRFS.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    topology = Topology(args.root)
+
+    for node, cpus in sorted(topology.nodes.items()):
+        print("[topology] node {}: cpus {}".format(node, ",".join(map(str, cpus))))
+    print("[topology] {} cpus, {} physical cores".format(len(topology.cpus), len(topology.primary_threads())))
+
+    if args.iface is not None:
+        nic_node = topology.nic_node(args.iface)
+        queues, others = topology.nic_irqs(args.iface)
+        print("[topology] {}: node {}\tqueue irqs: {}".format(args.iface, "-" if nic_node is None else nic_node,
+                                                             " ".join("{}:{}".format(q, irq) for q, irq in sorted(queues.items()))))
+
+    try:
+        plan = plan_placement(topology, args.side, args.config, args.num_connections, args.iface, args.arfs)
+    except ValueError as e:
+        print("{}.".format(e))
+        exit(1)
+    print("[placement] --cpus {} --affinity {}".format(" ".join(map(str, plan["cpus"])), " ".join(map(str, plan["affinity"]))))
+    if len(plan["irqs"]) > 0:
+        print("[placement] irq cpus: {}".format(" ".join("{}:{}".format(irq, cpu) for irq, cpu in sorted(plan["irqs"].items()))))
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import math
+import os
+from run_scenario import *
+
+
+# Bounds of the search (KB), the upper one also measures the peak throughput
+MIN_WINDOW = 64
+MAX_WINDOW = 12800
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Find the smallest TCP window reaching a fraction of the peak throughput, by bisection over measured runs.")
+
+    # Add arguments
+    parser.add_argument("scenario", nargs="?", type=str, default="tcp-buffer", help="Scenario giving the parameters and NIC setup of the runs.")
+    parser.add_argument("--label", type=str, default=None, help="Rung of the ladder to search on (default: the last one).")
+    parser.add_argument("--target", type=float, default=0.95, help="Fraction of the peak throughput the window has to reach.")
+    parser.add_argument("--min-window", type=int, default=MIN_WINDOW, help="Smallest window to try (KB).")
+    parser.add_argument("--max-window", type=int, default=MAX_WINDOW, help="Largest window to try (KB), measures the peak throughput.")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Stop when the bounds are within this relative distance.")
+    parser.add_argument("--duration", type=int, default=None, help="Duration of every run (default: the one of the scenario).")
+    parser.add_argument("--metrics", choices=["throughput", "utilisation"], nargs="+", default=["throughput", "utilisation"], help="Metrics measured in every run.")
+    parser.add_argument("--topology", type=str, default=TOPOLOGY_FILE, help="File with the default addresses and interfaces of the hosts.")
+    parser.add_argument("--receiver", type=str, default=None, help="Address of the receiver to communicate metadata.")
+    parser.add_argument("--addr", type=str, default=None, help="Address of the receiver interface to run experiments on.")
+    parser.add_argument("--iface", type=str, default=None, help="Interface to run experiments on.")
+    parser.add_argument("--results-dir", type=str, default=os.path.join(DIR, "results"), help="Directory for the logs, raw outputs and results store.")
+    parser.add_argument("--force", action="store_true", help="Re-measure windows already recorded in the results store.")
+    parser.add_argument("--fetch-artifacts", action="store_true", help="Copy the raw outputs of the receiver next to the ones of the sender after every run.")
+    parser.add_argument("--verbose", action="store_true", help="Print extra output.")
+
+    # Parse and verify arguments
+    args = parser.parse_args()
+
+    if not (0 < args.target <= 1):
+        print("Can't set --target outside of (0, 1].")
+        exit(1)
+
+    if not (0 < args.min_window < args.max_window):
+        print("Please provide 0 < --min-window < --max-window.")
+        exit(1)
+
+    if args.tolerance <= 0:
+        print("Can't set --tolerance <= 0.")
+        exit(1)
+
+    # The window is set through iperf, the throughput is taken from the long flow runs
+    if "throughput" not in args.metrics:
+        print("Please measure --metrics throughput, the search is driven by it.")
+        exit(1)
+
+    # Fill in the topology defaults
+    topology = load_toml(args.topology) if os.path.exists(args.topology) else {}
+    if args.iface is None:
+        args.iface = topology.get("sender", {}).get("iface")
+    if args.receiver is None:
+        args.receiver = topology.get("receiver", {}).get("public_addr")
+    if args.addr is None:
+        args.addr = topology.get("receiver", {}).get("addr")
+
+    if args.receiver is None or args.addr is None:
+        print("Please provide --receiver and --addr, or set them in {}.".format(args.topology))
+        exit(1)
+
+    # Create the directory for writing results
+    os.makedirs(args.results_dir, exist_ok=True)
+
+    # Return parsed and verified arguments
+    return args
+
+
+# Socket buffer needed for a window: run_iperf asks for -w window/2 (SO_SNDBUF/SO_RCVBUF), which is capped
+# by net.core.wmem_max/rmem_max and then doubled by the kernel, so a connection holds up to window KB per side
+def window_sysctl(window):
+    return {"so_buf_kb": window / 2, "mem_max": int(window * 1024 / 2), "per_connection_kb": window}
+
+
+# Bisection over the window, on a log scale as the windows span orders of magnitude
+# Every run is a point of the scenario with its window, so windows already in the results store are not re-measured
+class WindowSearch:
+    def __init__(self, args, agent, scenario, rung_idx):
+        self.args = args
+        self.agent = agent
+        self.scenario = scenario
+        self.rung_idx = rung_idx
+        self.environment = {"sender": host_environment(args.iface), "receiver": agent.environment()}
+        self.samples = {}
+
+    def point(self, window):
+        params = {} if self.args.duration is None else {"duration": self.args.duration}
+        return Point(self.scenario, self.rung_idx, self.scenario["ladder"][self.rung_idx], {"window": window}, {"metrics": self.args.metrics, "params": params})
+
+    # Steady state throughput (the last seconds of the run, see process_throughput_output) and utilisation of a window
+    def measure(self, window):
+        if window in self.samples:
+            return self.samples[window]["throughput"]
+
+        point = self.point(window)
+        print("[window search] window {} KB".format(window))
+        run = measure_point(self.args, self.agent, self.scenario, point, point_key(self.scenario, point, self.environment))
+        if run is None:
+            raise RuntimeError("Run of window {} KB failed".format(window))
+
+        with ResultsStore(os.path.join(self.args.results_dir, "results.db")) as store:
+            metrics = store.run_metrics(run["run_id"])
+        sample = {"window": window, "run_id": run["run_id"], "throughput": metrics.get(("sender", "throughput"), 0.),
+                  "sender_utilisation": metrics.get(("sender", "utilisation")), "receiver_utilisation": metrics.get(("receiver", "utilisation"))}
+        sample.update(window_sysctl(window))
+        self.samples[window] = sample
+        print("[window search] window {} KB: {:.3f} Gbps".format(window, sample["throughput"]))
+        return sample["throughput"]
+
+    # Smallest window reaching target * peak, within the tolerance
+    def run(self):
+        lo, hi = self.args.min_window, self.args.max_window
+        peak = self.measure(hi)
+        if peak <= 0:
+            raise RuntimeError("No throughput at the largest window ({} KB)".format(hi))
+        goal = self.args.target * peak
+        print("[window search] peak {:.3f} Gbps, looking for {:.3f} Gbps".format(peak, goal))
+
+        if self.measure(lo) >= goal:
+            return lo
+
+        # Invariant: lo misses the goal, hi reaches it
+        while hi > lo * (1 + self.args.tolerance):
+            mid = int(round(math.sqrt(lo * hi)))
+            if mid in [lo, hi]:
+                break
+            if self.measure(mid) >= goal:
+                hi = mid
+            else:
+                lo = mid
+        return hi
+
+    def curve(self):
+        return [self.samples[w] for w in sorted(self.samples)]
+
+
+def print_curve(curve, peak):
+    print("[window search] sampled curve")
+    print("\t".join(["window (KB)", "SO_RCVBUF (KB)", "throughput (Gbps)", "fraction of peak", "sender util", "receiver util"]))
+    for s in curve:
+        utils = ["-" if s[k] is None else "{:.3f}".format(s[k]) for k in ["sender_utilisation", "receiver_utilisation"]]
+        print("\t".join(["{}".format(s["window"]), "{:g}".format(s["so_buf_kb"]), "{:.3f}".format(s["throughput"]), "{:.3f}".format(s["throughput"] / peak)] + utils))
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    scenario = load_scenario(args.scenario)
+
+    labels = [rung["label"] for rung in scenario["ladder"]]
+    if args.label is not None and args.label not in labels:
+        print("No rung {} in {} (rungs: {}).".format(args.label, scenario["name"], ", ".join(labels)))
+        exit(1)
+    rung_idx = len(labels) - 1 if args.label is None else labels.index(args.label)
+
+    raise_open_files(scenario.get("open_files", 0))
+    agent = connect_agent(args.receiver)
+
+    # Configure both NICs up to the rung, and restore them at the end
+    nic = None if args.iface is None else NicConfig(args.iface)
+    try:
+        for rung in scenario["ladder"][:rung_idx + 1]:
+            setup = rung.get("setup", [])
+            print("[scenario] network setup: {}".format(" ".join(setup)))
+            run_network_setup(nic, setup)
+            agent.setup_network(setup)
+
+        search = WindowSearch(args, agent, scenario, rung_idx)
+        window = search.run()
+    finally:
+        if nic is not None:
+            nic.restore()
+        agent.restore_network()
+
+    curve = search.curve()
+    peak = search.samples[args.max_window]["throughput"]
+    print_curve(curve, peak)
+
+    sysctl = window_sysctl(window)
+    print("[window search] smallest window reaching {:.0%} of the peak: {} KB ({:.3f} Gbps)".format(args.target, window, search.samples[window]["throughput"]))
+    print("[window search] needs net.core.rmem_max/wmem_max >= {} (iperf -w {:g}K), up to {} KB of socket buffer per connection and side".format(
+        sysctl["mem_max"], sysctl["so_buf_kb"], sysctl["per_connection_kb"]))
+
+    # Keep the sampled curve next to the results
+    out_file = os.path.join(args.results_dir, "window_search_{}_{}.json".format(scenario["name"], labels[rung_idx]))
+    with open(out_file, "w") as f:
+        json.dump({"scenario": scenario["name"], "label": labels[rung_idx], "target": args.target, "peak": peak, "window": window,
+                   "sysctl": sysctl, "curve": curve}, f, indent=2)
+    print("[window search] wrote {}".format(out_file))
@@ -1,10 +1,7 @@
-# Set MTU=4096
-echo "sudo ip link set dev enp94s0f1np1 mtu 4096"
-sudo ip link set dev enp94s0f1np1 mtu 4096
+# Get the dir of this project
+DIR=$(realpath $(dirname $(readlink -f $0))/..)
 
-# Set RSS == aRFS
-echo "sudo ethtool -X enp94s0f1np1 equal 1"
-sudo ethtool -X enp94s0f1np1 equal 1
-
-echo "sudo set_irq_affinity.sh enp94s0f1np1"
-sudo set_irq_affinity.sh enp94s0f1np1
+# Set MTU=4096, RSS == aRFS and one queue IRQ per CPU (as set_irq_affinity.sh), only what differs is changed
+# Restore the previous configuration with: network_setup.py enp94s0f1np1 --restore
+echo "sudo network_setup.py enp94s0f1np1 --mtu 4096 --rss-equal 1 --config single"
+sudo ${DIR}/network_setup.py enp94s0f1np1 --mtu 4096 --rss-equal 1 --config single